@@ -0,0 +1,49 @@
+# aging_scheduler.py
+import logging
+from datetime import date, datetime, timedelta
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+
+class AgingScheduler(QObject):
+    """
+    Mantiene al día las cubetas de antigüedad sin recargar datos.
+
+    Las cubetas sólo cambian al cambiar el día (vence una promesa o una
+    deuda cumple 30/60 días), así que el timer despierta a medianoche y le
+    pide al AgingIndex que mueva a los clientes cuyo cambio ya llegó.
+    """
+    clients_moved = pyqtSignal(list)   # [(client_id, is_company, cubeta anterior, cubeta nueva)]
+    day_changed = pyqtSignal(object)   # date del nuevo día
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.index = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._on_timeout)
+
+    def set_index(self, index):
+        """Seguir un índice nuevo (después de cada carga)"""
+        self.index = index
+        self._schedule()
+
+    def _schedule(self):
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        # Un segundo de margen para despertar ya en el día nuevo
+        msecs = int((midnight - now).total_seconds() * 1000) + 1000
+        self._timer.start(msecs)
+
+    def _on_timeout(self):
+        today = date.today()
+        if self.index is not None and today > self.index.today:
+            moved = self.index.advance(today)
+            self.day_changed.emit(today)
+            if moved:
+                logging.info(f"Cubetas actualizadas al cambiar de día: {len(moved)} clientes")
+                self.clients_moved.emit(moved)
+        self._schedule()
+
+    def stop(self):
+        self._timer.stop()
@@ -13,11 +13,13 @@ from PyQt6.QtCore import Qt, QDate, pyqtSignal
 from PyQt6.QtGui import QFont, QColor, QIcon, QPainter, QPainterPath, QLinearGradient
 
 # Importar funciones de database
-from database import (get_db_connection, get_client_notes, update_promise_date, 
+from database import (get_db_connection, get_client_notes, 
                      update_telefono3, format_phone_number, UserSession)
+from tickets import get_ticket_text
 
 # Importar el theme manager
 from theme_manager import ThemeManager
+from workers import WorkerManager
 
 class ModernCard(QFrame):
     """Tarjeta moderna con efectos de glassmorphism que se adapta al tema"""
@@ -146,12 +148,34 @@ class ClienteDetalleWindow(QWidget):
         except Exception as e:
             logging.error(f"Error al establecer ícono de ventana de detalles: {e}")
         
+        # Las consultas de cada panel corren en segundo plano; la ventana
+        # se muestra de inmediato y cada panel se llena al llegar sus datos
+        self.workers = WorkerManager(self)
+        
+        # Los cambios se aplican aquí al instante y la cola los envía después
+        self.write_queue = parent.write_queue
+        self.note_rows = []  # Notas ya guardadas en el servidor (última consulta)
+        self.company_state = None  # Llegan de los workers de los botones
+        self.buro_state = None
+        self.write_queue.pending_changed.connect(self.update_pending_label)
+        self.write_queue.flushed.connect(self.on_changes_flushed)
+        
         # PRIMERO crear la UI
         self.initUI()
         
         # DESPUÉS cargar las notas (cuando ya existe notes_layout)
         self.load_client_notes()
 
+    def closeEvent(self, event):
+        """Cancelar consultas pendientes para no pintar sobre una ventana cerrada"""
+        self.workers.cancel_all()
+        try:
+            self.write_queue.pending_changed.disconnect(self.update_pending_label)
+            self.write_queue.flushed.disconnect(self.on_changes_flushed)
+        except TypeError:
+            pass  # ya desconectadas (la ventana se cerró antes)
+        super().closeEvent(event)
+
     def get_current_colors(self):
         """Obtiene los colores del tema actual"""
         theme = self.theme_manager.get_current_theme()
@@ -506,9 +530,6 @@ class ClienteDetalleWindow(QWidget):
         
     def create_adeudo_frame(self, layout):
         """Crea el frame de adeudos con altura fija y scroll usando ModernCard"""
-        colors = self.get_current_colors()
-        theme = self.theme_manager.get_current_theme()
-        
         adeudo_frame = ModernCard(self.theme_manager)
         adeudo_layout = QVBoxLayout()
         adeudo_layout.setContentsMargins(20, 15, 20, 15)
@@ -537,13 +558,42 @@ class ClienteDetalleWindow(QWidget):
         scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         
-        # Widget contenedor para los adeudos
+        # Widget contenedor para los adeudos (se llena al terminar la consulta)
         adeudos_widget = QWidget()
-        adeudos_layout = QVBoxLayout()
-        adeudos_widget.setLayout(adeudos_layout)
+        self.adeudos_layout = QVBoxLayout()
+        adeudos_widget.setLayout(self.adeudos_layout)
+        self.show_panel_loading(self.adeudos_layout, "⏳ Cargando adeudos...")
         
-        # Obtener y mostrar adeudos
-        adeudos = self.get_adeudos_from_db()
+        scroll_area.setWidget(adeudos_widget)
+        adeudo_layout.addWidget(scroll_area)
+        
+        adeudo_frame.setLayout(adeudo_layout)
+        layout.addWidget(adeudo_frame)
+        
+        self.workers.submit('adeudos', self.get_adeudos_from_db,
+                            on_result=self.render_adeudos, result_type=list)
+    
+    def show_panel_loading(self, panel_layout, text):
+        """Vaciar un panel y mostrar un aviso de carga"""
+        colors = self.get_current_colors()
+        self.clear_panel(panel_layout)
+        loading_label = QLabel(text)
+        loading_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        loading_label.setStyleSheet(f"color: {colors['TEXT_SECONDARY']}; font-style: italic; padding: 20px;")
+        panel_layout.addWidget(loading_label)
+    
+    def clear_panel(self, panel_layout):
+        while panel_layout.count():
+            child = panel_layout.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+    
+    def render_adeudos(self, adeudos):
+        """Mostrar la lista de adeudos ya consultada"""
+        colors = self.get_current_colors()
+        theme = self.theme_manager.get_current_theme()
+        adeudos_layout = self.adeudos_layout
+        self.clear_panel(adeudos_layout)
         
         if not adeudos:
             no_adeudos_label = QLabel("📝 No hay adeudos registrados")
@@ -616,12 +666,6 @@ class ClienteDetalleWindow(QWidget):
             total_frame.setLayout(total_layout)
             adeudos_layout.addWidget(total_frame)
         
-        scroll_area.setWidget(adeudos_widget)
-        adeudo_layout.addWidget(scroll_area)
-        
-        adeudo_frame.setLayout(adeudo_layout)
-        layout.addWidget(adeudo_frame)
-        
     def create_control_panel(self, parent):
         """Crea el panel de control lateral usando ModernCard"""
         control_card = ModernCard(self.theme_manager)
@@ -647,15 +691,20 @@ class ClienteDetalleWindow(QWidget):
         
         control_layout.addLayout(title_layout)
         
+        # Botones que escriben en la base (se desactivan sin conexión)
+        write_buttons = []
+        
         # Botón agregar nota
         add_note_btn = ModernButton("📝 Agregar Nota", self.theme_manager)
         add_note_btn.clicked.connect(self.show_note_dialog)
         control_layout.addWidget(add_note_btn)
+        write_buttons.append(add_note_btn)
         
         # Botón agregar teléfono
         add_phone_btn = ModernButton("📞 Teléfono", self.theme_manager)
         add_phone_btn.clicked.connect(self.show_telefono_dialog)
         control_layout.addWidget(add_phone_btn)
+        write_buttons.append(add_phone_btn)
         
         # Botones de notas rápidas
         quick_notes = [
@@ -668,6 +717,7 @@ class ClienteDetalleWindow(QWidget):
             btn = ModernButton(btn_text, self.theme_manager)
             btn.clicked.connect(lambda checked, text=note_text: self.create_quick_note(text))
             control_layout.addWidget(btn)
+            write_buttons.append(btn)
         
         # Separador
         separator = QFrame()
@@ -679,6 +729,7 @@ class ClienteDetalleWindow(QWidget):
         calendar_btn = ModernButton("📅 Fecha Promesa", self.theme_manager)
         calendar_btn.clicked.connect(self.show_calendar_dialog)
         control_layout.addWidget(calendar_btn)
+        write_buttons.append(calendar_btn)
         
         # Separador
         separator2 = QFrame()
@@ -691,12 +742,14 @@ class ClienteDetalleWindow(QWidget):
         self.update_company_button()
         self.company_btn.clicked.connect(self.toggle_company)
         control_layout.addWidget(self.company_btn)
+        write_buttons.append(self.company_btn)
         
         # Botón buró
         self.buro_btn = ModernButton("⚠️ Estado Buró", self.theme_manager)
         self.update_buro_button()
         self.buro_btn.clicked.connect(self.toggle_buro)
         control_layout.addWidget(self.buro_btn)
+        write_buttons.append(self.buro_btn)
         
         # Separador
         separator3 = QFrame()
@@ -714,6 +767,20 @@ class ClienteDetalleWindow(QWidget):
         phone_btn.clicked.connect(self.realizar_llamada)
         control_layout.addWidget(phone_btn)
         
+        # Cambios encolados que aún no confirma el servidor
+        self.pending_label = QLabel("")
+        self.pending_label.setFont(QFont("Segoe UI", 9))
+        self.pending_label.setStyleSheet(f"color: {self.get_current_colors()['TEXT_SECONDARY']}; font-style: italic;")
+        self.pending_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        control_layout.addWidget(self.pending_label)
+        self.update_pending_label(len(self.write_queue))
+        
+        # Sin conexión la app trabaja sobre la copia local en sólo lectura
+        if not self.writes_allowed():
+            for btn in write_buttons:
+                btn.setEnabled(False)
+                btn.setToolTip("Sin conexión con el servidor: sólo lectura")
+        
         # Espaciador
         control_layout.addStretch()
         
@@ -721,18 +788,27 @@ class ClienteDetalleWindow(QWidget):
         parent.addWidget(control_card)
     
     def load_client_notes(self):
-        """Carga las notas del cliente - VERSIÓN ULTRA SIMPLE"""
+        """Carga las notas del cliente en segundo plano"""
+        if not self.notes_layout.count():
+            self.show_panel_loading(self.notes_layout, "⏳ Cargando notas...")
+        self.workers.submit('notes', self.fetch_client_notes, self.client_id,
+                            on_result=self.on_client_notes_loaded, result_type=list)
+    
+    def on_client_notes_loaded(self, rows):
+        self.note_rows = rows
+        self.render_client_notes(rows)
+    
+    @staticmethod
+    def fetch_client_notes(task, client_id):
+        """Consulta las notas del cliente (corre en el pool, no toca widgets)"""
+        logging.info(f"=== CARGANDO NOTAS PARA CLIENTE: {client_id} ===")
+        
+        # Consulta directa a la base de datos
+        conn = get_db_connection()
+        if not conn:
+            raise ConnectionError("No se pudo conectar a la base de datos")
+        
         try:
-            logging.info(f"=== CARGANDO NOTAS PARA CLIENTE: {self.client_id} ===")
-            colors = self.get_current_colors()
-            theme = self.theme_manager.get_current_theme()
-            
-            # Consulta directa a la base de datos
-            conn = get_db_connection()
-            if not conn:
-                logging.error("No se pudo conectar a la base de datos")
-                return
-            
             cursor = conn.cursor()
             query = """
                 SELECT note_text, created_at, ISNULL(user_name, 'Sistema') as user_name
@@ -741,12 +817,23 @@ class ClienteDetalleWindow(QWidget):
                 ORDER BY created_at DESC
             """
             
-            cursor.execute(query, (self.client_id,))
-            rows = cursor.fetchall()
+            cursor.execute(query, (client_id,))
+            return [tuple(row) for row in cursor.fetchall()]
+        finally:
             conn.close()
+    
+    def render_client_notes(self, rows):
+        """Muestra las notas ya consultadas (y las aún sin enviar) en la línea de tiempo"""
+        try:
+            colors = self.get_current_colors()
+            theme = self.theme_manager.get_current_theme()
             
             logging.info(f"ENCONTRADAS {len(rows)} NOTAS EN LA BASE DE DATOS")
             
+            # Las notas encoladas van primero: son las más recientes
+            pending = self.write_queue.pending_notes(self.client_id)
+            rows = [note + (True,) for note in pending] + list(rows)
+            
             # Limpiar el layout de notas
             while self.notes_layout.count():
                 child = self.notes_layout.takeAt(0)
@@ -793,6 +880,8 @@ class ClienteDetalleWindow(QWidget):
                 # Fecha y usuario
                 fecha_str = row[1].strftime('%d/%m/%Y %H:%M') if row[1] else 'Sin fecha'
                 usuario_str = row[2] if row[2] else 'Sistema'
+                if len(row) > 3:
+                    usuario_str += " · ⏳ sin enviar"
                 
                 # Ícono de fecha
                 date_icon = QLabel("📅")
@@ -842,7 +931,7 @@ class ClienteDetalleWindow(QWidget):
             logging.info(f"=== CARGA COMPLETADA: {len(rows)} NOTAS MOSTRADAS ===")
             
         except Exception as e:
-            logging.error(f"ERROR EN load_client_notes: {e}")
+            logging.error(f"ERROR EN render_client_notes: {e}")
             import traceback
             logging.error(traceback.format_exc())
     
@@ -856,13 +945,8 @@ class ClienteDetalleWindow(QWidget):
                     QMessageBox.warning(self, "Advertencia", "Por favor ingrese una nota válida")
                     return
                         
-                # Guardar la nota
-                if self.save_note_to_db(self.client_id, note_text.strip()):
-                    # Recargar notas después de guardar
-                    self.load_client_notes()
-                    QMessageBox.information(self, "Éxito", "Nota guardada correctamente")
-                else:
-                    QMessageBox.warning(self, "Error", "No se pudo guardar la nota")
+                # Guardar la nota (aparece de inmediato en la línea de tiempo)
+                self.save_note_to_db(self.client_id, note_text.strip())
                     
         except Exception as e:
             logging.error(f"Error en diálogo de nota: {e}")
@@ -875,11 +959,8 @@ class ClienteDetalleWindow(QWidget):
                 logging.warning("Intento de crear nota rápida vacía")
                 return
                 
-            if self.save_note_to_db(self.client_id, note_text.strip()):
-                self.load_client_notes()
-                logging.info(f"Nota rápida creada: {note_text[:50]}...")
-            else:
-                QMessageBox.warning(self, "Error", "No se pudo guardar la nota rápida")
+            self.save_note_to_db(self.client_id, note_text.strip())
+            logging.info(f"Nota rápida creada: {note_text[:50]}...")
                 
         except Exception as e:
             logging.error(f"Error en nota rápida: {e}")
@@ -899,8 +980,7 @@ class ClienteDetalleWindow(QWidget):
                 
                 # Crear nota automática
                 note_text = f"Teléfono adicional {'actualizado' if self.client_data.get('telefono3') else 'agregado'}: {format_phone_number(nuevo_telefono)}"
-                if self.save_note_to_db(self.client_id, note_text):
-                    self.load_client_notes()
+                self.save_note_to_db(self.client_id, note_text)
                 
             else:
                 QMessageBox.warning(self, "Error", "No se pudo actualizar el teléfono")
@@ -910,13 +990,10 @@ class ClienteDetalleWindow(QWidget):
         dialog = CalendarDialog(self, self.theme_manager)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             selected_date, payment_method = dialog.get_selection()
-            if update_promise_date(self.client_id, selected_date):
-                note_text = f"Promesa de pago generada para el día {selected_date.strftime('%d/%m/%Y')}. Método de pago: {payment_method}"
-                if self.save_note_to_db(self.client_id, note_text):
-                    self.load_client_notes()
-                QMessageBox.information(self, "Éxito", "Fecha de promesa guardada correctamente")
-            else:
-                QMessageBox.warning(self, "Error", "No se pudo guardar la fecha de promesa")
+            self.write_queue.enqueue_state(self.client_id, 'promiseDate', selected_date)
+            self.notify_state_change(self.client_id, promiseDate=selected_date)
+            note_text = f"Promesa de pago generada para el día {selected_date.strftime('%d/%m/%Y')}. Método de pago: {payment_method}"
+            self.save_note_to_db(self.client_id, note_text)
             
     def abrir_whatsapp(self):
         """Abre WhatsApp con el número del cliente"""
@@ -969,39 +1046,22 @@ class ClienteDetalleWindow(QWidget):
             if conn:
                 conn.close()
     
-    def update_company_state(self, client_id, is_company):
-        """Actualiza el estado de empresa del cliente"""
-        conn = get_db_connection()
-        if not conn:
-            return False
-        
-        try:
-            cursor = conn.cursor()
-            
-            # Intentar UPDATE primero
-            cursor.execute("UPDATE dbo.ClientsStates SET company = ? WHERE client_id = ?", 
-                         (is_company, client_id))
-            
-            # Si no actualizó nada, hacer INSERT
-            if cursor.rowcount == 0:
-                cursor.execute("""INSERT INTO dbo.ClientsStates 
-                               (client_id, day1, day2, day3, dueday, promisePage, company)
-                               VALUES (?, 0, 0, 0, 0, 0, ?)""", 
-                             (client_id, is_company))
-            
-            conn.commit()
-            return True
-            
-        except Exception as e:
-            logging.error(f"Error al actualizar estado de empresa: {e}")
-            return False
-        finally:
-            conn.close()
+    def notify_state_change(self, client_id, **changes):
+        """Reflejar en la ventana principal un cambio de ClientsStates"""
+        if hasattr(self.parent, 'apply_client_state_change'):
+            self.parent.apply_client_state_change(client_id, changes)
     
     def update_company_button(self):
-        """Actualiza el botón de empresa"""
-        company_state = self.get_company_state(self.client_id)
-        
+        """Actualiza el botón de empresa (consulta en segundo plano)"""
+        # Deshabilitado hasta conocer el estado: el clic nunca consulta la base
+        self.company_btn.setEnabled(False)
+        self.company_btn.setText("⏳ Cargando...")
+        self.workers.submit('company_state', lambda task: self.get_company_state(self.client_id),
+                            on_result=lambda state: self.apply_company_state(
+                                self.write_queue.pending_value('state', self.client_id, 'company', state)))
+    
+    def apply_company_state(self, company_state):
+        self.company_state = company_state
         if company_state is None:
             # Cliente no existe en ClientsStates, mostrar estado neutro
             self.company_btn.setText("🏢 Definir Estado Empresa")
@@ -1018,24 +1078,43 @@ class ClienteDetalleWindow(QWidget):
             self.company_btn.setProperty("class", "")
             logging.info(f"Cliente {self.client_id} no es empresa")
         
+        self.company_btn.setEnabled(self.writes_allowed())
         self.company_btn.style().polish(self.company_btn)
         
     def update_buro_button(self):
-        """Actualiza el botón de buró"""
-        is_buro = self.get_buro_state(self.client_id)
-        if is_buro:
+        """Actualiza el botón de buró (consulta en segundo plano)"""
+        self.buro_btn.setEnabled(False)
+        self.buro_btn.setText("⏳ Cargando...")
+        self.workers.submit('buro_state', lambda task: self.get_buro_state(self.client_id),
+                            on_result=lambda state: self.apply_buro_state(
+                                self.write_queue.pending_value('buro', self.client_id, default=state)))
+    
+    def apply_buro_state(self, is_buro):
+        self.buro_state = is_buro
+        if is_buro is None:
+            # Sin renglón en ClientsBuro (o sin conexión): no se puede alternar
+            self.buro_btn.setText("⚠️ Buró no disponible")
+            self.buro_btn.setProperty("class", "neutral")
+            logging.info(f"Cliente {self.client_id} sin estado de buró en ClientsBuro")
+        elif is_buro:
             self.buro_btn.setText("⚠️ En Buró")
             self.buro_btn.setProperty("class", "danger")
         else:
             self.buro_btn.setText("⚠️ Buró")
             self.buro_btn.setProperty("class", "")
+        self.buro_btn.setEnabled(is_buro is not None and self.writes_allowed())
         self.buro_btn.style().polish(self.buro_btn)
+    
+    def writes_allowed(self):
+        """Sin conexión la ventana queda en sólo lectura"""
+        return not getattr(self.parent, 'offline_mode', False)
         
     
     def toggle_company(self):
         """Alterna el estado de empresa del cliente"""
         try:
-            current_state = self.get_company_state(self.client_id)
+            # El botón sólo se habilita cuando llegó el estado del worker
+            current_state = self.company_state
             
             if current_state is None:
                 # Cliente no existe, crear como empresa por defecto
@@ -1046,15 +1125,10 @@ class ClienteDetalleWindow(QWidget):
                 new_state = not current_state
                 logging.info(f"Cliente {self.client_id} cambiando de {current_state} a {new_state}")
             
-            if self.update_company_state(self.client_id, new_state):
-                self.update_company_button()
-                
-                estado_text = "empresa" if new_state else "no empresa"
-                QMessageBox.information(self, "Éxito", f"Cliente marcado como {estado_text}")
-                logging.info(f"Estado de empresa actualizado exitosamente para cliente {self.client_id}")
-            else:
-                QMessageBox.warning(self, "Error", "No se pudo actualizar el estado de empresa")
-                logging.error(f"Falló la actualización de estado de empresa para cliente {self.client_id}")
+            # Se aplica al instante; la cola lo envía (y combina clics repetidos)
+            self.write_queue.enqueue_state(self.client_id, 'company', new_state)
+            self.apply_company_state(new_state)
+            self.notify_state_change(self.client_id, company=new_state)
                 
         except Exception as e:
             logging.error(f"Error en toggle_company para cliente {self.client_id}: {e}")
@@ -1062,143 +1136,71 @@ class ClienteDetalleWindow(QWidget):
             
     def toggle_buro(self):
         """Alterna el estado de buró"""
-        conn = get_db_connection()
-        if not conn:
-            return
-            
         try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT credit FROM dbo.ClientsBuro WHERE client_id = ?", (self.client_id,))
-            current_state = cursor.fetchone()
-            
-            if current_state is not None:
-                new_state = not bool(current_state.credit)
-                cursor.execute("""
-                    UPDATE dbo.ClientsBuro 
-                    SET credit = ?
-                    WHERE client_id = ?
-                """, (new_state, self.client_id))
-                conn.commit()
-                self.update_buro_button()
-                
-                # Crear nota automática
-                status_text = "agregado al buró de crédito" if new_state else "removido del buró de crédito"
-                note_text = f"Cliente {status_text}"
-                if self.save_note_to_db(self.client_id, note_text):
-                    self.load_client_notes()
+            current_state = self.buro_state
+            if current_state is None:
+                # Igual que antes: sólo se alterna si el cliente ya está en ClientsBuro
+                logging.warning(f"Cliente {self.client_id} sin estado de buró, no se modifica")
+                return
+            new_state = not current_state
+            
+            self.write_queue.enqueue_buro(self.client_id, new_state)
+            self.apply_buro_state(new_state)
+            if hasattr(self.parent, 'apply_client_buro_change'):
+                self.parent.apply_client_buro_change(self.client_id, new_state)
+            
+            # Crear nota automática
+            status_text = "agregado al buró de crédito" if new_state else "removido del buró de crédito"
+            self.save_note_to_db(self.client_id, f"Cliente {status_text}")
                     
         except Exception as e:
             logging.error(f"Error al actualizar estado de buró: {e}")
-        finally:
-            conn.close()
               
     def get_buro_state(self, client_id):
-        """Obtiene el estado de buró"""
+        """Obtiene el estado de buró (None si el cliente no está en ClientsBuro o hubo error)"""
+        conn = None
         try:
             conn = get_db_connection()
             if not conn:
-                return False
+                return None
             cursor = conn.cursor()
             cursor.execute("SELECT credit FROM dbo.ClientsBuro WHERE client_id = ?", (client_id,))
             result = cursor.fetchone()
-            return bool(result.credit) if result else False
-        except:
-            return False
-        finally:
-            if conn:
-                conn.close()
-            
-    def ensure_notes_table_exists(self):
-        """Asegura que la tabla Notes exista, la crea si es necesario"""
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        try:
-            cursor = conn.cursor()
-            
-            # Verificar si la tabla existe
-            cursor.execute("""
-                SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES 
-                WHERE TABLE_NAME = 'Notes'
-            """)
-            table_exists = cursor.fetchone()[0] > 0
-            
-            if not table_exists:
-                # Crear la tabla
-                create_table_query = """
-                CREATE TABLE Notes (
-                    id int IDENTITY(1,1) PRIMARY KEY,
-                    client_id varchar(50) NOT NULL,
-                    note_text nvarchar(max) NOT NULL,
-                    user_name varchar(100) NULL,
-                    created_at datetime DEFAULT GETDATE()
-                )
-                """
-                cursor.execute(create_table_query)
-                
-                # Crear índices
-                cursor.execute("CREATE INDEX IX_Notes_ClientId ON Notes(client_id)")
-                cursor.execute("CREATE INDEX IX_Notes_CreatedAt ON Notes(created_at DESC)")
-                
-                conn.commit()
-                logging.info("Tabla Notes creada exitosamente")
-                return True
-            else:
-                return True
-                
+            return bool(result.credit) if result else None
         except Exception as e:
-            logging.error(f"Error creando tabla Notes: {e}")
-            return False
+            logging.error(f"Error al obtener estado de buró: {e}")
+            return None
         finally:
             if conn:
                 conn.close()
-
-    def save_note_to_db(self, client_id, note_text):
-        """Guarda una nota en la base de datos directamente"""
-        # Asegurar que la tabla existe
-        if not self.ensure_notes_table_exists():
-            logging.error("No se pudo crear/verificar la tabla Notes")
-            return False
-            
-        conn = get_db_connection()
-        if not conn:
-            logging.error("No se pudo conectar a la base de datos")
-            return False
             
+    def save_note_to_db(self, client_id, note_text):
+        """Encola una nota y la muestra de inmediato en la línea de tiempo"""
+        # Obtener el usuario actual desde UserSession
         try:
-            cursor = conn.cursor()
-            
-            # Obtener el usuario actual desde UserSession
-            try:
-                current_user = UserSession.get_user()
-                user_name = current_user if current_user else "Sistema"
-            except Exception as e:
-                logging.warning(f"Error obteniendo usuario: {e}")
-                user_name = "Sistema"
-            
-            # Insertar la nota directamente
-            query = """
-                INSERT INTO Notes (client_id, note_text, user_name, created_at)
-                VALUES (?, ?, ?, GETDATE())
-            """
-            cursor.execute(query, (client_id, note_text, user_name))
-            conn.commit()
-            
-            logging.info(f"Nota guardada exitosamente para cliente {client_id}")
-            return True
-            
+            current_user = UserSession.get_user()
+            user_name = current_user if current_user else "Sistema"
         except Exception as e:
-            logging.error(f"Error al guardar nota: {e}")
-            if conn:
-                conn.rollback()
-            return False
-        finally:
-            if conn:
-                conn.close()
+            logging.warning(f"Error obteniendo usuario: {e}")
+            user_name = "Sistema"
+        
+        self.write_queue.enqueue_note(client_id, note_text, user_name)
+        self.render_client_notes(self.note_rows)
+        logging.info(f"Nota encolada para cliente {client_id}")
+        return True
+    
+    def update_pending_label(self, count):
+        """Mostrar cuántos cambios faltan por confirmar en el servidor"""
+        self.pending_label.setText(f"💾 {count} cambio(s) por guardar" if count else "")
+        self.pending_label.setVisible(bool(count))
+    
+    def on_changes_flushed(self, client_ids):
+        """Recargar las notas cuando el servidor confirmó cambios de este cliente"""
+        if str(self.client_id) in client_ids:
+            self.load_client_notes()
             
-    def get_adeudos_from_db(self):
-        """Obtiene los adeudos del cliente"""
+    def get_adeudos_from_db(self, task=None):
+        """Obtiene los adeudos del cliente (se ejecuta en el pool de hilos)"""
         conn = get_db_connection()
         if not conn:
             return []
@@ -1209,8 +1211,7 @@ class ClienteDetalleWindow(QWidget):
                 SELECT 
                     Folio as ticket,
                     Fecha,
-                    Restante as monto,
-                    Ticket as datos
+                    Restante as monto
                 FROM Ventas
                 WHERE Estado != 'PAGADA'
                 AND Estado != 'CANCELADA'
@@ -1226,8 +1227,7 @@ class ClienteDetalleWindow(QWidget):
                 adeudo = {
                     'ticket': row.ticket,
                     'fecha': row.Fecha.strftime('%Y-%m-%d') if row.Fecha else '',
-                    'monto': float(row.monto),
-                    'datos': row.datos
+                    'monto': float(row.monto)
                 }
                 adeudos.append(adeudo)
             
@@ -1239,8 +1239,15 @@ class ClienteDetalleWindow(QWidget):
             conn.close()
             
     def show_ticket_detail(self, ticket_data):
-        """Muestra los detalles del ticket"""
-        dialog = TicketDetailDialog(self, self.theme_manager, ticket_data)
+        """Muestra los detalles del ticket (el texto se consulta al abrirlo)"""
+        self.workers.submit('ticket', lambda task: get_ticket_text(ticket_data['ticket']),
+                            on_result=lambda text: self.open_ticket_dialog(ticket_data, text))
+    
+    def open_ticket_dialog(self, ticket_data, text):
+        if text is None:
+            QMessageBox.warning(self, "Error", "No se pudo obtener el ticket")
+            return
+        dialog = TicketDetailDialog(self, self.theme_manager, dict(ticket_data, datos=text))
         dialog.exec()
 
 
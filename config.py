@@ -21,3 +21,60 @@ USERNAME = os.getenv('DB_USERNAME', 'TuUsuario')
 PASSWORD = os.getenv('DB_PASSWORD', 'TuContraseña')
 
 
+
+# Pool de conexiones a SQL Server
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '5'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '15'))            # segundos esperando una conexión libre
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))  # cerrar conexiones ociosas tras N segundos
+DB_POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', '30'))      # hacer ping si la conexión lleva N segundos sin uso
+DB_FETCH_BATCH_SIZE = int(os.getenv('DB_FETCH_BATCH_SIZE', '5000'))    # filas por cursor.fetchmany en las lecturas grandes
+
+# Motor de cálculo de puntajes crediticios:
+# 'numpy' (vectorizado), 'python' (referencia) o 'sql' (agregado en SQL Server)
+CREDIT_SCORE_ENGINE = os.getenv('CREDIT_SCORE_ENGINE', 'numpy').lower()
+
+# Sincronización incremental de Ventas: cada cuántos segundos se hace una
+# recarga completa para detectar ventas borradas
+VENTAS_FULL_RECONCILE_SECONDS = float(os.getenv('VENTAS_FULL_RECONCILE_SECONDS', '3600'))
+
+# Carpeta de datos de la aplicación por usuario (archivos SQLite locales), fuera
+# del directorio de trabajo: %LOCALAPPDATA%\Cobranza en Windows, ~/.local/share/cobranza en otros
+_user_data_dir = os.getenv('LOCALAPPDATA') or os.getenv('APPDATA')
+if _user_data_dir:
+    _default_app_data_dir = os.path.join(_user_data_dir, 'Cobranza')
+else:
+    _default_app_data_dir = os.path.join(
+        os.getenv('XDG_DATA_HOME') or os.path.expanduser('~/.local/share'), 'cobranza')
+APP_DATA_DIR = os.getenv('APP_DATA_DIR', _default_app_data_dir)
+try:
+    os.makedirs(APP_DATA_DIR, exist_ok=True)
+except OSError:
+    pass  # cada almacén registra el error al no poder abrir su archivo
+
+# Copia local (SQLite) del último conjunto de datos para arranque rápido y modo sin conexión
+SNAPSHOT_CACHE_PATH = os.getenv('SNAPSHOT_CACHE_PATH', os.path.join(APP_DATA_DIR, 'cobranza_cache.sqlite3'))
+
+# Cada cuántos segundos se agregan a ClientsBuro los clientes nuevos de Clientes4
+BURO_SYNC_INTERVAL_SECONDS = float(os.getenv('BURO_SYNC_INTERVAL_SECONDS', '1800'))
+
+# Cambios de la ventana de detalle (estados, buró, notas) pendientes de enviar a SQL Server
+WRITE_QUEUE_PATH = os.getenv('WRITE_QUEUE_PATH', os.path.join(APP_DATA_DIR, 'cobranza_pendientes.sqlite3'))
+WRITE_QUEUE_FLUSH_DELAY_MS = int(os.getenv('WRITE_QUEUE_FLUSH_DELAY_MS', '500'))     # agrupar clics seguidos
+WRITE_QUEUE_MAX_RETRY_SECONDS = float(os.getenv('WRITE_QUEUE_MAX_RETRY_SECONDS', '300'))
+
+# Textos de ticket (columna Ticket de Ventas) que se guardan en memoria, por Folio
+TICKET_CACHE_SIZE = int(os.getenv('TICKET_CACHE_SIZE', '512'))
+
+# Tickets ya procesados (número, importe, artículos) por Folio, en SQLite local
+TICKET_PARSE_CACHE_PATH = os.getenv('TICKET_PARSE_CACHE_PATH', os.path.join(APP_DATA_DIR, 'cobranza_tickets.sqlite3'))
+
+# Tabla local de artículos vendidos (folio, cliente, producto, cantidad, importe)
+SALES_ITEMS_PATH = os.getenv('SALES_ITEMS_PATH', os.path.join(APP_DATA_DIR, 'cobranza_articulos.sqlite3'))
+SALES_ITEMS_BATCH_SIZE = int(os.getenv('SALES_ITEMS_BATCH_SIZE', '2000'))   # ventas por lote (y por tarea del pool)
+SALES_ITEMS_PROCESSES = int(os.getenv('SALES_ITEMS_PROCESSES', '2'))       # procesos que leen los textos
+
+# Tamaños que se pueden elegir en la vista Top Clientes (el primero es el de inicio)
+TOP_SIZES = tuple(int(size) for size in os.getenv('TOP_SIZES', '10,50,100').split(','))
+
+# Espera (ms) después de la última tecla antes de aplicar la búsqueda de clientes
+SEARCH_DEBOUNCE_MS = int(os.getenv('SEARCH_DEBOUNCE_MS', '250'))
@@ -0,0 +1,222 @@
+# connection_pool.py
+import logging
+import threading
+import time
+
+
+class PoolTimeoutError(Exception):
+    """No se liberó ninguna conexión del pool dentro del tiempo de espera"""
+
+
+class PooledConnection:
+    """
+    Conexión prestada por el pool.
+    Se comporta como la conexión de pyodbc, pero close() la devuelve al pool
+    en lugar de cerrar la sesión con el servidor.
+    """
+
+    def __init__(self, pool, raw_connection):
+        self._pool = pool
+        self._raw = raw_connection
+        self._owner = threading.get_ident()
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise RuntimeError("La conexión ya fue devuelta al pool")
+        return getattr(raw, name)
+
+    def close(self):
+        """Devolver la conexión al pool (llamadas repetidas no hacen nada)"""
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw, self._owner)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # Red de seguridad para rutas que olvidan cerrar la conexión
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones reutilizables con límite de tamaño.
+
+    Reglas:
+    - Como máximo max_size conexiones abiertas (prestadas + ociosas).
+    - Al prestar una conexión que lleva más de ping_after segundos sin uso
+      se verifica con un ping; si falla se descarta y se abre otra.
+    - Las conexiones ociosas por más de idle_timeout segundos se cierran.
+    - Afinidad por hilo: una conexión sólo la usa el hilo que la pidió.
+      Si se devuelve desde otro hilo se descarta en lugar de reutilizarse.
+    - Al devolverla se hace rollback para no heredar transacciones abiertas.
+    """
+
+    def __init__(self, connect, max_size=5, timeout=15.0, idle_timeout=300.0,
+                 ping_after=30.0, ping_query="SELECT 1"):
+        self._connect = connect
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.ping_query = ping_query
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(conexión, último uso)] - LIFO
+        self._total = 0          # conexiones abiertas (prestadas + ociosas)
+        self._closed = False
+
+    def acquire(self):
+        """
+        Obtener una conexión del pool.
+
+        Raises:
+            PoolTimeoutError: si no se libera una conexión a tiempo.
+            Cualquier error del conector al abrir una conexión nueva.
+        """
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            raw, last_used = self._checkout(deadline)
+
+            if raw is None:
+                # Hay cupo reservado: abrir una conexión nueva
+                try:
+                    raw = self._connect()
+                except Exception:
+                    self._discard(None)
+                    raise
+                return PooledConnection(self, raw)
+
+            if time.monotonic() - last_used >= self.ping_after and not self._ping(raw):
+                logging.warning("Conexión del pool no respondió al ping, se descarta")
+                self._discard(raw)
+                continue
+
+            return PooledConnection(self, raw)
+
+    def _checkout(self, deadline):
+        """Tomar una conexión ociosa o reservar cupo para una nueva"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("El pool de conexiones está cerrado")
+
+            expired = self._pop_expired()
+
+            while True:
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    break
+                if self._total < self.max_size:
+                    self._total += 1
+                    raw, last_used = None, 0.0
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._close_quietly(expired)
+                    raise PoolTimeoutError(
+                        f"Sin conexiones libres tras {self.timeout}s "
+                        f"({self._total}/{self.max_size} en uso)")
+                self._cond.wait(remaining)
+
+        self._close_quietly(expired)
+        return raw, last_used
+
+    def _release(self, raw, owner):
+        """Regresar una conexión prestada al pool"""
+        if owner != threading.get_ident():
+            logging.warning("Conexión devuelta desde otro hilo, se descarta por afinidad de hilo")
+            self._discard(raw)
+            return
+
+        try:
+            raw.rollback()
+        except Exception as e:
+            logging.warning(f"Conexión inválida al devolverla al pool: {e}")
+            self._discard(raw)
+            return
+
+        with self._cond:
+            if self._closed:
+                self._total -= 1
+                reuse = False
+            else:
+                self._idle.append((raw, time.monotonic()))
+                reuse = True
+            self._cond.notify()
+
+        if not reuse:
+            self._close_quietly([raw])
+
+    def _discard(self, raw):
+        """Cerrar una conexión y liberar su cupo"""
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+        if raw is not None:
+            self._close_quietly([raw])
+
+    def _ping(self, raw):
+        try:
+            cursor = raw.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logging.info(f"Ping fallido en conexión del pool: {e}")
+            return False
+
+    def _pop_expired(self):
+        """Retirar conexiones ociosas vencidas (llamar con el candado tomado)"""
+        now = time.monotonic()
+        expired = [raw for raw, last_used in self._idle if now - last_used >= self.idle_timeout]
+        if expired:
+            self._idle = [(raw, last_used) for raw, last_used in self._idle
+                          if now - last_used < self.idle_timeout]
+            self._total -= len(expired)
+            self._cond.notify(len(expired))
+            logging.info(f"Pool: {len(expired)} conexiones ociosas cerradas")
+        return expired
+
+    def evict_idle(self):
+        """Cerrar las conexiones ociosas vencidas"""
+        with self._cond:
+            expired = self._pop_expired()
+        self._close_quietly(expired)
+
+    def close_all(self):
+        """Cerrar todas las conexiones ociosas y rechazar nuevos préstamos"""
+        with self._cond:
+            self._closed = True
+            idle = [raw for raw, _ in self._idle]
+            self._total -= len(idle)
+            self._idle = []
+            self._cond.notify_all()
+        self._close_quietly(idle)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'total': self._total,
+                'idle': len(self._idle),
+                'in_use': self._total - len(self._idle),
+                'max_size': self.max_size
+            }
+
+    @staticmethod
+    def _close_quietly(connections):
+        for raw in connections:
+            try:
+                raw.close()
+            except Exception:
+                pass
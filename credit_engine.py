@@ -0,0 +1,494 @@
+# credit_engine.py
+import logging
+import time
+from collections.abc import Mapping
+from datetime import datetime, date
+
+import numpy as np
+
+from config import CREDIT_SCORE_ENGINE
+from database import (get_all_clients_data, get_all_ventas_data, get_ventas_frame, iter_ventas,
+                      get_all_clients_credit_scores, get_credit_statistics,
+                      calculate_client_credit_score, get_credit_level,
+                      get_credit_score_aggregates, get_client_payment_history)
+from data_indexes import VentasIndex, SpendingIndex
+from ventas_sync import VentasDeltaLoader
+
+# Orden de los niveles, del mejor al peor
+CREDIT_LEVELS = ('DORADO', 'VERDE', 'AMARILLO', 'NARANJA', 'ROJO')
+
+# Puntaje inicial de todo cliente (igual que calculate_client_credit_score)
+BASE_SCORE = 400
+
+# Después de 120 días los puntos de una venta abierta son lineales en los días:
+# -10 - (d - 120) * 10 = 1190 - 10 * d
+LINEAR_AFTER_DAYS = 120
+
+
+def payment_points(days):
+    """Tabla de puntos de calculate_client_credit_score aplicada a un arreglo de días"""
+    return np.select(
+        [days <= 30, days <= 60, days <= 90, days <= 120],
+        [100, 50, 10, -10],
+        default=-10 - (days - 120) * 10
+    )
+
+
+def _batch_days(ventas, position, today):
+    """
+    Códigos de cliente y días de las ventas válidas de un lote, con la
+    misma validación que calculate_client_credit_score. Las fechas ya son
+    date, así que se trabaja con ordinales enteros sin parsear nada.
+    """
+    codes, fechas, referencias = [], [], []
+    for venta in ventas.values():
+        code = position.get(venta.get('cveCte'))
+        if code is None:
+            continue
+        estado = venta.get('estado', '')
+        fecha = venta.get('fecha')
+        if not isinstance(estado, str) or not fecha:
+            continue  # el cálculo por cliente también descarta estas ventas
+        fecha_pago = venta.get('fechaPago')
+
+        codes.append(code)
+        fechas.append(fecha.toordinal())
+        # Pagadas: días hasta el pago. Pendientes: días hasta hoy.
+        referencias.append(fecha_pago.toordinal() if estado.upper() == 'PAGADA' and fecha_pago
+                           else today)
+
+    days = np.array(referencias, dtype=np.int64) - np.array(fechas, dtype=np.int64)
+    return np.array(codes, dtype=np.intp), days
+
+
+def score_portfolio_numpy(clients, ventas, today=None):
+    """
+    Calcular el puntaje de todos los clientes de una sola pasada con NumPy.
+
+    ventas puede ser el mapa {Folio: venta} o un iterable de lotes de ese
+    mapa (database.iter_ventas): los totales por cliente se acumulan lote
+    por lote, así el historial completo no tiene que estar en memoria.
+
+    Devuelve lo mismo que get_all_clients_credit_scores (puntaje, nivel,
+    transacciones y promedio de días) salvo 'transaction_details', que se
+    calcula por cliente cuando se abre su detalle (CreditSnapshot.credit_data).
+    """
+    today = (today or date.today()).toordinal()
+
+    client_ids = list(clients)
+    position = {client_id: i for i, client_id in enumerate(client_ids)}
+
+    size = len(client_ids)
+    counts = np.zeros(size, dtype=np.int64)
+    point_sums = np.zeros(size)
+    day_sums = np.zeros(size)
+
+    for batch in ([ventas] if isinstance(ventas, Mapping) else ventas):
+        codes, days = _batch_days(batch, position, today)
+        counts += np.bincount(codes, minlength=size)
+        point_sums += np.bincount(codes, weights=payment_points(days), minlength=size)
+        day_sums += np.bincount(codes, weights=days, minlength=size)
+
+    point_sums = np.rint(point_sums).astype(np.int64)
+    day_sums = np.rint(day_sums).astype(np.int64)
+
+    credit_scores = {}
+    for i, client_id in enumerate(client_ids):
+        transactions = int(counts[i])
+        score = max(0, BASE_SCORE + int(point_sums[i]))
+
+        credit_scores[client_id] = {
+            'client_data': clients[client_id],
+            'credit_score': score,
+            'credit_level': get_credit_level(score),
+            'transactions': transactions,
+            'avg_payment_days': round(int(day_sums[i]) / transactions, 1) if transactions else 0
+        }
+
+    return credit_scores
+
+
+def score_portfolio_sql(clients, today=None):
+    """
+    Calcular los puntajes con los agregados por cliente de SQL Server
+    (get_credit_score_aggregates). No necesita cargar las ventas.
+    Regresa None si la consulta falla.
+    """
+    aggregates = get_credit_score_aggregates(today)
+    if aggregates is None:
+        return None
+
+    credit_scores = {}
+    for client_id, client_data in clients.items():
+        aggregate = aggregates.get(client_id)
+        transactions = aggregate['transactions'] if aggregate else 0
+        score = max(0, BASE_SCORE + (aggregate['points'] if aggregate else 0))
+
+        credit_scores[client_id] = {
+            'client_data': client_data,
+            'credit_score': score,
+            'credit_level': get_credit_level(score),
+            'transactions': transactions,
+            'avg_payment_days': round(aggregate['total_days'] / transactions, 1) if transactions else 0
+        }
+
+    return credit_scores
+
+
+def score_portfolio(clients, ventas, ventas_index=None, engine=None):
+    """
+    Calcular los puntajes de todo el portafolio con el motor configurado
+    (CREDIT_SCORE_ENGINE). Si el motor vectorizado falla se usa el cálculo
+    por cliente de database.py, que es la referencia.
+
+    ventas es el mapa {Folio: venta} o, para el motor 'numpy', lotes de
+    database.iter_ventas.
+    """
+    engine = engine or CREDIT_SCORE_ENGINE
+    started = time.perf_counter()
+
+    if engine == 'numpy':
+        try:
+            scores = score_portfolio_numpy(clients, ventas)
+            logging.info(f"Puntajes calculados con NumPy para {len(scores)} clientes "
+                         f"en {(time.perf_counter() - started) * 1000:.1f} ms")
+            return scores
+        except Exception as e:
+            logging.error(f"Error en el cálculo vectorizado de puntajes, usando cálculo por cliente: {e}")
+    elif engine != 'python':
+        logging.warning(f"Motor de puntajes desconocido '{engine}', usando cálculo por cliente")
+
+    if not isinstance(ventas, Mapping):
+        # Lotes (iter_ventas), quizá ya consumidos: el cálculo por cliente carga el mapa
+        ventas, ventas_index = None, None
+    return get_all_clients_credit_scores(clients, ventas, ventas_index)
+
+
+def points_for_days(days):
+    """Puntos de una venta según sus días (misma tabla que calculate_client_credit_score)"""
+    if days <= 30:
+        return 100
+    if days <= 60:
+        return 50
+    if days <= 90:
+        return 10
+    if days <= 120:
+        return -10
+    return -10 - (days - 120) * 10
+
+
+class CreditScoreState:
+    """
+    Totales acumulados del puntaje por cliente para actualizar los puntajes
+    sin recalcular todo el historial.
+
+    - Ventas pagadas (con FechaPago): sus puntos y días ya no cambian, se
+      guardan como suma por cliente.
+    - Ventas abiertas de más de 120 días: sus puntos son lineales en los
+      días, así que basta con guardar cuántas son y la suma de sus fechas.
+    - Ventas abiertas recientes: se reevalúan en cada actualización.
+
+    Al actualizar sólo se aplican las ventas nuevas o modificadas
+    (ver VentasDeltaLoader).
+    """
+
+    def __init__(self, ventas, today=None):
+        self.today = today or date.today()
+
+        self._entries = {}   # folio -> (client_id, tipo, valor)
+        self._settled = {}   # client_id -> [puntos, días, transacciones]
+        self._aged = {}      # client_id -> [transacciones, suma de fechas (ordinal)]
+        self._recent = {}    # folio -> (client_id, fecha ordinal)
+
+        for folio, venta in ventas.items():
+            self._add(folio, venta)
+
+    @staticmethod
+    def _classify(venta):
+        """Misma validación que calculate_client_credit_score"""
+        estado = venta.get('estado', '')
+        fecha = venta.get('fecha')
+        if not isinstance(estado, str) or not fecha:
+            return None
+        fecha_pago = venta.get('fechaPago')
+        if estado.upper() == 'PAGADA' and fecha_pago:
+            return 'settled', (fecha_pago - fecha).days
+        return 'open', fecha.toordinal()
+
+    def _add(self, folio, venta):
+        client_id = venta.get('cveCte')
+        classified = self._classify(venta) if client_id else None
+        if classified is None:
+            self._entries[folio] = (client_id, 'skip', 0)
+            return
+
+        kind, value = classified
+        if kind == 'settled':
+            totals = self._settled.setdefault(client_id, [0, 0, 0])
+            totals[0] += points_for_days(value)
+            totals[1] += value
+            totals[2] += 1
+        elif self.today.toordinal() - value > LINEAR_AFTER_DAYS:
+            kind = 'aged'
+            totals = self._aged.setdefault(client_id, [0, 0])
+            totals[0] += 1
+            totals[1] += value
+        else:
+            kind = 'recent'
+            self._recent[folio] = (client_id, value)
+
+        self._entries[folio] = (client_id, kind, value)
+
+    def _remove(self, folio):
+        entry = self._entries.pop(folio, None)
+        if entry is None:
+            return
+
+        client_id, kind, value = entry
+        if kind == 'settled':
+            totals = self._settled[client_id]
+            totals[0] -= points_for_days(value)
+            totals[1] -= value
+            totals[2] -= 1
+        elif kind == 'aged':
+            totals = self._aged[client_id]
+            totals[0] -= 1
+            totals[1] -= value
+        elif kind == 'recent':
+            del self._recent[folio]
+
+    def advance(self, today=None):
+        """Mover a 'aged' las ventas abiertas que ya pasaron de 120 días"""
+        self.today = today or date.today()
+        limit = self.today.toordinal() - LINEAR_AFTER_DAYS
+
+        for folio, (client_id, fecha) in list(self._recent.items()):
+            if fecha < limit:
+                del self._recent[folio]
+                totals = self._aged.setdefault(client_id, [0, 0])
+                totals[0] += 1
+                totals[1] += fecha
+                self._entries[folio] = (client_id, 'aged', fecha)
+
+    def apply_changes(self, changed_ventas, removed_folios=()):
+        """Reemplazar las ventas nuevas o modificadas y quitar las retiradas"""
+        for folio, venta in changed_ventas.items():
+            self._remove(folio)
+            self._add(folio, venta)
+        for folio in removed_folios:
+            self._remove(folio)
+
+    def scores(self, clients):
+        """Puntajes de todos los clientes con el mismo formato que score_portfolio_numpy"""
+        today = self.today.toordinal()
+
+        recent = {}
+        for client_id, fecha in self._recent.values():
+            totals = recent.setdefault(client_id, [0, 0, 0])
+            days = today - fecha
+            totals[0] += points_for_days(days)
+            totals[1] += days
+            totals[2] += 1
+
+        credit_scores = {}
+        for client_id, client_data in clients.items():
+            points, days, transactions = 0, 0, 0
+
+            for totals in (self._settled.get(client_id), recent.get(client_id)):
+                if totals:
+                    points += totals[0]
+                    days += totals[1]
+                    transactions += totals[2]
+
+            aged = self._aged.get(client_id)
+            if aged and aged[0]:
+                aged_days = aged[0] * today - aged[1]
+                points += aged[0] * (LINEAR_AFTER_DAYS * 10 - 10) - 10 * aged_days
+                days += aged_days
+                transactions += aged[0]
+
+            score = max(0, BASE_SCORE + points)
+            credit_scores[client_id] = {
+                'client_data': client_data,
+                'credit_score': score,
+                'credit_level': get_credit_level(score),
+                'transactions': transactions,
+                'avg_payment_days': round(days / transactions, 1) if transactions else 0
+            }
+
+        return credit_scores
+
+
+class CreditSnapshot:
+    """
+    Foto del sistema de créditos construida con UNA sola consulta de
+    Clientes4 y Ventas. Contiene los puntajes, los clientes agrupados por
+    nivel y las estadísticas, para que todas las vistas lean de aquí en
+    lugar de volver a consultar y recalcular.
+
+    Una foto no se modifica después de construida: refresh() regresa una
+    foto nueva, así la interfaz puede seguir leyendo la actual mientras la
+    actualización corre en segundo plano.
+    """
+
+    def __init__(self, clients, ventas=None, engine=None, scores=None):
+        self.clients = clients
+        self.engine = engine or CREDIT_SCORE_ENGINE
+        self.created_at = datetime.now()
+
+        # Con el motor 'sql' las ventas sólo se cargan si alguna vista las pide
+        self._ventas = ventas
+        self._ventas_index = None
+        self._spending = None
+        self._state = None
+        self._sync = None
+
+        if scores is None:
+            scores = self._score() if clients else {}
+        self.scores = scores
+        self.levels = self._group_by_level(self.scores)
+        self.statistics = get_credit_statistics(self.scores)
+
+    @classmethod
+    def load(cls, engine=None):
+        """Consultar clientes y ventas una sola vez y construir la foto"""
+        engine = engine or CREDIT_SCORE_ENGINE
+        logging.info(f"Construyendo snapshot crediticio (motor de puntaje: {engine})...")
+        clients = get_all_clients_data()
+        ventas = None if engine == 'sql' else get_all_ventas_data()
+
+        snapshot = cls(clients, ventas, engine)
+        logging.info(f"Snapshot crediticio listo: {len(snapshot.clients)} clientes, "
+                     f"{len(snapshot.scores)} puntajes")
+        return snapshot
+
+    def _score(self):
+        if self.engine == 'sql':
+            scores = score_portfolio_sql(self.clients)
+            if scores is not None:
+                return scores
+            logging.warning("No se pudo calcular el puntaje en SQL, se calcula localmente")
+            # Las ventas se leen por lotes sin quedarse en la foto (el motor 'sql' no las guarda)
+            return score_portfolio(self.clients, iter_ventas('scoring'), engine='numpy')
+
+        return score_portfolio(self.clients, self.ventas, self.ventas_index, self.engine)
+
+    def refresh(self):
+        """
+        Construir una foto nueva aplicando sólo las ventas nuevas o
+        modificadas desde la última carga. Los puntajes, el índice de
+        ventas y el de gasto se actualizan con los cambios; si no hubo
+        ninguno la foto nueva comparte los índices de ésta. El mapa de
+        ventas es el LayeredMap del loader: la foto nueva lo comparte sin
+        copiarlo y el de esta foto no cambia.
+
+        Returns:
+            CreditSnapshot nuevo, o None si no se pudo consultar
+        """
+        clients = get_all_clients_data()
+        if not clients:
+            return None
+
+        if self.engine == 'sql' or self._ventas is None:
+            # El motor SQL ya agrega en el servidor; basta con repetir la consulta
+            return CreditSnapshot(clients, None, self.engine)
+
+        # El estado incremental pasa a la foto nueva; si algo falla, esta
+        # foto lo reconstruye desde cero la próxima vez
+        state, self._state = self._state, None
+        sync, self._sync = self._sync, None
+        if sync is None:
+            sync = VentasDeltaLoader(pending_only=False, ventas=self._ventas)
+        if state is None:
+            state = CreditScoreState(self._ventas)
+        state.advance()
+
+        delta = sync.refresh()
+        if delta is None:
+            return None
+
+        spending = self._spending
+        if delta['full']:
+            # Reconciliación completa: se reconstruyen los totales
+            state = CreditScoreState(sync.ventas)
+            spending = None
+        else:
+            state.apply_changes(delta['changed'], delta['removed'])
+            if spending is not None and (delta['changed'] or delta['removed']):
+                spending = spending.updated(delta['changed'], delta['removed'])
+
+        changed = delta['full'] or delta['changed'] or delta['removed']
+        ventas = sync.ventas
+
+        snapshot = CreditSnapshot(clients, ventas, self.engine, scores=state.scores(clients))
+        snapshot._state = state
+        snapshot._sync = sync
+        snapshot._spending = spending
+        if not changed:
+            snapshot._ventas_index = self._ventas_index
+        elif not delta['full'] and self._ventas_index is not None:
+            snapshot._ventas_index = self._ventas_index.updated(ventas, delta['changed'], delta['removed'])
+
+        logging.info(f"Puntajes actualizados incrementalmente: {len(delta['changed'])} ventas aplicadas")
+        return snapshot
+
+    @property
+    def ventas(self):
+        if self._ventas is None:
+            self._ventas = get_all_ventas_data()
+            if self._ventas_index is not None and self._ventas_index.ventas_data is None:
+                # El índice armado desde el conjunto columnar ya puede dar las ventas por cliente
+                self._ventas_index.ventas_data = self._ventas
+        return self._ventas
+
+    @property
+    def ventas_index(self):
+        """Índice por cliente compartido por el puntaje, el top y los detalles"""
+        if self._ventas_index is None:
+            frame = get_ventas_frame() if self._ventas is None else None
+            if frame is not None:
+                # Motor 'sql': los agregados salen del conjunto columnar, sin cargar el mapa de ventas
+                self._ventas_index = VentasIndex(frame=frame)
+            else:
+                self._ventas_index = VentasIndex(self.ventas)
+        return self._ventas_index
+
+    @property
+    def spending_index(self):
+        """Gasto por cliente y por mes para el top; se actualiza con el delta en refresh()"""
+        if self._spending is None:
+            frame = get_ventas_frame() if self._ventas is None else None
+            if frame is not None:
+                self._spending = SpendingIndex(frame=frame)
+            else:
+                self._spending = SpendingIndex(self.ventas)
+        return self._spending
+
+    @staticmethod
+    def _group_by_level(scores):
+        """Agrupar IDs de cliente por nivel, ordenados por puntaje descendente"""
+        levels = {level_name: [] for level_name in CREDIT_LEVELS}
+
+        for client_id, data in sorted(scores.items(), key=lambda x: x[1]['credit_score'], reverse=True):
+            levels.setdefault(data['credit_level']['name'], []).append(client_id)
+
+        return levels
+
+    def clients_in_level(self, level_name):
+        """Puntajes de los clientes de un nivel, ordenados por puntaje"""
+        return {client_id: self.scores[client_id] for client_id in self.levels.get(level_name, [])}
+
+    def get_score(self, client_id):
+        return self.scores.get(client_id)
+
+    def credit_data(self, client_id):
+        """Datos crediticios del cliente con su detalle de transacciones (se calcula al pedirlo)"""
+        data = self.scores.get(client_id)
+        if data is not None and 'transaction_details' not in data:
+            if self._ventas is None:
+                # Sin ventas en memoria (motor 'sql'): consultar sólo las del cliente
+                score_data = calculate_client_credit_score(client_id, get_client_payment_history(client_id))
+            else:
+                score_data = calculate_client_credit_score(client_id, self.ventas, self.ventas_index)
+            data['transaction_details'] = score_data['details']
+        return data
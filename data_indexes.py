@@ -0,0 +1,789 @@
+# data_indexes.py
+import heapq
+import logging
+import re
+import unicodedata
+from collections.abc import Mapping, ItemsView, ValuesView
+from datetime import date, timedelta
+from operator import itemgetter
+
+import pandas as pd
+
+from ventas_dataset import frame_from_ventas, client_aggregates, client_folios
+
+
+def parse_iso_date(value):
+    """Convertir 'YYYY-MM-DD' (o date/datetime) a date; None si no es válido"""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value if type(value) is date else value.date()
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class ClientVentasSummary:
+    """Agregados precalculados de las ventas de un cliente"""
+    __slots__ = ('folios', 'oldest_pending', 'last_purchase', 'purchase_count', 'total_spent')
+
+    def __init__(self):
+        self.folios = []
+        self.oldest_pending = None
+        self.last_purchase = None
+        self.purchase_count = 0
+        self.total_spent = 0.0
+
+
+def _as_date(value):
+    return None if pd.isna(value) else value.date()
+
+
+_ABSENT = object()
+_REMOVED = object()  # Marca de clave quitada en una capa
+
+
+class _LayeredItems(ItemsView):
+    def __iter__(self):
+        return self._mapping._iter_items()
+
+
+class _LayeredValues(ValuesView):
+    def __iter__(self):
+        return (value for _, value in self._mapping._iter_items())
+
+
+class LayeredMap(Mapping):
+    """
+    Mapa de sólo lectura que se actualiza sin copiarse: updated() regresa
+    un mapa nuevo que comparte con éste la base y agrega una capa con los
+    cambios, así una foto anterior sigue viendo sus datos y la nueva no
+    paga una copia de todo el historial.
+
+    Las capas se mezclan como un contador binario (una capa absorbe a la
+    de abajo si ésta no es más del doble de grande) y se aplanan sobre la
+    base cuando suman más de 1/COMPACT_RATIO de ella; el costo de cada
+    actualización es proporcional, amortizado, al número de cambios. La
+    búsqueda revisa a lo más O(log n) capas.
+
+    El dict que se pasa como base queda a cargo del mapa y no debe
+    modificarse después.
+    """
+
+    __slots__ = ('_layers', '_len')
+
+    COMPACT_RATIO = 8
+    COMPACT_MIN = 1024
+
+    def __init__(self, base=None):
+        if isinstance(base, LayeredMap):
+            self._layers, self._len = base._layers, base._len
+        else:
+            base = {} if base is None else base
+            self._layers = (base,)  # de la más nueva a la base
+            self._len = len(base)
+
+    def _lookup(self, key):
+        for layer in self._layers:
+            value = layer.get(key, _ABSENT)
+            if value is not _ABSENT:
+                return value
+        return _ABSENT
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _ABSENT or value is _REMOVED:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _ABSENT or value is _REMOVED else value
+
+    def __contains__(self, key):
+        value = self._lookup(key)
+        return value is not _ABSENT and value is not _REMOVED
+
+    def __len__(self):
+        return self._len
+
+    def _overlay(self):
+        """Capas superiores mezcladas en un dict (la más nueva gana)"""
+        overlay = {}
+        for layer in reversed(self._layers[:-1]):
+            overlay.update(layer)
+        return overlay
+
+    def _iter_items(self):
+        base = self._layers[-1]
+        if len(self._layers) == 1:
+            yield from base.items()
+            return
+        overlay = self._overlay()
+        for key, value in base.items():
+            value = overlay.get(key, value)
+            if value is not _REMOVED:
+                yield key, value
+        for key, value in overlay.items():
+            if value is not _REMOVED and key not in base:
+                yield key, value
+
+    def __iter__(self):
+        return (key for key, _ in self._iter_items())
+
+    def items(self):
+        return _LayeredItems(self)
+
+    def values(self):
+        return _LayeredValues(self)
+
+    def updated(self, changed, removed=()):
+        """
+        Mapa nuevo con changed ({clave: valor}) aplicado y las claves de
+        removed quitadas; éste no se modifica.
+        """
+        layer = {key: _REMOVED for key in removed if key in self}
+        layer.update(changed)
+        if not layer:
+            return self
+
+        size = self._len
+        for key, value in layer.items():
+            size += (value is not _REMOVED) - (key in self)
+
+        layers = [layer] + list(self._layers)
+        while len(layers) > 2 and len(layers[1]) <= 2 * len(layers[0]):
+            merged = dict(layers[1])
+            merged.update(layers[0])
+            layers[0:2] = [merged]
+
+        result = LayeredMap.__new__(LayeredMap)
+        result._layers, result._len = tuple(layers), size
+        base = layers[-1]
+        if sum(len(layer) for layer in layers[:-1]) > max(len(base) // self.COMPACT_RATIO, self.COMPACT_MIN):
+            return LayeredMap(dict(result._iter_items()))
+        return result
+
+
+class VentasIndex:
+    """
+    Índice de ventas agrupadas por cliente (cveCte).
+
+    Los agregados por cliente (compras, gasto, última compra, pendiente
+    más antigua) salen de un solo groupby sobre el conjunto columnar de
+    ventas (ventas_dataset); después cada consulta por cliente es O(1).
+
+    Se puede construir desde el mapa {Folio: venta} o directamente desde
+    un DataFrame (get_ventas_frame) cuando no hace falta tener las ventas
+    fila por fila; en ese caso ventas_for() no está disponible ni se puede
+    actualizar con updated().
+    """
+
+    def __init__(self, ventas_data=None, frame=None):
+        self.ventas_data = ventas_data
+        if frame is None:
+            frame = frame_from_ventas(ventas_data or {})
+
+        self._by_client = self._summaries(frame)
+
+        logging.info(f"Índice de ventas construido: {len(frame)} ventas, "
+                     f"{len(self._by_client)} clientes")
+
+    @staticmethod
+    def _summaries(frame):
+        aggregates = client_aggregates(frame)
+        folios = client_folios(frame)
+
+        summaries = {}
+        for client_id, count, spent, last, oldest in zip(
+                aggregates.index, aggregates['purchase_count'].to_numpy(),
+                aggregates['total_spent'].to_numpy(), aggregates['last_purchase'],
+                aggregates['oldest_pending']):
+            summary = summaries[client_id] = ClientVentasSummary()
+            summary.folios = folios.get(client_id, [])
+            summary.purchase_count = int(count)
+            summary.total_spent = float(spent)
+            summary.last_purchase = _as_date(last)
+            summary.oldest_pending = _as_date(oldest)
+        return summaries
+
+    def updated(self, ventas_data, changed_ventas, removed_folios=()):
+        """
+        Índice nuevo para ventas_data (el mapa con los cambios del delta ya
+        aplicados). Sólo se recalculan los clientes de las ventas nuevas,
+        modificadas o retiradas; los demás resúmenes se comparten con este
+        índice, que no cambia.
+        """
+        if self.ventas_data is None:
+            return VentasIndex(ventas_data)
+
+        touched = set(changed_ventas) | set(removed_folios)
+        clients = set()
+        for folio in touched:
+            old = self.ventas_data.get(folio)
+            if old is not None:
+                clients.add(old.get('cveCte'))
+        for venta in changed_ventas.values():
+            clients.add(venta.get('cveCte'))
+        clients.discard(None)
+        clients.discard('')
+
+        # Folios de cada cliente afectado: los que conserva, en su orden, y después los nuevos
+        subset = {}
+        for client_id in clients:
+            summary = self._by_client.get(client_id)
+            for folio in (summary.folios if summary else ()):
+                if folio not in touched:
+                    subset[folio] = ventas_data[folio]
+        for folio, venta in changed_ventas.items():
+            if venta.get('cveCte') in clients and folio in ventas_data:
+                subset[folio] = ventas_data[folio]
+
+        index = VentasIndex.__new__(VentasIndex)
+        index.ventas_data = ventas_data
+        index._by_client = {client_id: summary for client_id, summary in self._by_client.items()
+                            if client_id not in clients}
+        index._by_client.update(self._summaries(frame_from_ventas(subset)))
+
+        logging.info(f"Índice de ventas actualizado: {len(touched)} ventas, {len(clients)} clientes recalculados")
+        return index
+
+    def summary(self, client_id):
+        return self._by_client.get(client_id)
+
+    def ventas_for(self, client_id):
+        """Lista de ventas (dicts) del cliente"""
+        summary = self._by_client.get(client_id)
+        if summary is None or self.ventas_data is None:
+            return []
+        return [self.ventas_data[folio] for folio in summary.folios]
+
+    def oldest_pending(self, client_id):
+        summary = self._by_client.get(client_id)
+        return summary.oldest_pending if summary else None
+
+    def last_purchase(self, client_id):
+        summary = self._by_client.get(client_id)
+        return summary.last_purchase if summary else None
+
+    def purchase_count(self, client_id):
+        summary = self._by_client.get(client_id)
+        return summary.purchase_count if summary else 0
+
+    def total_spent(self, client_id):
+        summary = self._by_client.get(client_id)
+        return summary.total_spent if summary else 0.0
+
+    def spending(self):
+        """Gasto total por cliente (sólo los que gastaron algo): {cveCte: monto}"""
+        return {client_id: summary.total_spent for client_id, summary in self._by_client.items()
+                if summary.total_spent > 0}
+
+    def client_ids(self):
+        return self._by_client.keys()
+
+    def __contains__(self, client_id):
+        return client_id in self._by_client
+
+    def __len__(self):
+        return len(self._by_client)
+
+
+# Periodos del top de gasto: todo el historial, el año y el mes en curso
+SPENDING_WINDOWS = ('all', 'year', 'month')
+
+
+def _month_key(year, month):
+    return year * 12 + month - 1
+
+
+class SpendingIndex:
+    """
+    Gasto por cliente precalculado: total de todo el historial y total por
+    mes. Las ventas se suman una sola vez; el top de cualquier periodo
+    (SPENDING_WINDOWS) es un heapq.nlargest sobre a lo más un total por
+    cliente, sin importar el tamaño del historial.
+
+    updated() aplica las ventas nuevas o modificadas del delta y regresa
+    un índice nuevo (el de la foto anterior no cambia, igual que
+    CreditSnapshot). Las ventas por folio, los totales y cada mes son
+    LayeredMap: el índice nuevo sólo agrega los folios, clientes y meses
+    que tocó el delta y comparte todo lo demás con el anterior.
+    Construido sólo desde un DataFrame (motor 'sql') no guarda las ventas
+    por folio y no se puede actualizar.
+    """
+
+    def __init__(self, ventas_data=None, frame=None):
+        keep_entries = frame is None
+        if frame is None:
+            frame = frame_from_ventas(ventas_data or {})
+
+        self._entries = {} if keep_entries else None  # folio -> (cveCte, mes o None, total)
+        self._totals = {}    # cveCte -> gasto de todo el historial
+        self._monthly = {}   # mes (año * 12 + mes - 1) -> {cveCte: gasto}
+        self._years = {}     # año -> {cveCte: gasto}, se arma al pedirlo
+        self._load(frame, keep_entries)
+
+        logging.info(f"Índice de gasto construido: {len(self._totals)} clientes, "
+                     f"{len(self._monthly)} meses")
+
+    def _load(self, frame, keep_entries):
+        frame = frame[frame['cveCte'].astype(object) != '']
+        clients = frame['cveCte'].astype(object)
+        fecha = frame['fecha'].dt
+        months = (fecha.year * 12 + fecha.month - 1).astype('Int64')
+
+        self._totals = LayeredMap(frame.groupby(clients, sort=False)['total'].sum().to_dict())
+        monthly = {}
+        for (month, client_id), spent in frame.groupby([months, clients], sort=False)['total'].sum().items():
+            monthly.setdefault(int(month), {})[client_id] = spent
+        self._monthly = {month: LayeredMap(totals) for month, totals in monthly.items()}
+
+        if keep_entries:
+            self._entries = LayeredMap(dict(zip(frame['folio'].tolist(),
+                                                zip(clients.tolist(), months.to_numpy(object, na_value=None).tolist(),
+                                                    frame['total'].tolist()))))
+
+    @staticmethod
+    def _apply(totals, deltas):
+        """LayeredMap nuevo con los montos de deltas ({cveCte: monto}) sumados"""
+        changed, removed = {}, []
+        for client_id, amount in deltas.items():
+            spent = totals.get(client_id, 0.0) + amount
+            if abs(spent) < 1e-6:
+                # Sin residuos de punto flotante al quitar la última venta del cliente
+                removed.append(client_id)
+            else:
+                changed[client_id] = spent
+        return totals.updated(changed, removed)
+
+    def updated(self, changed_ventas, removed_folios=()):
+        """
+        Índice nuevo con las ventas nuevas o modificadas reemplazadas y
+        las retiradas quitadas (mismo formato que VentasDeltaLoader.refresh).
+        El costo depende del tamaño del delta, no del historial.
+        """
+        if self._entries is None:
+            raise ValueError("El índice de gasto se construyó sin ventas por folio")
+
+        totals, monthly = {}, {}
+
+        def add(client_id, month, amount):
+            totals[client_id] = totals.get(client_id, 0.0) + amount
+            if month is not None:
+                month_totals = monthly.setdefault(month, {})
+                month_totals[client_id] = month_totals.get(client_id, 0.0) + amount
+
+        touched = {str(folio) for folio in list(changed_ventas) + list(removed_folios)}
+        for folio in touched:
+            entry = self._entries.get(folio)
+            if entry is not None:
+                client_id, month, amount = entry
+                add(client_id, month, -amount)
+
+        entries = {}
+        changes = frame_from_ventas(changed_ventas)
+        changes = changes[changes['cveCte'].astype(object) != '']
+        for folio, client_id, fecha, amount in zip(changes['folio'], changes['cveCte'].astype(object),
+                                                   changes['fecha'], changes['total']):
+            month = None if pd.isna(fecha) else _month_key(fecha.year, fecha.month)
+            entries[folio] = (client_id, month, float(amount))
+            add(client_id, month, float(amount))
+
+        index = SpendingIndex.__new__(SpendingIndex)
+        index._entries = self._entries.updated(entries, [folio for folio in touched if folio not in entries])
+        index._totals = self._apply(self._totals, totals)
+        index._monthly = dict(self._monthly)
+        for month, deltas in monthly.items():
+            index._monthly[month] = self._apply(self._monthly.get(month, LayeredMap()), deltas)
+        touched_years = {month // 12 for month in monthly}
+        index._years = {year: totals for year, totals in self._years.items() if year not in touched_years}
+        return index
+
+    def totals(self, window='all', today=None):
+        """Gasto por cliente en el periodo: {cveCte: monto}"""
+        if window == 'all':
+            return self._totals
+
+        today = today or date.today()
+        if window == 'month':
+            return self._monthly.get(_month_key(today.year, today.month), {})
+        if window != 'year':
+            raise ValueError(f"Periodo desconocido: {window}")
+
+        totals = self._years.get(today.year)
+        if totals is None:
+            totals = {}
+            for month in range(_month_key(today.year, 1), _month_key(today.year, 12) + 1):
+                for client_id, spent in self._monthly.get(month, {}).items():
+                    totals[client_id] = totals.get(client_id, 0.0) + spent
+            self._years[today.year] = totals
+        return totals
+
+    def top(self, n, window='all', today=None, where=None):
+        """
+        Los n clientes que más gastaron en el periodo (sólo gasto > 0), de
+        mayor a menor. where(cveCte) filtra, p. ej. clientes o empresas.
+
+        Returns:
+            [(cveCte, monto), ...]
+        """
+        candidates = ((client_id, spent) for client_id, spent in self.totals(window, today).items()
+                      if spent > 0 and (where is None or where(client_id)))
+        return heapq.nlargest(n, candidates, key=itemgetter(1))
+
+    def summary(self, window='all', today=None, where=None):
+        """Número de clientes con gasto en el periodo y su suma: (clientes, monto)"""
+        count, total = 0, 0.0
+        for client_id, spent in self.totals(window, today).items():
+            if spent > 0 and (where is None or where(client_id)):
+                count += 1
+                total += spent
+        return count, total
+
+    def __len__(self):
+        return len(self._totals)
+
+
+class CreditLevelIndex:
+    """
+    Puntajes crediticios agrupados por (nivel, empresa). Se arma una vez
+    por snapshot o por carga de ClientsStates; cada tabla de nivel lee
+    directamente su cubeta y el número de clientes de cada una es el
+    tamaño de su dict, sin recorrer a todos los clientes ni consultar
+    client_states por cada tabla.
+    """
+
+    def __init__(self, scores, client_states):
+        self._keys = {}     # client_id -> (nivel, empresa)
+        self._buckets = {}  # (nivel, empresa) -> {client_id: datos del puntaje}
+
+        for client_id, credit_data in scores.items():
+            key = (credit_data['credit_level']['name'],
+                   bool(client_states.get(client_id, {}).get('company', False)))
+            self._keys[client_id] = key
+            self._buckets.setdefault(key, {})[client_id] = credit_data
+
+    def clients_in(self, level_name, is_company):
+        """Puntajes de una cubeta: {client_id: datos del puntaje}"""
+        return self._buckets.get((level_name, is_company), {})
+
+    def count(self, level_name, is_company):
+        return len(self._buckets.get((level_name, is_company), ()))
+
+    def counts(self, is_company):
+        """Clientes por nivel de un tipo: {nivel: número}"""
+        return {level_name: len(bucket) for (level_name, company), bucket in self._buckets.items()
+                if company == is_company and bucket}
+
+    def update_client(self, client_id, is_company):
+        """
+        Pasar a un cliente a la cubeta de clientes o de empresas.
+
+        Returns:
+            True si el cliente cambió de cubeta
+        """
+        is_company = bool(is_company)
+        old_key = self._keys.get(client_id)
+        if old_key is None or old_key[1] == is_company:
+            return False
+
+        new_key = (old_key[0], is_company)
+        self._buckets.setdefault(new_key, {})[client_id] = self._buckets[old_key].pop(client_id)
+        self._keys[client_id] = new_key
+        return True
+
+    def __contains__(self, client_id):
+        return client_id in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+
+_NON_DIGITS_RE = re.compile(r'\D')
+_PHONE_QUERY_RE = re.compile(r'^[\d\s()+-]+$')
+
+
+def normalize_search_text(text):
+    """Texto comparable para la búsqueda: sin acentos, en minúsculas y con espacios simples"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.lower().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ClientSearchIndex:
+    """
+    Índice de búsqueda de clientes por nombre, ID y teléfonos.
+
+    Cada cliente se guarda con su texto normalizado (normalize_search_text;
+    los teléfonos sólo con dígitos) y un índice invertido de trigramas:
+    una búsqueda cruza las listas de sus trigramas y sólo confirma con la
+    subcadena a los candidatos. Si el texto nuevo contiene al anterior
+    (el usuario siguió escribiendo) se filtra el resultado anterior en
+    lugar de volver al índice.
+    """
+
+    PHONE_FIELDS = ('telefono1', 'telefono2', 'telefono3')
+
+    def __init__(self, clients):
+        """
+        Args:
+            clients: {client_id: datos del cliente} (Record o dict con 'nombre' y teléfonos)
+        """
+        self._texts = {}
+        self._grams = {}
+        self._last_query = None
+        self._last_result = None
+
+        for client_id, client_data in clients.items():
+            phones = ' '.join(_NON_DIGITS_RE.sub('', str(client_data.get(field) or ''))
+                              for field in self.PHONE_FIELDS)
+            text = '\n'.join((normalize_search_text(client_data.get('nombre')),
+                              normalize_search_text(client_id), phones))
+            self._texts[client_id] = text
+            for gram in _trigrams(text):
+                self._grams.setdefault(gram, set()).add(client_id)
+
+    @staticmethod
+    def normalize_query(query):
+        """Un texto que parece teléfono ('55 1234-56') se busca sólo por sus dígitos"""
+        if query and _PHONE_QUERY_RE.match(query) and any(char.isdigit() for char in query):
+            return _NON_DIGITS_RE.sub('', query)
+        return normalize_search_text(query)
+
+    def search(self, query):
+        """
+        Clientes cuyo nombre, ID o teléfono contienen el texto.
+
+        Returns:
+            frozenset de client_id, o None si el texto está vacío (sin filtro)
+        """
+        query = self.normalize_query(query)
+        if not query:
+            return None
+        if query == self._last_query:
+            return self._last_result
+
+        if self._last_query and self._last_query in query:
+            # Cualquier coincidencia de "abcd" también lo es de "abc": basta con estrechar
+            candidates = self._last_result
+        else:
+            grams = sorted(_trigrams(query), key=lambda gram: len(self._grams.get(gram, ())))
+            if not grams:
+                candidates = self._texts.keys()  # Menos de 3 caracteres: no hay trigramas
+            elif any(gram not in self._grams for gram in grams):
+                candidates = ()
+            else:
+                candidates = self._grams[grams[0]].intersection(*(self._grams[gram] for gram in grams[1:]))
+
+        texts = self._texts
+        result = frozenset(client_id for client_id in candidates if query in texts[client_id])
+        self._last_query, self._last_result = query, result
+        return result
+
+    def __len__(self):
+        return len(self._texts)
+
+
+# Cubetas de antigüedad del tablero, en el orden en que se muestran
+AGING_BUCKETS = ('promesa', 'verde', 'amarillo', 'rojo')
+
+
+def aging_bucket(promise_date, oldest_pending, today):
+    """
+    Misma regla que categorize_client: promesa vigente, si no por días
+    desde la venta pendiente más antigua (<30 verde, <60 amarillo, resto rojo).
+    """
+    if promise_date is not None and promise_date >= today:
+        return 'promesa'
+    if oldest_pending is None:
+        return 'rojo'
+
+    days = (today - oldest_pending).days
+    if days < 30:
+        return 'verde'
+    if days < 60:
+        return 'amarillo'
+    return 'rojo'
+
+
+def next_aging_transition(promise_date, oldest_pending, today):
+    """
+    Primer día (posterior a today) en que cambia la cubeta: el día después
+    de vencer la promesa, o cuando la deuda cumple 30 o 60 días. None si ya
+    no cambiará sola (rojo).
+    """
+    if promise_date is not None and promise_date >= today:
+        return promise_date + timedelta(days=1)
+    if oldest_pending is None:
+        return None
+
+    days = (today - oldest_pending).days
+    if days < 30:
+        return oldest_pending + timedelta(days=30)
+    if days < 60:
+        return oldest_pending + timedelta(days=60)
+    return None
+
+
+def _saldo(client_data):
+    saldo = client_data.get('saldo', 0.0)
+    if isinstance(saldo, str):
+        try:
+            return float(saldo)
+        except ValueError:
+            return 0.0
+    return saldo if isinstance(saldo, (int, float)) else 0.0
+
+
+class ClientAging:
+    """Antigüedad de la deuda de un cliente y la cubeta donde cae"""
+    __slots__ = ('client_id', 'is_company', 'saldo', 'promise_date',
+                 'oldest_pending', 'bucket', 'next_change')
+
+    def __init__(self, client_id, is_company, saldo, promise_date, oldest_pending):
+        self.client_id = client_id
+        self.is_company = is_company
+        self.saldo = saldo
+        self.promise_date = promise_date
+        self.oldest_pending = oldest_pending
+        self.bucket = None
+        self.next_change = None
+
+
+class AgingIndex:
+    """
+    Clientes con deuda agrupados por (empresa, cubeta de antigüedad).
+    Se construye una vez por carga con la venta pendiente más antigua de
+    cada cliente (VentasIndex) y su promesa de pago; los clientes en buró
+    quedan fuera. Las tablas y los totales del tablero leen directamente
+    de las cubetas.
+
+    Un min-heap guarda el próximo día en que cada cliente cambia de
+    cubeta; advance(today) mueve sólo a los clientes que ya llegaron a ese
+    día, sin recorrer a todos.
+    """
+
+    def __init__(self, clientes_data, client_states, clients_buro, ventas_index, today=None):
+        self.today = today or date.today()
+        self._clients = {}
+        self._buckets = {(is_company, bucket): {}
+                         for is_company in (False, True) for bucket in AGING_BUCKETS}
+        self._heap = []  # (día del cambio, client_id)
+
+        for client_id, client_data in clientes_data.items():
+            if client_id in clients_buro:
+                continue
+
+            state = client_states.get(client_id, {})
+            entry = ClientAging(client_id,
+                                bool(state.get('company', False)),
+                                _saldo(client_data),
+                                parse_iso_date(state.get('promiseDate')),
+                                ventas_index.oldest_pending(client_id))
+            self._clients[client_id] = entry
+            self._place(entry)
+
+        logging.info(f"Índice de antigüedad construido: {len(self._clients)} clientes")
+
+    def _place(self, entry):
+        entry.bucket = aging_bucket(entry.promise_date, entry.oldest_pending, self.today)
+        self._buckets[(entry.is_company, entry.bucket)][entry.client_id] = entry
+
+        entry.next_change = next_aging_transition(entry.promise_date, entry.oldest_pending, self.today)
+        if entry.next_change is not None:
+            heapq.heappush(self._heap, (entry.next_change, entry.client_id))
+
+    def _unplace(self, entry):
+        self._buckets[(entry.is_company, entry.bucket)].pop(entry.client_id, None)
+
+    def advance(self, today=None):
+        """
+        Pasar al día indicado y mover a los clientes cuya cubeta cambió.
+
+        Returns:
+            Lista de (client_id, is_company, cubeta anterior, cubeta nueva)
+        """
+        today = today or date.today()
+        if today <= self.today:
+            return []
+        self.today = today
+
+        moved = []
+        while self._heap and self._heap[0][0] <= today:
+            when, client_id = heapq.heappop(self._heap)
+            entry = self._clients.get(client_id)
+            if entry is None or entry.next_change != when:
+                continue  # entrada vieja: el cliente se reubicó después
+
+            old_bucket = entry.bucket
+            self._unplace(entry)
+            self._place(entry)
+            if entry.bucket != old_bucket:
+                moved.append((client_id, entry.is_company, old_bucket, entry.bucket))
+
+        if moved:
+            logging.info(f"Cambio de día ({today}): {len(moved)} clientes cambiaron de cubeta")
+        return moved
+
+    def update_client(self, client_id, **changes):
+        """
+        Actualizar promise_date / is_company / saldo de un cliente y
+        reubicarlo. Regresa el movimiento como en advance(), o None.
+        """
+        entry = self._clients.get(client_id)
+        if entry is None:
+            return None
+
+        old_key = (entry.is_company, entry.bucket)
+        self._unplace(entry)
+        for name, value in changes.items():
+            setattr(entry, name, value)
+        self._place(entry)
+
+        if (entry.is_company, entry.bucket) == old_key:
+            return None
+        return (client_id, entry.is_company, old_key[1], entry.bucket)
+
+    def next_change(self):
+        """Día más próximo en que algún cliente cambia de cubeta (o None)"""
+        while self._heap:
+            when, client_id = self._heap[0]
+            entry = self._clients.get(client_id)
+            if entry is not None and entry.next_change == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def days_outstanding(self, oldest_pending):
+        """Días desde la venta pendiente más antigua, según el día del índice"""
+        return (self.today - oldest_pending).days if oldest_pending else None
+
+    def get(self, client_id):
+        return self._clients.get(client_id)
+
+    def bucket_of(self, client_id):
+        entry = self._clients.get(client_id)
+        return entry.bucket if entry else None
+
+    def clients_in(self, is_company, bucket):
+        """Entradas (ClientAging) de una cubeta"""
+        return self._buckets[(is_company, bucket)].values()
+
+    def total(self, is_company, bucket=None):
+        """Saldo total de una cubeta, o de todas las cubetas del tipo"""
+        buckets = AGING_BUCKETS if bucket is None else (bucket,)
+        return sum(entry.saldo
+                   for name in buckets
+                   for entry in self._buckets[(is_company, name)].values())
+
+    def __contains__(self, client_id):
+        return client_id in self._clients
+
+    def __len__(self):
+        return len(self._clients)
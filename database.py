@@ -1,30 +1,319 @@
 # database.py
+import atexit
 import pyodbc
 import logging
 from datetime import datetime, date, time
-from config import SQL_SERVER, DATABASE, USERNAME, PASSWORD
+from functools import lru_cache
+from config import (SQL_SERVER, DATABASE, USERNAME, PASSWORD, DB_POOL_MAX_SIZE,
+                    DB_POOL_TIMEOUT, DB_POOL_IDLE_TIMEOUT, DB_POOL_PING_AFTER,
+                    DB_FETCH_BATCH_SIZE)
+from connection_pool import ConnectionPool, PoolTimeoutError
+from data_indexes import VentasIndex
+from ventas_dataset import batch_to_columns, frame_from_batches
+from records import record_type
+from ticket_parser import extract_ticket_number
+
+def _open_connection():
+    conn_str = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={SQL_SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD}'
+    logging.info(f"Intentando conectar a la base de datos: {SQL_SERVER}/{DATABASE}")
+    connection = pyodbc.connect(conn_str)
+    logging.info("Conexión exitosa a la base de datos")
+    return connection
+
+
+_connection_pool = ConnectionPool(
+    _open_connection,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+    ping_after=DB_POOL_PING_AFTER
+)
+atexit.register(_connection_pool.close_all)
+
 
 def get_db_connection():
+    """
+    Obtener una conexión del pool.
+    close() devuelve la conexión al pool en lugar de cerrar la sesión.
+    """
     try:
-        conn_str = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={SQL_SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD}'
-        logging.info(f"Intentando conectar a la base de datos: {SQL_SERVER}/{DATABASE}")
-        connection = pyodbc.connect(conn_str)
-        logging.info("Conexión exitosa a la base de datos")
-        return connection
+        return _connection_pool.acquire()
     except pyodbc.Error as e:
         logging.error(f"Error al conectar a la base de datos: {e}")
         return None
+    except PoolTimeoutError as e:
+        logging.error(f"Error al obtener conexión del pool: {e}")
+        return None
+
+
+def check_db_connection():
+    """Verificar si el servidor responde (para decidir el modo sin conexión)"""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    conn.close()
+    return True
 
 
 def get_clients_data():
+    """Clientes con saldo (Saldo > 0), leídos por lotes (iter_clients)"""
+    try:
+        clients_data = _collect(iter_clients(with_balance_only=True))
+        logging.info(f"Datos procesados exitosamente. Total de registros: {len(clients_data)}")
+        return clients_data
+        
+    except pyodbc.Error as e:
+        logging.error(f"Error al obtener datos de clientes: {e}")
+        return {}
+    except Exception as e:
+        logging.error(f"Error inesperado al procesar datos: {e}")
+        return {}
+
+
+@lru_cache(maxsize=4096)
+def _to_date(date_value):
+    """
+    Fecha de SQL Server (date/datetime o 'YYYY-MM-DD') como date; None si
+    viene vacía o no es válida. Los datos guardan la fecha como date y sólo
+    se formatea al mostrarla. Las fechas iguales comparten el mismo objeto,
+    igual que los textos internados.
+    """
+    if date_value:
+        if isinstance(date_value, datetime):
+            return date_value.date()
+        if isinstance(date_value, date):
+            return date_value
+        try:
+            return datetime.strptime(str(date_value), '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            logging.warning(f"Valor de fecha no válido: {date_value}")
+            return None
+    return None
+
+
+def _format_time(time_value):
+    if time_value:
+        if isinstance(time_value, time):
+            return time_value.strftime('%H:%M:%S')
+        try:
+            if isinstance(time_value, str):
+                return time_value
+            return datetime.strptime(str(time_value), '%H:%M:%S').strftime('%H:%M:%S')
+        except (ValueError, TypeError):
+            logging.warning(f"Valor de hora no válido: {time_value}")
+            return ""
+    return ""
+
+
+def _text(value):
+    return value.strip() if value else ""
+
+
+def _number(value):
+    return float(value) if value else 0.0
+
+
+def _integer(value):
+    return int(value) if value else 0
+
+
+def _phone(value):
+    return format_phone_number(_text(value))
+
+
+def _boolean(value):
+    return bool(value)
+
+
+# Columnas de Clientes4 en el orden del SELECT: (clave, alias, conversión)
+_CLIENT_FIELDS = (
+    ("estado", "Estado", _text),
+    ("fecha", "Fecha", _to_date),
+    ("nombre", "Nombre", _text),
+    ("direccion", "Direccion", _text),
+    ("telefono1", "Telefono1", _text),
+    ("telefono2", "Telefono2", _text),
+    ("telefono3", "Telefono3", _phone),
+    ("descripcion", "Descripcion", _text),
+    ("email", "Email", _text),
+    ("referencia", "Referencia", _text),
+    ("obs", "Obs", _text),
+    ("credito", "Credito", _boolean),
+    ("montoCredito", "MontoCredito", _number),
+    ("diasCredito", "DiasCredito", _integer),
+    ("interesCredito", "InteresCredito", _text),
+    ("saldo", "Saldo", _number),
+    ("nl", "NL", _integer),
+    ("nc", "NC", _text),
+    ("membresia", "Membresia", _to_date),
+    ("nivel", "Nivel", _integer),
+    ("modificado", "Modificado", _to_date),
+    ("et1", "Et1", _text),
+    ("lineaDeCredito", "LineaDeCredito", _text),
+)
+
+# Registro de un cliente; los textos repetitivos se internan
+ClientRecord = record_type("ClientRecord", [key for key, _, _ in _CLIENT_FIELDS],
+                           categories=("estado", "interesCredito", "nc", "et1", "lineaDeCredito"))
+_CLIENT_DATE_FIELDS = tuple(key for key, _, convert in _CLIENT_FIELDS if convert is _to_date)
+
+
+def _client_rows_to_dict(rows):
+    """Convertir filas de Clientes4 a ClientRecord por Clave"""
+    fields = [(alias, convert) for _, alias, convert in _CLIENT_FIELDS]
+    return {
+        str(row.Clave): ClientRecord(*[convert(getattr(row, alias)) for alias, convert in fields])
+        for row in rows
+    }
+
+
+# Columnas de Ventas: clave en el dict -> (expresión SQL, alias, conversión)
+_VENTAS_FIELDS = {
+    "estado": ("ISNULL(Estado, '')", "Estado", _text),
+    "cveCte": ("ISNULL(CveCte, '')", "CveCte", _text),
+    "cliente": ("ISNULL(Cliente, '')", "Cliente", _text),
+    "fecha": ("ISNULL(Fecha, '')", "Fecha", _to_date),
+    "hora": ("ISNULL(Hora, '')", "Hora", _format_time),
+    "total": ("ISNULL(Total, 0)", "Total", _number),
+    "restante": ("ISNULL(Restante, 0)", "Restante", _number),
+    "fechaPago": ("ISNULL(FechaPago, '')", "FechaPago", _to_date),
+    "paga": ("ISNULL(Paga, 0)", "Paga", _number),
+    "cambio": ("ISNULL(Cambio, '')", "Cambio", _text),
+    "ticket": ("ISNULL(Ticket, '')", "Ticket", _text),
+    "condiciones": ("ISNULL(Condiciones, '')", "Condiciones", _text),
+    "fechaProg": ("ISNULL(FechaProg, '')", "FechaProg", _to_date),
+    "corte": ("ISNULL(Corte, 0)", "Corte", _integer),
+    "vendedor": ("ISNULL(Vendedor, '')", "Vendedor", _text),
+    "comoPago": ("ISNULL(ComoPago, '')", "ComoPago", _text),
+    "diasCorte": ("ISNULL(DiasCred, 0)", "DiasCred", _integer),
+    "intCred": ("ISNULL(IntCred, '')", "IntCred", _text),
+    "articulos": ("ISNULL(Articulos, '')", "Articulos", _text),
+    "barCuenta": ("ISNULL(BarCuenta, '')", "BarCuenta", _text),
+    "barMesero": ("ISNULL(BarMesero, '')", "BarMesero", _text),
+    "notasAdicionales": ("ISNULL(NotasAdicionales, '')", "NotasAdicionales", _text),
+    "idBarCuenta": ("ISNULL(IdBarCuenta, '')", "IdBarCuenta", _text),
+    "bitacora": ("ISNULL(Bitacora, '')", "Bitacora", _text),
+    "anticipo": ("ISNULL(Anticipo, 0)", "Anticipo", _number),
+    "folioPago": ("ISNULL(FolioPago, '')", "FolioPago", _text),
+    "saldoCliente": ("ISNULL(SaldoCliente, 0)", "SaldoCliente", _number),
+    "caja": ("ISNULL(Caja, 0)", "Caja", _integer),
+}
+
+# Perfiles de columnas: cada consulta trae sólo lo que usa quien la pide.
+# El texto del ticket y demás columnas de texto libre sólo van en 'detail';
+# para lo demás el ticket se pide por Folio cuando hace falta (tickets.py).
+VENTAS_PROFILES = {
+    # Puntaje crediticio, índice de ventas y gasto por cliente
+    'scoring': ("estado", "cveCte", "fecha", "fechaPago", "total", "restante"),
+    # Tablero principal (ventas pendientes)
+    'dashboard': ("estado", "cveCte", "cliente", "fecha", "hora", "total", "restante",
+                  "fechaPago", "fechaProg", "condiciones", "diasCorte", "vendedor",
+                  "comoPago", "anticipo", "saldoCliente"),
+    # Todas las columnas
+    'detail': tuple(_VENTAS_FIELDS),
+}
+
+
+# Un tipo de registro por perfil: cada venta sólo reserva espacio para sus columnas
+_VENTA_CATEGORIES = ("estado", "cveCte", "cliente", "hora", "condiciones", "vendedor",
+                     "comoPago", "intCred")
+_VENTA_RECORDS = {
+    profile: record_type(f"Venta{profile.capitalize()}Record", ("folio",) + fields,
+                         categories=_VENTA_CATEGORIES)
+    for profile, fields in VENTAS_PROFILES.items()
+}
+
+
+def _dates_of(data, fields):
+    # Los snapshots guardados antes de tener fechas tipadas traen 'YYYY-MM-DD'
+    return {key: _to_date(data.get(key)) for key in fields}
+
+
+def ventas_from_dicts(ventas, profile):
+    """Reconstruir registros de ventas guardados como dicts (p. ej. el snapshot local)"""
+    cls = _VENTA_RECORDS[profile]
+    date_fields = [key for key in VENTAS_PROFILES[profile] if _VENTAS_FIELDS[key][2] is _to_date]
+    return {folio: cls.from_dict(venta, folio=folio, **_dates_of(venta, date_fields))
+            for folio, venta in ventas.items()}
+
+
+def clients_from_dicts(clients):
+    """Reconstruir registros de clientes guardados como dicts"""
+    return {client_id: ClientRecord.from_dict(client, **_dates_of(client, _CLIENT_DATE_FIELDS))
+            for client_id, client in clients.items()}
+
+
+def _ventas_columns(profile):
+    """Lista SELECT de Ventas para un perfil (siempre incluye Folio)"""
+    return ",\n                ".join(
+        ["Folio"] + [f"{_VENTAS_FIELDS[key][0]} as {_VENTAS_FIELDS[key][1]}"
+                     for key in VENTAS_PROFILES[profile]])
+
+
+def _ventas_rows_to_dict(rows, profile):
+    """Convertir filas de Ventas (columnas de _ventas_columns) a registros por Folio"""
+    cls = _VENTA_RECORDS[profile]
+    fields = [(_VENTAS_FIELDS[key][1], _VENTAS_FIELDS[key][2]) for key in VENTAS_PROFILES[profile]]
+    ventas = {}
+    for row in rows:
+        folio = str(row.Folio)
+        ventas[folio] = cls(folio, *[convert(getattr(row, alias)) for alias, convert in fields])
+    return ventas
+
+
+# --- Lectura por lotes ---
+
+def _fetch_batches(cursor, batch_size=DB_FETCH_BATCH_SIZE):
+    """Filas de un cursor ya ejecutado, en lotes de cursor.fetchmany(batch_size)"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _stream_query(query, decode, batch_size, description, params=()):
+    """
+    Ejecutar una consulta y entregar sus filas por lotes ya convertidos
+    con decode(filas).
+
+    Es un generador: la conexión sigue abierta mientras se consume y se
+    cierra al terminar o al cerrar el generador. En memoria sólo hay un
+    lote de filas de pyodbc a la vez, no el resultado completo.
+
+    Los errores se registran y se propagan para que quien consume no tome
+    un resultado parcial como completo.
+    """
     conn = get_db_connection()
     if not conn:
         logging.error("No se pudo establecer conexión con la base de datos")
-        return {}
-    
+        raise ConnectionError("No se pudo establecer conexión con la base de datos")
+
     try:
         cursor = conn.cursor()
-        query = """
+        logging.info(f"Ejecutando consulta SQL para {description}: {query}")
+        cursor.execute(query, *params)
+        count = 0
+        for rows in _fetch_batches(cursor, batch_size):
+            count += len(rows)
+            yield decode(rows)
+        logging.info(f"Registros leídos para {description}: {count}")
+    except pyodbc.Error as e:
+        logging.error(f"Error al leer {description}: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def _collect(batches):
+    """Juntar en un solo dict los lotes de iter_clients / iter_ventas"""
+    data = {}
+    for batch in batches:
+        data.update(batch)
+    return data
+
+
+_CLIENTS_QUERY = """
             SELECT 
                 Clave,
                 ISNULL(Estado, '') as Estado,
@@ -33,7 +322,7 @@ def get_clients_data():
                 ISNULL(Direccion, '') as Direccion,
                 ISNULL(Telefono1, '') as Telefono1,
                 ISNULL(Telefono2, '') as Telefono2,
-                ISNULL(Telefono3, '') as Telefono3,  -- NUEVA LÍNEA
+                ISNULL(Telefono3, '') as Telefono3,
                 ISNULL(Descripcion, '') as Descripcion,
                 ISNULL(Email, '') as Email,
                 ISNULL(Referencia, '') as Referencia,
@@ -51,177 +340,112 @@ def get_clients_data():
                 ISNULL(Et1, '') as Et1,
                 ISNULL(LineaDeCredito, '') as LineaDeCredito
             FROM Clientes4
-            WHERE Saldo > 0
+"""
+
+
+def iter_clients(with_balance_only=False, batch_size=DB_FETCH_BATCH_SIZE):
+    """
+    Clientes de Clientes4 por lotes: {Clave: ClientRecord} de hasta
+    batch_size clientes cada uno.
+
+    Args:
+        with_balance_only: sólo los clientes con Saldo > 0 (get_clients_data)
+    """
+    query = _CLIENTS_QUERY + ("            WHERE Saldo > 0\n" if with_balance_only else "")
+    return _stream_query(query, _client_rows_to_dict, batch_size,
+                         "clientes con saldo" if with_balance_only else "TODOS los clientes")
+
+
+def _ventas_query(profile, pending_only):
+    """SELECT de Ventas: con adeudo (get_ventas_data) o todo el historial con cliente"""
+    if pending_only:
+        where = """Estado != 'PAGADA'
+            AND Estado != 'CANCELADA'
+            AND Estado IS NOT NULL
+            AND Restante > 0"""
+    else:
+        where = """CveCte IS NOT NULL 
+            AND CveCte != ''"""
+    return f"""
+            SELECT 
+                {_ventas_columns(profile)}
+            FROM Ventas
+            WHERE {where}
         """
-        
-        logging.info(f"Ejecutando consulta SQL: {query}")
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        logging.info(f"Registros encontrados: {len(results)}")
-        
-        def format_date(date_value):
-            if date_value:
-                if isinstance(date_value, (datetime, date)):
-                    return date_value.strftime('%Y-%m-%d')
-                try:
-                    return datetime.strptime(str(date_value), '%Y-%m-%d').strftime('%Y-%m-%d')
-                except (ValueError, TypeError):
-                    logging.warning(f"Valor de fecha no válido: {date_value}")
-                    return ""
-            return ""
-        
-        clients_data = {
-            str(row.Clave): {
-                "estado": row.Estado.strip() if row.Estado else "",
-                "fecha": format_date(row.Fecha),
-                "nombre": row.Nombre.strip() if row.Nombre else "",
-                "direccion": row.Direccion.strip() if row.Direccion else "",
-                "telefono1": row.Telefono1.strip() if row.Telefono1 else "",
-                "telefono2": row.Telefono2.strip() if row.Telefono2 else "",
-                "telefono3": format_phone_number(row.Telefono3.strip() if row.Telefono3 else ""),
-                "descripcion": row.Descripcion.strip() if row.Descripcion else "",
-                "email": row.Email.strip() if row.Email else "",
-                "referencia": row.Referencia.strip() if row.Referencia else "",
-                "obs": row.Obs.strip() if row.Obs else "",
-                "credito": bool(row.Credito),
-                "montoCredito": float(row.MontoCredito) if row.MontoCredito else 0.0,
-                "diasCredito": int(row.DiasCredito) if row.DiasCredito else 0,
-                "interesCredito": row.InteresCredito.strip() if row.InteresCredito else "",
-                "saldo": float(row.Saldo) if row.Saldo else 0.0,
-                "nl": int(row.NL) if row.NL else 0,
-                "nc": row.NC.strip() if row.NC else "",
-                "membresia": format_date(row.Membresia),
-                "nivel": int(row.Nivel) if row.Nivel else 0,
-                "modificado": format_date(row.Modificado),
-                "et1": row.Et1.strip() if row.Et1 else "",
-                "lineaDeCredito": row.LineaDeCredito.strip() if row.LineaDeCredito else ""
-            } for row in results
-        }
-        
-        logging.info(f"Datos procesados exitosamente. Total de registros: {len(clients_data)}")
-        return clients_data
-        
-    except pyodbc.Error as e:
-        logging.error(f"Error al obtener datos de clientes: {e}")
-        return {}
-    except Exception as e:
-        logging.error(f"Error inesperado al procesar datos: {e}")
-        return {}
-    finally:
-        logging.info("Cerrando conexión a la base de datos")
-        conn.close()
 
-   
-def get_ventas_data():
-    conn = get_db_connection()
-    if not conn:
-        logging.error("No se pudo establecer conexión con la base de datos")
-        return {}
-    
-    try:
-        cursor = conn.cursor()
-        query = """
+
+def iter_ventas(profile='scoring', pending_only=False, batch_size=DB_FETCH_BATCH_SIZE):
+    """
+    Ventas por lotes: {Folio: registro} de hasta batch_size ventas cada uno.
+
+    Para quien puede procesar las ventas de forma incremental (puntaje,
+    índices) sin tener el historial completo en memoria.
+
+    Args:
+        profile: perfil de columnas de VENTAS_PROFILES
+        pending_only: sólo ventas con adeudo; si no, todo el historial
+    """
+    return _stream_query(_ventas_query(profile, pending_only),
+                         lambda rows: _ventas_rows_to_dict(rows, profile), batch_size,
+                         "Ventas con adeudo" if pending_only else "TODAS las ventas")
+
+
+def iter_sale_texts(since_folio=0, batch_size=DB_FETCH_BATCH_SIZE, folios=None):
+    """
+    Texto de artículos y ticket de las ventas con Folio > since_folio, en
+    orden de Folio y por lotes: [(Folio, CveCte, Articulos, Ticket), ...].
+    Con folios se leen sólo esas ventas (sin importar since_folio).
+    Las canceladas no se incluyen. Lo usa la tabla local de artículos
+    vendidos (sales_items), que avanza por Folio.
+    """
+    if folios is not None:
+        condition = "Folio IN (SELECT TRY_CAST(value AS BIGINT) FROM STRING_SPLIT(?, ','))"
+        params = (','.join(str(folio) for folio in folios),)
+    else:
+        condition = "Folio > ?"
+        params = (since_folio,)
+    query = f"""
             SELECT 
                 Folio,
-                ISNULL(Estado, '') as Estado,
                 ISNULL(CveCte, '') as CveCte,
-                ISNULL(Cliente, '') as Cliente,
-                ISNULL(Fecha, '') as Fecha,
-                ISNULL(Hora, '') as Hora,
-                ISNULL(Total, 0) as Total,
-                ISNULL(Restante, 0) as Restante,
-                ISNULL(FechaPago, '') as FechaPago,
-                ISNULL(Paga, 0) as Paga,
-                ISNULL(Cambio, '') as Cambio,
-                ISNULL(Ticket, '') as Ticket,
-                ISNULL(Condiciones, '') as Condiciones,
-                ISNULL(FechaProg, '') as FechaProg,
-                ISNULL(Corte, 0) as Corte,
-                ISNULL(Vendedor, '') as Vendedor,
-                ISNULL(ComoPago, '') as ComoPago,
-                ISNULL(DiasCred, 0) as DiasCred,
-                ISNULL(IntCred, '') as IntCred,
                 ISNULL(Articulos, '') as Articulos,
-                ISNULL(BarCuenta, '') as BarCuenta,
-                ISNULL(BarMesero, '') as BarMesero,
-                ISNULL(NotasAdicionales, '') as NotasAdicionales,
-                ISNULL(IdBarCuenta, '') as IdBarCuenta,
-                ISNULL(Bitacora, '') as Bitacora,
-                ISNULL(Anticipo, 0) as Anticipo,
-                ISNULL(FolioPago, '') as FolioPago,
-                ISNULL(SaldoCliente, 0) as SaldoCliente,
-                ISNULL(Caja, 0) as Caja
+                ISNULL(Ticket, '') as Ticket
             FROM Ventas
-            WHERE Estado != 'PAGADA'
-            AND Estado != 'CANCELADA'
-            AND Estado IS NOT NULL
-            AND Restante > 0
+            WHERE {condition}
+            AND ISNULL(Estado, '') != 'CANCELADA'
+            ORDER BY Folio
         """
-        
-        logging.info(f"Ejecutando consulta SQL para Ventas: {query}")
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        logging.info(f"Registros de Ventas encontrados: {len(results)}")
-        
-        def format_date(date_value):
-            if date_value:
-                if isinstance(date_value, (datetime, date)):
-                    return date_value.strftime('%Y-%m-%d')
-                try:
-                    return datetime.strptime(str(date_value), '%Y-%m-%d').strftime('%Y-%m-%d')
-                except (ValueError, TypeError):
-                    logging.warning(f"Valor de fecha no válido: {date_value}")
-                    return ""
-            return ""
+    return _stream_query(query,
+                         lambda rows: [(str(row.Folio), _text(row.CveCte), _text(row.Articulos),
+                                        _text(row.Ticket)) for row in rows],
+                         batch_size, "artículos de ventas", params=params)
 
-        def format_time(time_value):
-            if time_value:
-                if isinstance(time_value, time):
-                    return time_value.strftime('%H:%M:%S')
-                try:
-                    if isinstance(time_value, str):
-                        return time_value
-                    return datetime.strptime(str(time_value), '%H:%M:%S').strftime('%H:%M:%S')
-                except (ValueError, TypeError):
-                    logging.warning(f"Valor de hora no válido: {time_value}")
-                    return ""
-            return ""
-        
-        ventas_data = {
-            str(row.Folio): {
-                "estado": row.Estado.strip() if row.Estado else "",
-                "cveCte": row.CveCte.strip() if row.CveCte else "",
-                "cliente": row.Cliente.strip() if row.Cliente else "",
-                "fecha": format_date(row.Fecha),
-                "hora": format_time(row.Hora),
-                "total": float(row.Total) if row.Total else 0.0,
-                "restante": float(row.Restante) if row.Restante else 0.0,
-                "fechaPago": format_date(row.FechaPago),
-                "paga": float(row.Paga) if row.Paga else 0.0,
-                "cambio": row.Cambio.strip() if row.Cambio else "",
-                "ticket": row.Ticket.strip() if row.Ticket else "",
-                "condiciones": row.Condiciones.strip() if row.Condiciones else "",
-                "fechaProg": format_date(row.FechaProg),
-                "corte": int(row.Corte) if row.Corte else 0,
-                "vendedor": row.Vendedor.strip() if row.Vendedor else "",
-                "comoPago": row.ComoPago.strip() if row.ComoPago else "",
-                "diasCorte": int(row.DiasCred) if row.DiasCred else 0,
-                "intCred": row.IntCred.strip() if row.IntCred else "",
-                "articulos": row.Articulos.strip() if row.Articulos else "",
-                "barCuenta": row.BarCuenta.strip() if row.BarCuenta else "",
-                "barMesero": row.BarMesero.strip() if row.BarMesero else "",
-                "notasAdicionales": row.NotasAdicionales.strip() if row.NotasAdicionales else "",
-                "idBarCuenta": row.IdBarCuenta.strip() if row.IdBarCuenta else "",
-                "bitacora": row.Bitacora.strip() if row.Bitacora else "",
-                "anticipo": float(row.Anticipo) if row.Anticipo else 0.0,
-                "folioPago": row.FolioPago.strip() if row.FolioPago else "",
-                "saldoCliente": float(row.SaldoCliente) if row.SaldoCliente else 0.0,
-                "caja": int(row.Caja) if row.Caja else 0
-            } for row in results
-        }
-        
+
+def iter_cancelled_folios(up_to_folio, batch_size=DB_FETCH_BATCH_SIZE):
+    """
+    Folios de las ventas canceladas con Folio <= up_to_folio, por lotes
+    ([Folio, ...]). Con ellos la tabla local de artículos quita las ventas
+    que se cancelaron después de procesarse.
+    """
+    query = """
+            SELECT Folio
+            FROM Ventas
+            WHERE Folio <= ?
+            AND Estado = 'CANCELADA'
+        """
+    return _stream_query(query, lambda rows: [str(row.Folio) for row in rows],
+                         batch_size, "ventas canceladas", params=(up_to_folio,))
+
+
+def get_ventas_data(profile='dashboard'):
+    """
+    Ventas con adeudo (no pagadas ni canceladas y con saldo restante).
+
+    Args:
+        profile: perfil de columnas de VENTAS_PROFILES
+    """
+    try:
+        ventas_data = _collect(iter_ventas(profile, pending_only=True))
         logging.info(f"Datos de Ventas procesados exitosamente. Total de registros: {len(ventas_data)}")
         return ventas_data
         
@@ -231,79 +455,129 @@ def get_ventas_data():
     except Exception as e:
         logging.error(f"Error inesperado al procesar datos de Ventas: {e}")
         return {}
-    finally:
-        logging.info("Cerrando conexión a la base de datos")
-        conn.close()
 
 
 #States     
 
-def update_client_states(client_id: str, states: dict = None) -> bool:
+# Columnas de ClientsStates que se pueden escribir y su tipo en SQL Server
+_CLIENT_STATE_COLUMNS = {
+    "day1": "bit",
+    "day2": "bit",
+    "day3": "bit",
+    "dueday": "bit",
+    "promisePage": "bit",
+    "company": "bit",
+    "promiseDate": "date",
+}
+
+# Valores con los que se crea un registro nuevo (los que no vienen en el cambio)
+_CLIENT_STATE_DEFAULTS = ("day1", "day2", "day3", "dueday", "promisePage")
+
+
+def _client_state_merge_sql(fields):
+    """MERGE de ClientsStates para un conjunto fijo de columnas"""
+    source = ", ".join(["CAST(? AS varchar(50)) AS client_id"] +
+                       [f"CAST(? AS {_CLIENT_STATE_COLUMNS[f]}) AS {f}" for f in fields])
+    update_set = ", ".join(f"t.{f} = s.{f}" for f in fields)
+
+    insert_columns = ["client_id"] + list(fields)
+    insert_values = ["s.client_id"] + [f"s.{f}" for f in fields]
+    for default in _CLIENT_STATE_DEFAULTS:
+        if default not in fields:
+            insert_columns.append(default)
+            insert_values.append("0")
+
+    return f"""
+        MERGE dbo.ClientsStates WITH (HOLDLOCK) AS t
+        USING (SELECT {source}) AS s
+        ON t.client_id = s.client_id
+        WHEN MATCHED THEN
+            UPDATE SET {update_set}
+        WHEN NOT MATCHED THEN
+            INSERT ({", ".join(insert_columns)})
+            VALUES ({", ".join(insert_values)});
     """
-    Actualiza o crea un registro en la tabla ClientsStates para un cliente específico.
-    Si states es None, crea un registro con valores predeterminados False.
+
+
+def upsert_client_states(changes) -> bool:
     """
+    Actualiza o crea registros de ClientsStates en lote.
+
+    Cada cambio es (client_id, {columna: valor}) con columnas de
+    _CLIENT_STATE_COLUMNS. Los cambios con las mismas columnas se envían
+    juntos en un MERGE con fast_executemany (un viaje al servidor por
+    grupo) y todo se confirma en una sola transacción.
+
+    Args:
+        changes: iterable de (client_id, dict) o dict {client_id: dict}
+
+    Returns:
+        bool: True si la operación fue exitosa, False en caso contrario
+    """
+    if isinstance(changes, dict):
+        changes = changes.items()
+
+    # Agrupar por conjunto de columnas para poder usar un solo statement
+    groups = {}
+    for client_id, fields in changes:
+        unknown = set(fields) - set(_CLIENT_STATE_COLUMNS)
+        if unknown:
+            logging.error(f"Columnas no válidas para ClientsStates: {', '.join(sorted(unknown))}")
+            return False
+        if not fields:
+            continue
+        columns = tuple(sorted(fields))
+        groups.setdefault(columns, []).append(
+            (str(client_id),) + tuple(fields[c] for c in columns))
+
+    if not groups:
+        return True
+
     conn = get_db_connection()
     if not conn:
         logging.error("No se pudo establecer conexión con la base de datos")
         return False
-    
+
     try:
         cursor = conn.cursor()
-        
-        # Verificar si el cliente ya existe
-        check_query = """
-            SELECT client_id
-            FROM dbo.ClientsStates 
-            WHERE client_id = ?
-        """
-        cursor.execute(check_query, (client_id,))
-        exists = cursor.fetchone() is not None
-        
-        if states is None:
-            states = {
-                "day1": False,
-                "day2": False,
-                "day3": False,
-                "dueday": False,
-                "promisePage": False
-            }
-        
-        if exists:
-            # Actualizar registro existente
-            update_query = """
-                UPDATE dbo.ClientsStates 
-                SET day1 = ?, 
-                    day2 = ?, 
-                    day3 = ?, 
-                    dueday = ?, 
-                    promisePage = ?
-                WHERE client_id = ?
-            """
-            cursor.execute(update_query, 
-                         (states["day1"], states["day2"], states["day3"], 
-                          states["dueday"], states["promisePage"], client_id))
-        else:
-            # Insertar nuevo registro
-            insert_query = """
-                INSERT INTO dbo.ClientsStates 
-                (client_id, day1, day2, day3, dueday, promisePage)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """
-            cursor.execute(insert_query, 
-                         (client_id, states["day1"], states["day2"], states["day3"], 
-                          states["dueday"], states["promisePage"]))
-        
+        cursor.fast_executemany = True
+        total = 0
+        for columns, rows in groups.items():
+            cursor.executemany(_client_state_merge_sql(columns), rows)
+            total += len(rows)
+
         conn.commit()
-        logging.info(f"Estados del cliente {client_id} actualizados exitosamente")
+        logging.info(f"Estados actualizados para {total} cliente(s) en {len(groups)} lote(s)")
         return True
-        
+
     except pyodbc.Error as e:
-        logging.error(f"Error al actualizar estados del cliente {client_id}: {e}")
+        logging.error(f"Error al actualizar estados de clientes: {e}")
+        try:
+            conn.rollback()
+        except pyodbc.Error:
+            pass
         return False
     finally:
         conn.close()
 
+
+def update_client_states(client_id: str, states: dict = None) -> bool:
+    """
+    Actualiza o crea un registro en la tabla ClientsStates para un cliente específico.
+    Si states es None, crea un registro con valores predeterminados False.
+    """
+    if states is None:
+        states = {
+            "day1": False,
+            "day2": False,
+            "day3": False,
+            "dueday": False,
+            "promisePage": False
+        }
+    
+    fields = {name: states[name] for name in _CLIENT_STATE_DEFAULTS}
+    return upsert_client_states([(client_id, fields)])
+
 def delete_client_states(client_id: str) -> bool:
     """
     Elimina el registro de un cliente de la tabla ClientsStates.
@@ -409,6 +683,95 @@ def get_client_notes(client_id: str) -> list:
     finally:
         conn.close()
 
+def ensure_notes_table() -> bool:
+    """Asegura que la tabla Notes exista, la crea si es necesario"""
+    conn = get_db_connection()
+    if not conn:
+        return False
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_NAME = 'Notes'
+        """)
+        if cursor.fetchone()[0] > 0:
+            return True
+
+        cursor.execute("""
+            CREATE TABLE Notes (
+                id int IDENTITY(1,1) PRIMARY KEY,
+                client_id varchar(50) NOT NULL,
+                note_text nvarchar(max) NOT NULL,
+                user_name varchar(100) NULL,
+                created_at datetime DEFAULT GETDATE()
+            )
+        """)
+        cursor.execute("CREATE INDEX IX_Notes_ClientId ON Notes(client_id)")
+        cursor.execute("CREATE INDEX IX_Notes_CreatedAt ON Notes(created_at DESC)")
+        conn.commit()
+        logging.info("Tabla Notes creada exitosamente")
+        return True
+
+    except pyodbc.Error as e:
+        logging.error(f"Error creando tabla Notes: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def insert_client_notes(notes) -> bool:
+    """
+    Inserta varias notas en una sola transacción.
+
+    La fecha viene del cliente, así que reenviar una nota ya guardada (p. ej.
+    tras un corte justo después del commit) no la duplica.
+
+    Args:
+        notes: iterable de (client_id, note_text, user_name, created_at)
+
+    Returns:
+        bool: True si la operación fue exitosa, False en caso contrario
+    """
+    rows = []
+    for client_id, text, user_name, created_at in notes:
+        client_id = str(client_id)
+        rows.append((client_id, text, user_name or "Sistema", created_at,
+                     client_id, created_at, text))
+    if not rows:
+        return True
+
+    conn = get_db_connection()
+    if not conn:
+        logging.error("No se pudo establecer conexión con la base de datos")
+        return False
+
+    try:
+        cursor = conn.cursor()
+        # Sin fast_executemany: con nvarchar(max) el driver reserva el máximo por fila
+        cursor.executemany("""
+            INSERT INTO Notes (client_id, note_text, user_name, created_at)
+            SELECT ?, ?, ?, CAST(? AS datetime)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM Notes
+                WHERE client_id = ? AND created_at = CAST(? AS datetime) AND note_text = ?
+            )
+        """, rows)
+        conn.commit()
+        logging.info(f"{len(rows)} nota(s) guardada(s)")
+        return True
+
+    except pyodbc.Error as e:
+        logging.error(f"Error al guardar notas: {e}")
+        try:
+            conn.rollback()
+        except pyodbc.Error:
+            pass
+        return False
+    finally:
+        conn.close()
+
+
 def get_client_data(self, clave_id):
         """Obtiene los datos específicos de un cliente"""
         conn = get_db_connection()
@@ -456,72 +819,15 @@ def update_client_states_wsp(client_id: str, states: dict = None) -> bool:
     Returns:
     bool: True si la actualización fue exitosa, False en caso contrario.
     """
-    conn = get_db_connection()
-    if not conn:
-        logging.error("No se pudo establecer conexión con la base de datos")
-        return False
-    
-    try:
-        cursor = conn.cursor()
-        
-        # Verificar si el cliente ya existe
-        check_query = """
-            SELECT client_id
-            FROM dbo.ClientsStates 
-            WHERE client_id = ?
-        """
-        cursor.execute(check_query, (client_id,))
-        exists = cursor.fetchone() is not None
-        
-        if states is None:
-            states = {
-                "day1": False,
-                "day2": False,
-                "day3": False,
-                "dueday": False,
-                "promisePage": False
-            }
-        
-        if exists:
-            # Actualizar registro existente
-            update_query = """
-                UPDATE dbo.ClientsStates 
-                SET day1 = ?, 
-                    day2 = ?, 
-                    day3 = ?, 
-                    dueday = ?, 
-                    promisePage = ?
-                WHERE client_id = ?
-            """
-            cursor.execute(update_query, 
-                         (states["day1"], states["day2"], states["day3"], 
-                          states["dueday"], states["promisePage"], client_id))
-        else:
-            # Insertar nuevo registro
-            insert_query = """
-                INSERT INTO dbo.ClientsStates 
-                (client_id, day1, day2, day3, dueday, promisePage)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """
-            cursor.execute(insert_query, 
-                         (client_id, states["day1"], states["day2"], states["day3"], 
-                          states["dueday"], states["promisePage"]))
-        
-        conn.commit()
-        logging.info(f"Estados del cliente {client_id} actualizados exitosamente")
-        return True
-        
-    except pyodbc.Error as e:
-        logging.error(f"Error al actualizar estados del cliente {client_id}: {e}")
-        return False
-    finally:
-        conn.close()
+    # Mismo upsert que update_client_states; para marcar muchos clientes
+    # a la vez usar upsert_client_states directamente
+    return update_client_states(client_id, states)
         
 
 def update_promise_date(client_id: str, promise_date: datetime.date) -> bool:
     """
     Actualiza o inserta la fecha de promesa de pago para un cliente específico.
-    Implementa lógica UPSERT: UPDATE si existe, INSERT si no existe.
+    Implementa lógica UPSERT (MERGE): UPDATE si existe, INSERT si no existe.
     
     Args:
         client_id (str): ID del cliente
@@ -530,133 +836,109 @@ def update_promise_date(client_id: str, promise_date: datetime.date) -> bool:
     Returns:
         bool: True si la operación fue exitosa, False en caso contrario
     """
+    if isinstance(promise_date, datetime):
+        promise_date = promise_date.date()
+    
+    if upsert_client_states([(client_id, {"promiseDate": promise_date})]):
+        logging.info(f"Éxito: Cliente {client_id} con promesa {promise_date}")
+        return True
+    return False
+     
+
+def sync_clients_to_buro():
+    """
+    Synchronize clients from Clientes4 to ClientsBuro database.
+    Only adds missing clients, does not modify existing ones.
+
+    Se resuelve en el servidor con un solo INSERT ... SELECT ... WHERE NOT
+    EXISTS, así que no depende del número de clientes (sin listas IN ni
+    inserts fila por fila).
+
+    Returns:
+        Número de clientes agregados, o None si hubo error
+    """
     conn = get_db_connection()
     if not conn:
         logging.error("No se pudo establecer conexión con la base de datos")
-        return False
+        return None
     
     try:
         cursor = conn.cursor()
-        
-        # Primero intentamos UPDATE
-        update_query = """
-            UPDATE dbo.ClientsStates 
-            SET promiseDate = ?
-            WHERE client_id = ?
-        """
-        
-        logging.info(f"Intentando UPDATE para cliente {client_id} con fecha {promise_date}")
-        cursor.execute(update_query, (promise_date, client_id))
-        rows_affected = cursor.rowcount
-        
-        logging.info(f"UPDATE afectó {rows_affected} filas para cliente {client_id}")
-        
-        # Si no se actualizó ninguna fila, el cliente no existe → INSERT
-        if rows_affected == 0:
-            insert_query = """
-                INSERT INTO dbo.ClientsStates (client_id, day1, day2, day3, dueday, promisePage, promiseDate)
-                VALUES (?, 0, 0, 0, 0, 0, ?)
-            """
-            
-            logging.info(f"Cliente {client_id} no existe, ejecutando INSERT con fecha {promise_date}")
-            cursor.execute(insert_query, (client_id, promise_date))
-            rows_inserted = cursor.rowcount
-            
-            logging.info(f"INSERT creó {rows_inserted} fila(s) para cliente {client_id}")
-            
-            if rows_inserted == 0:
-                logging.error(f"Error: INSERT no creó ninguna fila para cliente {client_id}")
-                return False
-            else:
-                logging.info(f"Éxito: Cliente {client_id} creado con promesa {promise_date}")
-        else:
-            logging.info(f"Éxito: Cliente {client_id} actualizado con promesa {promise_date}")
-        
-        # Confirmar transacción
+        cursor.execute("""
+            INSERT INTO dbo.ClientsBuro (client_id, credit)
+            SELECT DISTINCT CONVERT(varchar(50), c.Clave), 0
+            FROM Clientes4 c
+            WHERE c.Clave IS NOT NULL
+            AND NOT EXISTS (
+                SELECT 1 FROM dbo.ClientsBuro b
+                WHERE b.client_id = CONVERT(varchar(50), c.Clave)
+            )
+        """)
+        added = max(cursor.rowcount, 0)
         conn.commit()
-        logging.info(f"Transacción confirmada para cliente {client_id}")
         
-        # Verificación adicional: confirmar que el dato se guardó
-        verify_query = "SELECT promiseDate FROM dbo.ClientsStates WHERE client_id = ?"
-        cursor.execute(verify_query, (client_id,))
-        result = cursor.fetchone()
-        
-        if result and result[0]:
-            logging.info(f"Verificación exitosa: Cliente {client_id} tiene promesa {result[0]}")
-            return True
+        if added:
+            logging.info(f"Added {added} new clients to ClientsBuro")
         else:
-            logging.error(f"Verificación falló: No se encontró promesa para cliente {client_id}")
-            return False
+            logging.info("No new clients to add to ClientsBuro")
+        
+        return added
         
     except pyodbc.Error as e:
-        logging.error(f"Error SQL al procesar promesa para cliente {client_id}: {e}")
-        try:
-            conn.rollback()
-            logging.info(f"Rollback ejecutado para cliente {client_id}")
-        except:
-            pass
-        return False
-    except Exception as e:
-        logging.error(f"Error inesperado al procesar promesa para cliente {client_id}: {e}")
-        try:
-            conn.rollback()
-            logging.info(f"Rollback ejecutado para cliente {client_id}")
-        except:
-            pass
-        return False
+        logging.error(f"Error al sincronizar clientes: {e}")
+        conn.rollback()
+        return None
     finally:
-        try:
-            conn.close()
-            logging.info(f"Conexión cerrada para cliente {client_id}")
-        except:
-            pass
-     
+        conn.close()
 
-def sync_clients_to_buro():
+
+def set_clients_buro_credit(changes) -> bool:
     """
-    Synchronize clients from Clientes4 to ClientsBuro database.
-    Only adds missing clients, does not modify existing ones.
+    Marca o desmarca clientes en ClientsBuro en lote.
+
+    Se usa un MERGE para que ningún cambio se pierda en silencio: si el
+    renglón del cliente ya no existe (UPDATE sin renglones afectados),
+    se vuelve a crear con el valor enviado.
+
+    Args:
+        changes: iterable de (client_id, credit) o dict {client_id: credit}
+
+    Returns:
+        bool: True si la operación fue exitosa, False en caso contrario
     """
+    if isinstance(changes, dict):
+        changes = changes.items()
+    rows = [(str(client_id), bool(credit)) for client_id, credit in changes]
+    if not rows:
+        return True
+
     conn = get_db_connection()
     if not conn:
         logging.error("No se pudo establecer conexión con la base de datos")
         return False
-    
+
     try:
         cursor = conn.cursor()
-        
-        # Fetch all client IDs from Clientes4
-        cursor.execute("SELECT Clave FROM Clientes4")
-        clientes_clave = [str(row.Clave) for row in cursor.fetchall()]
-        
-        # Check which clients already exist in ClientsBuro
-        placeholders = ','.join(['?'] * len(clientes_clave))
-        cursor.execute(f"""
-            SELECT client_id FROM dbo.ClientsBuro 
-            WHERE client_id IN ({placeholders})
-        """, clientes_clave)
-        existing_clients = [str(row.client_id) for row in cursor.fetchall()]
-        
-        # Identify and insert missing clients
-        missing_clients = set(clientes_clave) - set(existing_clients)
-        
-        if missing_clients:
-            insert_query = """
-                INSERT INTO dbo.ClientsBuro (client_id, credit)
-                VALUES (?, 0)
-            """
-            for client_id in missing_clients:
-                cursor.execute(insert_query, (client_id,))
-            
-            conn.commit()
-            logging.info(f"Added {len(missing_clients)} new clients to ClientsBuro")
-        else:
-            logging.info("No new clients to add to ClientsBuro")
-        
+        cursor.fast_executemany = True
+        cursor.executemany("""
+            MERGE dbo.ClientsBuro WITH (HOLDLOCK) AS t
+            USING (SELECT CAST(? AS varchar(50)) AS client_id, CAST(? AS bit) AS credit) AS s
+            ON t.client_id = s.client_id
+            WHEN MATCHED THEN
+                UPDATE SET t.credit = s.credit
+            WHEN NOT MATCHED THEN
+                INSERT (client_id, credit) VALUES (s.client_id, s.credit);
+        """, rows)
+        conn.commit()
+        logging.info(f"Estado de buró actualizado para {len(rows)} cliente(s)")
         return True
-        
+
     except pyodbc.Error as e:
-        logging.error(f"Error al sincronizar clientes: {e}")
+        logging.error(f"Error al actualizar estado de buró: {e}")
+        try:
+            conn.rollback()
+        except pyodbc.Error:
+            pass
         return False
     finally:
         conn.close()
@@ -815,20 +1097,6 @@ def validate_user(credentials):
         conn.close()
 
 
-import re
-
-def extract_ticket_number(ticket_text):
-    """Extract ticket number from ticket text using regex"""
-    if not ticket_text:
-        return "N/A"
-    ticket_text = str(ticket_text)
-    match = re.search(r'TICKET:(\d+)', ticket_text)
-    if match:
-        return match.group(1)
-    # If it's just a number, return it directly
-    return ticket_text if ticket_text.isdigit() else "N/A"
-
-
 class UserSession:
     """Clase singleton para manejar la sesión del usuario"""
     _instance = None
@@ -867,87 +1135,8 @@ def get_all_clients_data():
     Obtener TODOS los clientes (no solo los que tienen saldo > 0)
     Para el sistema de créditos
     """
-    conn = get_db_connection()
-    if not conn:
-        logging.error("No se pudo establecer conexión con la base de datos")
-        return {}
-    
     try:
-        cursor = conn.cursor()
-        query = """
-            SELECT 
-                Clave,
-                ISNULL(Estado, '') as Estado,
-                ISNULL(Fecha, '') as Fecha,
-                ISNULL(Nombre, '') as Nombre,
-                ISNULL(Direccion, '') as Direccion,
-                ISNULL(Telefono1, '') as Telefono1,
-                ISNULL(Telefono2, '') as Telefono2,
-                ISNULL(Telefono3, '') as Telefono3,
-                ISNULL(Descripcion, '') as Descripcion,
-                ISNULL(Email, '') as Email,
-                ISNULL(Referencia, '') as Referencia,
-                ISNULL(Obs, '') as Obs,
-                ISNULL(Credito, 0) as Credito,
-                ISNULL(MontoCredito, 0) as MontoCredito,
-                ISNULL(DiasCredito, 0) as DiasCredito,
-                ISNULL(InteresCredito, '') as InteresCredito,
-                ISNULL(Saldo, 0) as Saldo,
-                ISNULL(NL, 0) as NL,
-                ISNULL(NC, '') as NC,
-                ISNULL(Membresia, '') as Membresia,
-                ISNULL(Nivel, 0) as Nivel,
-                ISNULL(Modificado, '') as Modificado,
-                ISNULL(Et1, '') as Et1,
-                ISNULL(LineaDeCredito, '') as LineaDeCredito
-            FROM Clientes4
-        """
-        
-        logging.info(f"Ejecutando consulta SQL para TODOS los clientes: {query}")
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        logging.info(f"Registros encontrados (todos los clientes): {len(results)}")
-        
-        def format_date(date_value):
-            if date_value:
-                if isinstance(date_value, (datetime, date)):
-                    return date_value.strftime('%Y-%m-%d')
-                try:
-                    return datetime.strptime(str(date_value), '%Y-%m-%d').strftime('%Y-%m-%d')
-                except (ValueError, TypeError):
-                    logging.warning(f"Valor de fecha no válido: {date_value}")
-                    return ""
-            return ""
-        
-        clients_data = {
-            str(row.Clave): {
-                "estado": row.Estado.strip() if row.Estado else "",
-                "fecha": format_date(row.Fecha),
-                "nombre": row.Nombre.strip() if row.Nombre else "",
-                "direccion": row.Direccion.strip() if row.Direccion else "",
-                "telefono1": row.Telefono1.strip() if row.Telefono1 else "",
-                "telefono2": row.Telefono2.strip() if row.Telefono2 else "",
-                "telefono3": format_phone_number(row.Telefono3.strip() if row.Telefono3 else ""),
-                "descripcion": row.Descripcion.strip() if row.Descripcion else "",
-                "email": row.Email.strip() if row.Email else "",
-                "referencia": row.Referencia.strip() if row.Referencia else "",
-                "obs": row.Obs.strip() if row.Obs else "",
-                "credito": bool(row.Credito),
-                "montoCredito": float(row.MontoCredito) if row.MontoCredito else 0.0,
-                "diasCredito": int(row.DiasCredito) if row.DiasCredito else 0,
-                "interesCredito": row.InteresCredito.strip() if row.InteresCredito else "",
-                "saldo": float(row.Saldo) if row.Saldo else 0.0,
-                "nl": int(row.NL) if row.NL else 0,
-                "nc": row.NC.strip() if row.NC else "",
-                "membresia": format_date(row.Membresia),
-                "nivel": int(row.Nivel) if row.Nivel else 0,
-                "modificado": format_date(row.Modificado),
-                "et1": row.Et1.strip() if row.Et1 else "",
-                "lineaDeCredito": row.LineaDeCredito.strip() if row.LineaDeCredito else ""
-            } for row in results
-        }
-        
+        clients_data = _collect(iter_clients())
         logging.info(f"Datos procesados exitosamente. Total de clientes: {len(clients_data)}")
         return clients_data
         
@@ -957,139 +1146,254 @@ def get_all_clients_data():
     except Exception as e:
         logging.error(f"Error inesperado al procesar datos: {e}")
         return {}
-    finally:
-        logging.info("Cerrando conexión a la base de datos")
-        conn.close()
 
 
-def get_all_ventas_data():
+def get_all_ventas_data(profile='scoring'):
     """
     Obtener TODAS las ventas (incluyendo pagadas y canceladas)
     Para calcular el historial completo de pagos
+
+    Por omisión sólo trae las columnas del puntaje ('scoring'); el texto
+    del ticket se consulta aparte por Folio (tickets.get_ticket_text).
+    """
+    try:
+        ventas_data = _collect(iter_ventas(profile))
+        logging.info(f"Datos de todas las ventas procesados exitosamente. Total de registros: {len(ventas_data)}")
+        return ventas_data
+        
+    except pyodbc.Error as e:
+        logging.error(f"Error al obtener datos de todas las ventas: {e}")
+        return {}
+    except Exception as e:
+        logging.error(f"Error inesperado al procesar datos de todas las ventas: {e}")
+        return {}
+
+
+def get_ventas_frame(pending_only=False, batch_size=DB_FETCH_BATCH_SIZE):
+    """
+    Ventas como DataFrame columnar (ventas_dataset.FRAME_COLUMNS) para los
+    agregados por cliente, sin construir un registro por venta.
+
+    Cada lote de cursor.fetchmany se convierte a arreglos tipados antes de
+    pedir el siguiente, así la memoria pico es la del conjunto columnar
+    más un lote de filas.
+
+    Returns:
+        DataFrame, o None si no se pudo consultar
+    """
+    try:
+        # El perfil 'scoring' trae las columnas en el orden de FRAME_COLUMNS
+        query = _ventas_query('scoring', pending_only)
+        frame = frame_from_batches(_stream_query(query, batch_to_columns, batch_size,
+                                                 "el conjunto columnar de ventas"))
+        logging.info(f"Conjunto columnar de ventas: {len(frame)} filas")
+        return frame
+
+    except pyodbc.Error as e:
+        logging.error(f"Error al obtener el conjunto columnar de ventas: {e}")
+        return None
+    except Exception as e:
+        logging.error(f"Error inesperado al construir el conjunto columnar de ventas: {e}")
+        return None
+
+
+def fetch_ticket_texts(folios):
+    """
+    Texto del ticket de varias ventas en una sola consulta.
+
+    Returns:
+        dict {Folio: texto} (los folios inexistentes no aparecen),
+        o None si la consulta falla
     """
+    folios = [str(folio) for folio in folios]
+    if not folios:
+        return {}
+
     conn = get_db_connection()
     if not conn:
         logging.error("No se pudo establecer conexión con la base de datos")
-        return {}
+        return None
+
+    try:
+        cursor = conn.cursor()
+        # Los folios van en un solo parámetro para no exceder el límite de parámetros
+        cursor.execute("""
+            SELECT Folio, ISNULL(Ticket, '') as Ticket
+            FROM Ventas
+            WHERE Folio IN (SELECT TRY_CAST(value AS BIGINT) FROM STRING_SPLIT(?, ','))
+        """, ','.join(folios))
+        return {str(row.Folio): _text(row.Ticket) for row in cursor.fetchall()}
+
+    except pyodbc.Error as e:
+        logging.error(f"Error al obtener textos de ticket: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def get_ventas_rowversion_column():
+    """Nombre de la columna rowversion/timestamp de Ventas, o None si no existe"""
+    conn = get_db_connection()
+    if not conn:
+        return None
     
     try:
         cursor = conn.cursor()
-        query = """
+        cursor.execute("""
+            SELECT TOP 1 COLUMN_NAME
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_NAME = 'Ventas'
+            AND DATA_TYPE IN ('timestamp', 'rowversion')
+        """)
+        row = cursor.fetchone()
+        return row.COLUMN_NAME if row else None
+        
+    except pyodbc.Error as e:
+        logging.error(f"Error al buscar columna rowversion en Ventas: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def get_ventas_version_mark():
+    """Último rowversion asignado en la base (@@DBTS) como entero, o None"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT CAST(@@DBTS AS BIGINT) AS Marca")
+        return int(cursor.fetchone().Marca)
+        
+    except pyodbc.Error as e:
+        logging.error(f"Error al obtener la marca de rowversion: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def get_ventas_delta(since_folio, open_folios=(), version_column=None, since_version=None,
+                     profile='scoring'):
+    """
+    Obtener sólo las ventas nuevas o modificadas.
+    
+    - Con columna rowversion: las filas con versión mayor a since_version.
+    - Sin ella: las ventas con Folio > since_folio más los folios abiertos
+      indicados, que son los únicos que pueden cambiar de estado.
+    
+    Returns:
+        dict con 'ventas' (con las columnas del perfil indicado), 'pending'
+        (folios que cumplen el filtro de get_ventas_data) y 'version'
+        (mayor rowversion leído), o None si la consulta falla
+    """
+    conn = get_db_connection()
+    if not conn:
+        logging.error("No se pudo establecer conexión con la base de datos")
+        return None
+    
+    try:
+        cursor = conn.cursor()
+        
+        if version_column:
+            column = '[' + version_column.replace(']', ']]') + ']'
+            version_select = f"CAST({column} AS BIGINT)"
+            where = f"{version_select} > ?"
+            params = (since_version or 0,)
+        else:
+            # Los folios abiertos van en un solo parámetro para no exceder el límite de parámetros
+            version_select = "CAST(NULL AS BIGINT)"
+            where = "Folio > ? OR Folio IN (SELECT TRY_CAST(value AS BIGINT) FROM STRING_SPLIT(?, ','))"
+            params = (since_folio, ','.join(str(folio) for folio in open_folios))
+        
+        query = f"""
             SELECT 
-                Folio,
-                ISNULL(Estado, '') as Estado,
-                ISNULL(CveCte, '') as CveCte,
-                ISNULL(Cliente, '') as Cliente,
-                ISNULL(Fecha, '') as Fecha,
-                ISNULL(Hora, '') as Hora,
-                ISNULL(Total, 0) as Total,
-                ISNULL(Restante, 0) as Restante,
-                ISNULL(FechaPago, '') as FechaPago,
-                ISNULL(Paga, 0) as Paga,
-                ISNULL(Cambio, '') as Cambio,
-                ISNULL(Ticket, '') as Ticket,
-                ISNULL(Condiciones, '') as Condiciones,
-                ISNULL(FechaProg, '') as FechaProg,
-                ISNULL(Corte, 0) as Corte,
-                ISNULL(Vendedor, '') as Vendedor,
-                ISNULL(ComoPago, '') as ComoPago,
-                ISNULL(DiasCred, 0) as DiasCred,
-                ISNULL(IntCred, '') as IntCred,
-                ISNULL(Articulos, '') as Articulos,
-                ISNULL(BarCuenta, '') as BarCuenta,
-                ISNULL(BarMesero, '') as BarMesero,
-                ISNULL(NotasAdicionales, '') as NotasAdicionales,
-                ISNULL(IdBarCuenta, '') as IdBarCuenta,
-                ISNULL(Bitacora, '') as Bitacora,
-                ISNULL(Anticipo, 0) as Anticipo,
-                ISNULL(FolioPago, '') as FolioPago,
-                ISNULL(SaldoCliente, 0) as SaldoCliente,
-                ISNULL(Caja, 0) as Caja
+                {_ventas_columns(profile)},
+                CASE WHEN Estado != 'PAGADA'
+                          AND Estado != 'CANCELADA'
+                          AND Estado IS NOT NULL
+                          AND Restante > 0
+                     THEN 1 ELSE 0 END AS Pendiente,
+                {version_select} AS Version
             FROM Ventas
-            WHERE CveCte IS NOT NULL 
-            AND CveCte != ''
+            WHERE {where}
         """
         
-        logging.info(f"Ejecutando consulta SQL para TODAS las ventas: {query}")
-        cursor.execute(query)
+        cursor.execute(query, *params)
         results = cursor.fetchall()
         
-        logging.info(f"Registros de todas las ventas encontrados: {len(results)}")
-        
-        def format_date(date_value):
-            if date_value:
-                if isinstance(date_value, (datetime, date)):
-                    return date_value.strftime('%Y-%m-%d')
-                try:
-                    return datetime.strptime(str(date_value), '%Y-%m-%d').strftime('%Y-%m-%d')
-                except (ValueError, TypeError):
-                    logging.warning(f"Valor de fecha no válido: {date_value}")
-                    return ""
-            return ""
-
-        def format_time(time_value):
-            if time_value:
-                if isinstance(time_value, time):
-                    return time_value.strftime('%H:%M:%S')
-                try:
-                    if isinstance(time_value, str):
-                        return time_value
-                    return datetime.strptime(str(time_value), '%H:%M:%S').strftime('%H:%M:%S')
-                except (ValueError, TypeError):
-                    logging.warning(f"Valor de hora no válido: {time_value}")
-                    return ""
-            return ""
-        
-        ventas_data = {
-            str(row.Folio): {
-                "estado": row.Estado.strip() if row.Estado else "",
-                "cveCte": row.CveCte.strip() if row.CveCte else "",
-                "cliente": row.Cliente.strip() if row.Cliente else "",
-                "fecha": format_date(row.Fecha),
-                "hora": format_time(row.Hora),
-                "total": float(row.Total) if row.Total else 0.0,
-                "restante": float(row.Restante) if row.Restante else 0.0,
-                "fechaPago": format_date(row.FechaPago),
-                "paga": float(row.Paga) if row.Paga else 0.0,
-                "cambio": row.Cambio.strip() if row.Cambio else "",
-                "ticket": row.Ticket.strip() if row.Ticket else "",
-                "condiciones": row.Condiciones.strip() if row.Condiciones else "",
-                "fechaProg": format_date(row.FechaProg),
-                "corte": int(row.Corte) if row.Corte else 0,
-                "vendedor": row.Vendedor.strip() if row.Vendedor else "",
-                "comoPago": row.ComoPago.strip() if row.ComoPago else "",
-                "diasCorte": int(row.DiasCred) if row.DiasCred else 0,
-                "intCred": row.IntCred.strip() if row.IntCred else "",
-                "articulos": row.Articulos.strip() if row.Articulos else "",
-                "barCuenta": row.BarCuenta.strip() if row.BarCuenta else "",
-                "barMesero": row.BarMesero.strip() if row.BarMesero else "",
-                "notasAdicionales": row.NotasAdicionales.strip() if row.NotasAdicionales else "",
-                "idBarCuenta": row.IdBarCuenta.strip() if row.IdBarCuenta else "",
-                "bitacora": row.Bitacora.strip() if row.Bitacora else "",
-                "anticipo": float(row.Anticipo) if row.Anticipo else 0.0,
-                "folioPago": row.FolioPago.strip() if row.FolioPago else "",
-                "saldoCliente": float(row.SaldoCliente) if row.SaldoCliente else 0.0,
-                "caja": int(row.Caja) if row.Caja else 0
-            } for row in results
+        versions = [row.Version for row in results if row.Version is not None]
+        delta = {
+            'ventas': _ventas_rows_to_dict(results, profile),
+            'pending': {str(row.Folio) for row in results if row.Pendiente},
+            'version': max(versions) if versions else since_version
         }
         
-        logging.info(f"Datos de todas las ventas procesados exitosamente. Total de registros: {len(ventas_data)}")
-        return ventas_data
+        logging.info(f"Delta de ventas: {len(delta['ventas'])} registros nuevos o modificados")
+        return delta
         
     except pyodbc.Error as e:
-        logging.error(f"Error al obtener datos de todas las ventas: {e}")
-        return {}
-    except Exception as e:
-        logging.error(f"Error inesperado al procesar datos de todas las ventas: {e}")
+        logging.error(f"Error al obtener delta de ventas: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+# Columnas que cambian cuando una venta abierta se paga, abona o cancela
+VENTAS_STATUS_FIELDS = ("estado", "restante", "fechaPago")
+
+
+def get_ventas_status(folios):
+    """
+    Estado, Restante y FechaPago actuales de los folios indicados, con las
+    mismas conversiones que los registros de ventas. Es la consulta ligera
+    con la que el delta sin rowversion decide qué folios abiertos cambiaron
+    antes de pedir sus filas completas.
+
+    Returns:
+        dict {Folio: (estado, restante, fechaPago)} (los folios que ya no
+        existen no aparecen), o None si la consulta falla
+    """
+    folios = list(folios)
+    if not folios:
         return {}
+
+    conn = get_db_connection()
+    if not conn:
+        logging.error("No se pudo establecer conexión con la base de datos")
+        return None
+
+    try:
+        cursor = conn.cursor()
+        columns = ",\n                ".join(
+            f"{_VENTAS_FIELDS[key][0]} as {_VENTAS_FIELDS[key][1]}" for key in VENTAS_STATUS_FIELDS)
+        cursor.execute(f"""
+            SELECT 
+                Folio,
+                {columns}
+            FROM Ventas
+            WHERE Folio IN (SELECT TRY_CAST(value AS BIGINT) FROM STRING_SPLIT(?, ','))
+        """, ','.join(str(folio) for folio in folios))
+
+        fields = [(_VENTAS_FIELDS[key][1], _VENTAS_FIELDS[key][2]) for key in VENTAS_STATUS_FIELDS]
+        status = {}
+        for rows in _fetch_batches(cursor):
+            for row in rows:
+                status[str(row.Folio)] = tuple(convert(getattr(row, alias)) for alias, convert in fields)
+        return status
+
+    except pyodbc.Error as e:
+        logging.error(f"Error al consultar el estado de las ventas abiertas: {e}")
+        return None
     finally:
-        logging.info("Cerrando conexión a la base de datos")
         conn.close()
 
 
-def calculate_client_credit_score(client_id, all_ventas_data):
+def calculate_client_credit_score(client_id, all_ventas_data, ventas_index=None):
     """
-    Calcular el puntaje crediticio de un cliente basado en su historial de pagos
+    Calcular el puntaje crediticio de un cliente basado en su historial de pagos.
+    Con ventas_index (VentasIndex) las ventas del cliente se obtienen en O(1)
+    en lugar de recorrer todas las ventas.
     
     Sistema de puntos:
     - Cliente inicia con 400 puntos
@@ -1103,10 +1407,13 @@ def calculate_client_credit_score(client_id, all_ventas_data):
         base_score = 400
         total_score = base_score
         
-        client_ventas = [
-            venta for venta in all_ventas_data.values() 
-            if venta.get('cveCte') == client_id
-        ]
+        if ventas_index is not None:
+            client_ventas = ventas_index.ventas_for(client_id)
+        else:
+            client_ventas = [
+                venta for venta in all_ventas_data.values() 
+                if venta.get('cveCte') == client_id
+            ]
         
         if not client_ventas:
             return {
@@ -1120,32 +1427,26 @@ def calculate_client_credit_score(client_id, all_ventas_data):
         transaction_details = []
         total_days = 0
         valid_transactions = 0
+        today = date.today()
         
         for venta in client_ventas:
             try:
+                # Las fechas ya vienen como date desde la carga (_to_date)
                 fecha_venta = venta.get('fecha')
                 fecha_pago = venta.get('fechaPago')
                 estado = venta.get('estado', '').upper()
-                folio = venta.get('ticket', 'N/A')
+                folio = venta.get('folio', 'N/A')
                 
                 if not fecha_venta:
                     continue
                 
-                # Convertir fecha de venta
-                fecha_venta_dt = datetime.strptime(fecha_venta, '%Y-%m-%d').date()
-                
                 # Determinar fecha de referencia para el cálculo
                 if estado == 'PAGADA' and fecha_pago:
                     # Ticket pagado - usar fecha de pago
-                    try:
-                        fecha_pago_dt = datetime.strptime(fecha_pago, '%Y-%m-%d').date()
-                        days_diff = (fecha_pago_dt - fecha_venta_dt).days
-                    except:
-                        continue
+                    days_diff = (fecha_pago - fecha_venta).days
                 else:
                     # Ticket no pagado - usar fecha actual
-                    fecha_pago_dt = datetime.now().date()
-                    days_diff = (fecha_pago_dt - fecha_venta_dt).days
+                    days_diff = (today - fecha_venta).days
                 
                 # Calcular puntos según los días
                 points = 0
@@ -1168,6 +1469,7 @@ def calculate_client_credit_score(client_id, all_ventas_data):
                 
                 transaction_details.append({
                     'folio': folio,
+                    'total': venta.get('total', 0.0),
                     'fecha_venta': fecha_venta,
                     'fecha_pago': fecha_pago if fecha_pago else 'Pendiente',
                     'days': days_diff,
@@ -1251,26 +1553,34 @@ def get_credit_level(score):
         }
 
 
-def get_all_clients_credit_scores():
+def get_all_clients_credit_scores(all_clients=None, all_ventas=None, ventas_index=None):
     """
-    Calcular el puntaje crediticio para todos los clientes
+    Calcular el puntaje crediticio para todos los clientes.
+    Si se reciben clientes y ventas ya cargados se reutilizan en lugar
+    de volver a consultarlos.
     """
     try:
         logging.info("Iniciando cálculo de puntajes crediticios para todos los clientes...")
         
-        # Obtener todos los datos
-        all_clients = get_all_clients_data()
-        all_ventas = get_all_ventas_data()
+        # Obtener todos los datos (sólo si no se proporcionaron)
+        if all_clients is None:
+            all_clients = get_all_clients_data()
+        if all_ventas is None:
+            all_ventas = get_all_ventas_data()
         
         if not all_clients:
             logging.warning("No se pudieron obtener datos de clientes")
             return {}
         
+        # Agrupar ventas por cliente una sola vez
+        if ventas_index is None:
+            ventas_index = VentasIndex(all_ventas)
+        
         credit_scores = {}
         
         for client_id, client_data in all_clients.items():
             try:
-                score_data = calculate_client_credit_score(client_id, all_ventas)
+                score_data = calculate_client_credit_score(client_id, all_ventas, ventas_index)
                 
                 credit_scores[client_id] = {
                     'client_data': client_data,
@@ -1293,12 +1603,110 @@ def get_all_clients_credit_scores():
         return {}
 
 
-def get_clients_by_credit_level(level_name):
+def get_credit_score_aggregates(today=None):
+    """
+    Calcular en SQL Server los agregados del puntaje crediticio por cliente.
+    Aplica la misma tabla de puntos que calculate_client_credit_score
+    (DATEDIFF entre Fecha y FechaPago, o la fecha de hoy si no está pagada)
+    y regresa una fila por cliente en lugar de todas las ventas.
+    
+    Returns:
+        dict {CveCte: {'transactions', 'points', 'total_days'}} o None si falla
+    """
+    conn = get_db_connection()
+    if not conn:
+        logging.error("No se pudo establecer conexión con la base de datos")
+        return None
+    
+    try:
+        cursor = conn.cursor()
+        # Las fechas se convierten igual que en get_all_ventas_data (ISNULL(..., ''))
+        # y "hoy" lo envía Python para coincidir con el cálculo local
+        query = """
+            WITH VentasDias AS (
+                SELECT
+                    LTRIM(RTRIM(CveCte)) AS CveCte,
+                    CASE
+                        WHEN UPPER(LTRIM(RTRIM(ISNULL(Estado, '')))) = 'PAGADA'
+                             AND TRY_CONVERT(date, ISNULL(FechaPago, '')) IS NOT NULL
+                        THEN DATEDIFF(day, TRY_CONVERT(date, ISNULL(Fecha, '')),
+                                      TRY_CONVERT(date, ISNULL(FechaPago, '')))
+                        ELSE DATEDIFF(day, TRY_CONVERT(date, ISNULL(Fecha, '')), ?)
+                    END AS Dias
+                FROM Ventas
+                WHERE CveCte IS NOT NULL
+                AND CveCte != ''
+                AND TRY_CONVERT(date, ISNULL(Fecha, '')) IS NOT NULL
+            )
+            SELECT
+                CveCte,
+                COUNT(*) AS Transacciones,
+                SUM(CAST(CASE
+                    WHEN Dias <= 30 THEN 100
+                    WHEN Dias <= 60 THEN 50
+                    WHEN Dias <= 90 THEN 10
+                    WHEN Dias <= 120 THEN -10
+                    ELSE -10 - (Dias - 120) * 10
+                END AS BIGINT)) AS Puntos,
+                SUM(CAST(Dias AS BIGINT)) AS TotalDias
+            FROM VentasDias
+            GROUP BY CveCte
+        """
+        
+        cursor.execute(query, today or date.today())
+        aggregates = {
+            str(row.CveCte): {
+                'transactions': int(row.Transacciones),
+                'points': int(row.Puntos),
+                'total_days': int(row.TotalDias)
+            } for row in cursor.fetchall()
+        }
+        
+        logging.info(f"Agregados de puntaje calculados en SQL para {len(aggregates)} clientes")
+        return aggregates
+        
+    except pyodbc.Error as e:
+        logging.error(f"Error al calcular agregados de puntaje en SQL: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def get_client_payment_history(client_id):
+    """
+    Obtener sólo las columnas de Ventas que usa el puntaje crediticio para
+    un cliente (para armar su detalle sin cargar todas las ventas).
+    """
+    conn = get_db_connection()
+    if not conn:
+        logging.error("No se pudo establecer conexión con la base de datos")
+        return {}
+    
+    try:
+        cursor = conn.cursor()
+        query = f"""
+            SELECT 
+                {_ventas_columns('scoring')}
+            FROM Ventas
+            WHERE LTRIM(RTRIM(CveCte)) = ?
+        """
+        cursor.execute(query, client_id)
+        return _ventas_rows_to_dict(cursor.fetchall(), 'scoring')
+        
+    except pyodbc.Error as e:
+        logging.error(f"Error al obtener historial de pagos del cliente {client_id}: {e}")
+        return {}
+    finally:
+        conn.close()
+
+
+def get_clients_by_credit_level(level_name, all_scores=None):
     """
     Obtener clientes filtrados por nivel de crédito
     """
     try:
-        all_scores = get_all_clients_credit_scores()
+        if all_scores is None:
+            all_scores = get_all_clients_credit_scores()
         
         filtered_clients = {
             client_id: data for client_id, data in all_scores.items()
@@ -1312,12 +1720,14 @@ def get_clients_by_credit_level(level_name):
         return {}
 
 
-def get_credit_statistics():
+def get_credit_statistics(all_scores=None):
     """
-    Obtener estadísticas generales del sistema de créditos
+    Obtener estadísticas generales del sistema de créditos.
+    Acepta puntajes ya calculados para no recalcular todo el portafolio.
     """
     try:
-        all_scores = get_all_clients_credit_scores()
+        if all_scores is None:
+            all_scores = get_all_clients_credit_scores()
         
         if not all_scores:
             return {
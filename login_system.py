@@ -1,19 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
-import re
 from datetime import datetime
 from database import validate_user, UserSession
-
-def extract_ticket_number(ticket_text):
-    """Extract ticket number from ticket text using regex"""
-    if not ticket_text:
-        return "N/A"
-    ticket_text = str(ticket_text)
-    match = re.search(r'TICKET:(\d+)', ticket_text)
-    if match:
-        return match.group(1)
-    # If it's just a number, return it directly
-    return ticket_text if ticket_text.isdigit() else "N/A"
+from ticket_parser import extract_ticket_number
 
 class LoadingSplash:
     def __init__(self, root):
@@ -5,9 +5,10 @@ import time
 import json
 import os
 import ctypes
+import multiprocessing
 from datetime import datetime, date
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
-                            QPushButton, QLabel, QTableWidget, QTableWidgetItem, 
+                            QPushButton, QLabel, QTableWidget, QTableWidgetItem, QTableView,
                             QMessageBox, QCheckBox, QLineEdit, QComboBox, QSplitter,
                             QDialog, QFormLayout, QMenu, QDateEdit, QInputDialog, 
                             QGridLayout, QMenuBar, QHeaderView, QFrame, QGraphicsDropShadowEffect)
@@ -16,6 +17,7 @@ from PyQt6.QtGui import QFont, QColor, QIcon, QAction, QPixmap, QPainter, QPaint
 
 # Importar funciones de database
 from database import (get_clients_data, get_ventas_data, get_client_states, 
+                    clients_from_dicts, ventas_from_dicts,
                      update_client_states, get_clients_without_credit, 
                      sync_clients_to_buro, validate_user, get_client_notes,
                      delete_client_states, update_client_states_wsp, 
@@ -25,9 +27,24 @@ from database import (get_clients_data, get_ventas_data, get_client_states,
                     get_credit_statistics,
                     get_clients_by_credit_level,
                     calculate_client_credit_score,
-                    get_credit_level)
+                    get_credit_level,
+                    check_db_connection)
 
 from cliente_detalle import ClienteDetalleWindow
+from credit_engine import CreditSnapshot
+from data_indexes import (VentasIndex, AgingIndex, CreditLevelIndex, ClientSearchIndex,
+                          SPENDING_WINDOWS, parse_iso_date)
+from ventas_sync import VentasDeltaLoader
+from snapshot_cache import SnapshotCache, describe_age
+from tickets import get_parsed_tickets
+from sales_items import SalesItemsStore
+from ticket_parser import parse_ticket_text
+from workers import WorkerManager
+from write_queue import WriteBehindQueue
+from config import BURO_SYNC_INTERVAL_SECONDS, TOP_SIZES, SEARCH_DEBOUNCE_MS
+from aging_scheduler import AgingScheduler
+from table_models import (ClientTableModel, ClientFilterProxyModel, ClientTableDelegate,
+                          TableColumn, truncate, ALIGN_LEFT)
 from login_system import LoadingSplash
 
 # IMPORTAR EL NUEVO SISTEMA DE TEMAS
@@ -150,7 +167,11 @@ class CreditDetailWindow(QDialog):
         self.client_id = client_id
         self.theme_manager = parent.theme_manager
         
-        # CALCULAR TOTAL GASTADO
+        # Importe de cada ticket: llega en segundo plano (almacén local de tickets
+        # procesados; sólo los que nunca se han leído piden su texto al servidor)
+        self.parsed_tickets = {}
+        
+        # CALCULAR TOTAL GASTADO (se recalcula al llegar los tickets)
         self.total_spent = self.calculate_total_spent()
         
         self.setWindowTitle(f"Historial Crediticio - {client_credit_data['client_data'].get('nombre', 'Cliente')}")
@@ -159,6 +180,31 @@ class CreditDetailWindow(QDialog):
         
         self.init_ui()
         self.apply_theme()
+        self.load_parsed_tickets()
+    
+    def load_parsed_tickets(self):
+        """Pedir en segundo plano los tickets procesados de las transacciones"""
+        folios = [t.get('folio') for t in self.client_credit_data.get('transaction_details', []) if t.get('folio')]
+        if not folios:
+            return
+        self.parent.workers.submit('credit_detail_tickets',
+                                   lambda task: get_parsed_tickets(folios) or {},
+                                   on_result=self.apply_parsed_tickets)
+    
+    def apply_parsed_tickets(self, parsed_tickets):
+        """Actualizar total gastado y columna de montos con los tickets recibidos"""
+        self.parsed_tickets = parsed_tickets
+        self.total_spent = self.calculate_total_spent()
+        
+        self.spent_amount_label.setText(f"${self.total_spent:,.2f}")
+        transactions_count = self.client_credit_data['transactions']
+        avg_per_purchase = self.total_spent / transactions_count if transactions_count > 0 else 0
+        self.avg_purchase_label.setText(f"💳 Promedio por compra: ${avg_per_purchase:,.0f}")
+        
+        for row, transaction in enumerate(self.client_credit_data.get('transaction_details', [])):
+            monto_item = self.transactions_table.item(row, 3)
+            if monto_item is not None:
+                monto_item.setText(f"${self.transaction_amount(transaction):,.0f}")
     
     def calculate_total_spent(self):
         """Calcular el total gastado por el cliente en la tienda"""
@@ -168,35 +214,13 @@ class CreditDetailWindow(QDialog):
             transactions = self.client_credit_data.get('transaction_details', [])
             
             for transaction in transactions:
-                # Buscar en los datos del ticket como en TicketDetailDialog
-                ticket_data = transaction.get('datos', '')
+                ticket = self.parsed_ticket_for(transaction)
                 
-                if ticket_data:
-                    # Procesar el contenido del ticket línea por línea
-                    lines = ticket_data.split('\r\n')
-                    
-                    for line in lines:
-                        line = line.strip()
-                        
-                        # Buscar líneas que contengan "IMPORTE:" 
-                        if "IMPORTE:" in line:
-                            try:
-                                # Extraer el monto después de "IMPORTE:"
-                                # Ejemplo: "IMPORTE: $1,234.56"
-                                importe_part = line.split("IMPORTE:")[-1].strip()
-                                # Limpiar el texto para obtener solo el número
-                                importe_clean = importe_part.replace('$', '').replace(',', '').strip()
-                                
-                                # Convertir a float
-                                monto = float(importe_clean)
-                                total_spent += monto
-                                break  # Solo tomar el primer IMPORTE encontrado en este ticket
-                                
-                            except (ValueError, IndexError):
-                                # Si no se puede extraer el monto de esta línea, continuar
-                                continue
+                if ticket is not None:
+                    # Importe del ticket (el primer "IMPORTE:" válido)
+                    total_spent += ticket.amount or 0.0
                 
-                # Si no encontramos datos en 'datos', intentar con los campos originales como fallback
+                # Sin texto de ticket, usar los campos de la transacción como fallback
                 else:
                     monto = transaction.get('monto', 0) or transaction.get('importe', 0) or transaction.get('total', 0)
                     
@@ -208,18 +232,10 @@ class CreditDetailWindow(QDialog):
                         except (ValueError, AttributeError):
                             continue
             
-            # Si aún no encontramos montos, buscar en ventas_data como último recurso
-            if total_spent == 0 and hasattr(self.parent, 'all_ventas_data'):
-                for venta_id, venta_data in self.parent.all_ventas_data.items():
-                    if venta_data.get('cveCte') == self.client_id:
-                        monto = venta_data.get('importe', 0) or venta_data.get('total', 0)
-                        if isinstance(monto, (int, float)):
-                            total_spent += monto
-                        elif isinstance(monto, str):
-                            try:
-                                total_spent += float(monto.replace(',', '').replace('$', ''))
-                            except (ValueError, AttributeError):
-                                continue
+            # Si aún no encontramos montos, buscar en las ventas del snapshot como último recurso
+            snapshot = getattr(self.parent, 'credit_snapshot', None)
+            if total_spent == 0 and snapshot is not None:
+                total_spent = snapshot.ventas_index.total_spent(self.client_id)
             
         except Exception as e:
             import logging
@@ -228,36 +244,30 @@ class CreditDetailWindow(QDialog):
         
         return total_spent
 
-    def extract_amount_from_ticket_data(self, ticket_data):
-        """Extraer el monto de los datos del ticket (método auxiliar)"""
-        if not ticket_data:
-            return 0.0
-        
-        try:
-            lines = ticket_data.split('\r\n')
-            
-            for line in lines:
-                line = line.strip()
-                
-                # Buscar líneas que contengan "IMPORTE:" 
-                if "IMPORTE:" in line:
-                    try:
-                        # Extraer el monto después de "IMPORTE:"
-                        importe_part = line.split("IMPORTE:")[-1].strip()
-                        # Limpiar el texto para obtener solo el número
-                        importe_clean = importe_part.replace('$', '').replace(',', '').strip()
-                        
-                        # Convertir a float
-                        return float(importe_clean)
-                        
-                    except (ValueError, IndexError):
-                        continue
-        except Exception:
-            pass
-        
-        return 0.0
-    
+    def parsed_ticket_for(self, transaction):
+        """Ticket procesado de una transacción (None si no tiene texto)"""
+        if transaction.get('datos'):
+            return parse_ticket_text(transaction['datos'])
+        return self.parsed_tickets.get(str(transaction.get('folio')))
+
+    def ticket_amount_for(self, transaction):
+        """Importe del ticket de una transacción (0.0 si no tiene)"""
+        ticket = self.parsed_ticket_for(transaction)
+        return (ticket.amount or 0.0) if ticket is not None else 0.0
     
+    def transaction_amount(self, transaction):
+        """Monto mostrado de una transacción: el del ticket o, si no hay, el de sus campos"""
+        monto = self.ticket_amount_for(transaction)
+        
+        # Si no se pudo extraer de los datos del ticket, usar los campos originales
+        if monto == 0:
+            monto = transaction.get('monto', 0) or transaction.get('importe', 0) or transaction.get('total', 0)
+            if isinstance(monto, str):
+                try:
+                    monto = float(monto.replace(',', '').replace('$', ''))
+                except (ValueError, AttributeError):
+                    monto = 0
+        return monto
     
     def init_ui(self):
         layout = QVBoxLayout()
@@ -312,13 +322,13 @@ class CreditDetailWindow(QDialog):
         spent_label.setStyleSheet(f"color: {colors['TEXT_SECONDARY']};")
         spent_label.setAlignment(Qt.AlignmentFlag.AlignRight)
         
-        spent_amount = QLabel(f"${self.total_spent:,.2f}")
-        spent_amount.setFont(QFont("Segoe UI", 16, QFont.Weight.Bold))
-        spent_amount.setStyleSheet(f"color: {colors['SUCCESS_GREEN']};")
-        spent_amount.setAlignment(Qt.AlignmentFlag.AlignRight)
+        self.spent_amount_label = QLabel(f"${self.total_spent:,.2f}")
+        self.spent_amount_label.setFont(QFont("Segoe UI", 16, QFont.Weight.Bold))
+        self.spent_amount_label.setStyleSheet(f"color: {colors['SUCCESS_GREEN']};")
+        self.spent_amount_label.setAlignment(Qt.AlignmentFlag.AlignRight)
         
         spent_section.addWidget(spent_label)
-        spent_section.addWidget(spent_amount)
+        spent_section.addWidget(self.spent_amount_label)
         
         header_layout.addLayout(spent_section)
         
@@ -393,12 +403,12 @@ class CreditDetailWindow(QDialog):
         # Promedio por compra
         if self.client_credit_data['transactions'] > 0:
             avg_per_purchase = self.total_spent / self.client_credit_data['transactions']
-            avg_purchase_label = QLabel(f"💳 Promedio por compra: ${avg_per_purchase:,.0f}")
+            self.avg_purchase_label = QLabel(f"💳 Promedio por compra: ${avg_per_purchase:,.0f}")
         else:
-            avg_purchase_label = QLabel("💳 Promedio por compra: $0")
+            self.avg_purchase_label = QLabel("💳 Promedio por compra: $0")
         
-        avg_purchase_label.setFont(QFont("Segoe UI", 10, QFont.Weight.Medium))
-        avg_purchase_label.setStyleSheet(f"color: {colors['TEXT_SECONDARY']};")
+        self.avg_purchase_label.setFont(QFont("Segoe UI", 10, QFont.Weight.Medium))
+        self.avg_purchase_label.setStyleSheet(f"color: {colors['TEXT_SECONDARY']};")
         
         # Saldo actual (si tiene deuda)
         current_debt = self.client_credit_data['client_data'].get('saldo', 0)
@@ -411,9 +421,19 @@ class CreditDetailWindow(QDialog):
         
         debt_label.setFont(QFont("Segoe UI", 10, QFont.Weight.Medium))
         
-        financial_section.addWidget(avg_purchase_label)
+        financial_section.addWidget(self.avg_purchase_label)
         financial_section.addWidget(debt_label)
         
+        # Productos que más compra (tabla local de artículos)
+        top_products = self.parent.sales_items.product_mix(self.client_id, limit=3)
+        if top_products:
+            products_label = QLabel("🛒 Más comprado: " + ", ".join(
+                f"{product.title()} ({quantity:g})" for product, quantity, _, _ in top_products))
+            products_label.setFont(QFont("Segoe UI", 10, QFont.Weight.Medium))
+            products_label.setStyleSheet(f"color: {colors['TEXT_SECONDARY']};")
+            products_label.setWordWrap(True)
+            financial_section.addWidget(products_label)
+        
         score_layout.addLayout(score_section)
         score_layout.addLayout(level_section)
         score_layout.addLayout(stats_section)
@@ -495,14 +515,9 @@ class CreditDetailWindow(QDialog):
                 folio_item.setFont(QFont("Segoe UI", 9))
                 self.transactions_table.setItem(row, 0, folio_item)
                 
-                # Fecha venta
-                fecha_venta = transaction.get('fecha_venta', 'N/A')
-                if fecha_venta != 'N/A':
-                    try:
-                        fecha_dt = datetime.strptime(fecha_venta, '%Y-%m-%d')
-                        fecha_venta = fecha_dt.strftime('%d/%m/%Y')
-                    except:
-                        pass
+                # Fecha venta (date; se formatea sólo aquí, al mostrarla)
+                fecha_venta = transaction.get('fecha_venta')
+                fecha_venta = fecha_venta.strftime('%d/%m/%Y') if fecha_venta else 'N/A'
                 
                 fecha_venta_item = QTableWidgetItem(fecha_venta)
                 fecha_venta_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -511,12 +526,8 @@ class CreditDetailWindow(QDialog):
                 
                 # Fecha pago
                 fecha_pago = transaction.get('fecha_pago', 'Pendiente')
-                if fecha_pago != 'Pendiente' and fecha_pago != 'N/A':
-                    try:
-                        fecha_dt = datetime.strptime(fecha_pago, '%Y-%m-%d')
-                        fecha_pago = fecha_dt.strftime('%d/%m/%Y')
-                    except:
-                        pass
+                if isinstance(fecha_pago, date):
+                    fecha_pago = fecha_pago.strftime('%d/%m/%Y')
                 
                 fecha_pago_item = QTableWidgetItem(fecha_pago)
                 fecha_pago_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -524,16 +535,7 @@ class CreditDetailWindow(QDialog):
                 self.transactions_table.setItem(row, 2, fecha_pago_item)
                 
                 # MONTO DE LA TRANSACCIÓN - extraer de los datos del ticket
-                monto = self.extract_amount_from_ticket_data(transaction.get('datos', ''))
-                
-                # Si no se pudo extraer de los datos del ticket, usar los campos originales
-                if monto == 0:
-                    monto = transaction.get('monto', 0) or transaction.get('importe', 0) or transaction.get('total', 0)
-                    if isinstance(monto, str):
-                        try:
-                            monto = float(monto.replace(',', '').replace('$', ''))
-                        except (ValueError, AttributeError):
-                            monto = 0
+                monto = self.transaction_amount(transaction)
                 
                 monto_item = QTableWidgetItem(f"${monto:,.0f}")
                 monto_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -710,22 +712,66 @@ class CobranzaApp(QWidget):
         
         #credits
         self.all_clients_data = {}
-        self.all_ventas_data = {}
         self.clients_credit_scores = {}
+        self.credit_level_index = CreditLevelIndex({}, {})  # Puntajes por (nivel, empresa)
+        self.credit_search_index = None  # Nombre/ID/teléfonos de los clientes con puntaje (al buscar)
         self.credit_statistics = {}
+        self.credit_snapshot = None  # Foto única de clientes/ventas/puntajes
+        self.ventas_index = VentasIndex({})  # Ventas pendientes agrupadas por cliente
+        self.aging_index = AgingIndex({}, {}, {}, self.ventas_index)  # Cubetas del tablero
+        # Mueve clientes entre cubetas al cambiar el día, sin recargar
+        self.aging_scheduler = AgingScheduler(self)
+        self.aging_scheduler.clients_moved.connect(self.on_aging_clients_moved)
+        self.aging_scheduler.day_changed.connect(self.on_aging_day_changed)
+        self.ventas_sync = VentasDeltaLoader(pending_only=True)  # Delta de ventas pendientes
+        self.ventas_index_sync = None  # Loader de cuyo mapa salió ventas_index
         self.credit_data_loaded = False  # ← NUEVA BANDERA
         self.credit_data_loading = False  # ← EVITAR CARGAS MÚLTIPLES
         self.top_clients_data_loaded = False
         self.top_clients_data_loading = False
-        self.all_clients_spending = {}  # {client_id: total_spent}
+        self.spending_index = None  # Gasto por cliente y por mes (SpendingIndex)
         self.current_top_view = "clientes"  # clientes o empresas
+        self.top_size = TOP_SIZES[0]  # Cuántos clientes muestra el top
+        self.top_window = "all"  # Periodo del top (SPENDING_WINDOWS)
         
         self.current_credit_view = "clientes"
         self.last_update_time = time.time()
         self.data_loaded = False
         
+        # Copia local para arranque rápido y modo sin conexión
+        self.snapshot_cache = SnapshotCache()
+        self.snapshot_saved_at = None  # Fecha (time.time) de los datos mostrados
+        self.offline_mode = False
+        
+        # Cambios de la ventana de detalle que aún no llegan a SQL Server
+        self.write_queue = WriteBehindQueue(parent=self)
+        
+        # Artículos vendidos por venta (mezcla de productos por cliente)
+        self.sales_items = SalesItemsStore()
+        
+        # Todas las consultas corren en el pool de hilos, fuera del hilo de la interfaz
+        self.workers = WorkerManager(self)
+        
+        # La búsqueda de créditos se aplica cuando el usuario deja de teclear
+        self.credit_search_timer = QTimer(self)
+        self.credit_search_timer.setSingleShot(True)
+        self.credit_search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.credit_search_timer.timeout.connect(self.apply_credit_search)
+        self.notify_on_load = False  # Avisar al terminar la carga (botón recargar)
+        self.view_loading_label = None  # Texto de avance del indicador de carga de la vista
+        
+        # Modelos de las tablas mostradas (se actualizan en el lugar)
+        self.category_tables = {}
+        self.category_tables_view = None
+        self.credit_level_tables = {}
+        self.top_table_model = None
+        
         self.initUI()
-        self.load_data()  # Solo carga datos principales
+        if self.load_cached_snapshot():
+            # Pintar con la copia local y reconciliar con el servidor después
+            QTimer.singleShot(0, self.load_data)
+        else:
+            self.load_data()  # Solo carga datos principales
         self.setup_auto_update()
 
     def get_current_colors(self):
@@ -783,7 +829,7 @@ class CobranzaApp(QWidget):
                 font-family: 'Segoe UI', Arial, sans-serif;
             }}
             
-            QTableWidget {{
+            QTableView {{
                 background: {theme['card_bg_alpha']};
                 border: 1px solid {theme['border_alpha']};
                 border-radius: 12px;
@@ -795,22 +841,22 @@ class CobranzaApp(QWidget):
                 backdrop-filter: blur(10px);
             }}
             
-            QTableWidget::item {{
+            QTableView::item {{
                 padding: 8px 6px;
                 border-bottom: 1px solid {theme['border_alpha']};
                 background: transparent;
             }}
             
-            QTableWidget::item:selected {{
+            QTableView::item:selected {{
                 background: rgba({self.hex_to_rgb(colors['BRIGHT_CYAN'])}, 0.3);
                 color: white;
             }}
             
-            QTableWidget::item:hover {{
+            QTableView::item:hover {{
                 background: {theme['hover_alpha']};
             }}
             
-            QTableWidget QHeaderView::section {{
+            QTableView QHeaderView::section {{
                 background: {theme['card_bg_alpha']};
                 color: {colors['TEXT_PRIMARY']};
                 padding: 8px 6px;
@@ -961,8 +1007,15 @@ class CobranzaApp(QWidget):
         self.amount_label.setFont(QFont("Segoe UI", 16, QFont.Weight.Bold))
         self.amount_label.setStyleSheet(f"color: {colors['BRIGHT_CYAN']};")
         
+        # Origen de los datos (copia local / sin conexión)
+        self.data_status_label = QLabel("")
+        self.data_status_label.setFont(QFont("Segoe UI", 8))
+        self.data_status_label.setStyleSheet(f"color: {colors['WARNING_ORANGE']};")
+        self.data_status_label.hide()
+        
         total_section.addWidget(total_label)
         total_section.addWidget(self.amount_label)
+        total_section.addWidget(self.data_status_label)
         
         stats_layout.addLayout(total_section)
         
@@ -1181,7 +1234,9 @@ class CobranzaApp(QWidget):
             self.main_layout.addWidget(loading_container)
             return
         
-        # Grid de categorías moderno
+        # Grid de categorías moderno (los modelos se guardan para actualizarlos en el lugar)
+        self.category_tables = {}
+        self.category_tables_view = self.current_view
         categories_widget = QWidget()
         categories_layout = QGridLayout()
         categories_layout.setSpacing(15)
@@ -1225,8 +1280,10 @@ class CobranzaApp(QWidget):
         header_layout.addWidget(title_label)
         header_layout.addStretch()
         
-        # Total de la categoría
-        total_categoria = self.calculate_category_total(title.lower())
+        # Filas y total de la categoría
+        category_type = self.get_category_from_title(title)
+        rows = self.build_category_rows(category_type)
+        total_categoria = sum(record['saldo'] for _, record in rows)
         total_label = QLabel(f"${total_categoria:,.0f}")
         total_label.setFont(QFont("Segoe UI", 14, QFont.Weight.Bold))
         total_label.setStyleSheet(f"color: {color}; background: transparent;")
@@ -1235,13 +1292,10 @@ class CobranzaApp(QWidget):
         category_layout.addLayout(header_layout)
         
         # Tabla moderna más compacta
-        table = QTableWidget()
-        table.setColumnCount(4)
-        table.setHorizontalHeaderLabels(['Cliente', 'Monto', 'Fecha', 'Días'])
-        
-        # Deshabilitar edición
-        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        table, proxy = self.create_client_table_view(
+            self.category_columns(color), rows, self.on_client_double_click,
+            background=self.get_category_background_color(color), sort_column=1)
+        self.category_tables[category_type] = (proxy.sourceModel(), total_label)
         
         # Configurar columnas con tamaños más pequeños
         header = table.horizontalHeader()
@@ -1259,27 +1313,24 @@ class CobranzaApp(QWidget):
         
         # Estilo específico para esta tabla
         table.setStyleSheet(f"""
-            QTableWidget {{
+            QTableView {{
                 background: {theme['card_bg_alpha']};
                 border: 1px solid rgba({self.hex_to_rgb(color)}, 0.2);
                 font-size: 11px;
             }}
-            QTableWidget::item {{
+            QTableView::item {{
                 padding: 6px 4px;
             }}
-            QTableWidget::item:selected {{
+            QTableView::item:selected {{
                 background: rgba({self.hex_to_rgb(color)}, 0.3);
             }}
-            QTableWidget QHeaderView::section {{
+            QTableView QHeaderView::section {{
                 border-bottom: 2px solid {color};
                 padding: 6px 4px;
                 font-size: 10px;
             }}
         """)
         
-        # Poblar tabla
-        self.populate_category_table(table, title, color)
-        
         category_layout.addWidget(table)
         category_card.setLayout(category_layout)
         
@@ -1291,12 +1342,8 @@ class CobranzaApp(QWidget):
         colors = self.get_current_colors()
         theme = self.theme_manager.get_current_theme()
         
-        # Sincronizar clientes con buró
-        try:
-            sync_clients_to_buro()
-            self.clients_buro = get_clients_without_credit()
-        except Exception as e:
-            logging.error(f"Error al sincronizar buró: {e}")
+        # Los clientes en buró llegan con la carga principal; el alta de
+        # clientes nuevos en ClientsBuro corre aparte (ver sync_buro)
         
         # Contenedor principal más compacto
         buro_card = ModernCard(self.theme_manager)
@@ -1437,17 +1484,10 @@ class CobranzaApp(QWidget):
         """Crear vista del sistema de créditos - CON CARGA BAJO DEMANDA"""
         # PRIMER PASO: Verificar si necesitamos cargar datos de créditos
         if not self.credit_data_loaded:
-            # Mostrar indicador de carga
+            # Mostrar indicador de carga; la vista se crea cuando lleguen los datos
             self.show_credit_loading_indicator()
-            
-            # Procesar eventos para mostrar la interfaz
-            QApplication.processEvents()
-            
-            # Cargar datos en segundo plano
-            if not self.load_credit_data():
-                # Si falla la carga, mostrar error y volver a vista anterior
-                self.switch_view("clientes")
-                return
+            self.load_credit_data()
+            return
         
         # SEGUNDO PASO: Crear la vista normalmente
         self.clear_layout(self.main_layout)
@@ -1483,7 +1523,7 @@ class CobranzaApp(QWidget):
     
     def retry_credit_data_load(self):
         """Reintentar carga de datos crediticios"""
-        self.credit_data_loaded = False
+        self.invalidate_credit_snapshot()
         self.credit_data_loading = False
         self.create_creditos_view()
     
@@ -1693,12 +1733,7 @@ class CobranzaApp(QWidget):
         card_layout.addLayout(header_layout)
         
         # Tabla de clientes
-        table = QTableWidget()
-        table.setColumnCount(4)
-        table.setHorizontalHeaderLabels(['Cliente', 'Puntaje', 'Transacciones', 'Promedio Días'])
-        
-        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        table, proxy = self.create_credit_level_view(clients_in_level, color)
         
         # Configurar columnas
         header = table.horizontalHeader()
@@ -1716,105 +1751,72 @@ class CobranzaApp(QWidget):
         
         # Estilo específico
         table.setStyleSheet(f"""
-            QTableWidget {{
+            QTableView {{
                 background: rgba({self.hex_to_rgb(color)}, 0.05);
                 border: 1px solid rgba({self.hex_to_rgb(color)}, 0.2);
                 font-size: 10px;
             }}
-            QTableWidget::item {{
+            QTableView::item {{
                 padding: 6px 4px;
             }}
-            QTableWidget::item:selected {{
+            QTableView::item:selected {{
                 background: rgba({self.hex_to_rgb(color)}, 0.3);
             }}
-            QTableWidget QHeaderView::section {{
+            QTableView QHeaderView::section {{
                 border-bottom: 2px solid {color};
                 padding: 6px 4px;
                 font-size: 9px;
             }}
         """)
         
-        # Poblar tabla
-        self.populate_credit_level_table(table, clients_in_level, color)
-        
         card_layout.addWidget(table)
         level_card.setLayout(card_layout)
         
         layout.addWidget(level_card, row, col)
 
-    def populate_credit_level_table(self, table, clients_in_level, color):
-        """Poblar tabla con clientes del nivel específico"""
-        # Ordenar clientes por puntaje descendente
-        sorted_clients = sorted(
-            clients_in_level.items(), 
-            key=lambda x: x[1]['credit_score'], 
-            reverse=True
-        )
-        
-        table.setRowCount(len(sorted_clients))
-        
-        for row, (client_id, client_data) in enumerate(sorted_clients):
-            try:
-                # Nombre del cliente (truncado)
-                nombre = client_data['client_data'].get('nombre', 'Sin nombre')
-                if len(nombre) > 20:
-                    nombre = nombre[:17] + "..."
-                
-                name_item = QTableWidgetItem(nombre)
-                name_item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
-                name_item.setData(Qt.ItemDataRole.UserRole, client_id)
-                name_item.setFont(QFont("Segoe UI", 9, QFont.Weight.Medium))
-                name_item.setToolTip(client_data['client_data'].get('nombre', 'Sin nombre'))
-                table.setItem(row, 0, name_item)
-                
-                # Puntaje
-                score_item = QTableWidgetItem(str(client_data['credit_score']))
-                score_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                score_item.setFont(QFont("Segoe UI", 9, QFont.Weight.Bold))
-                score_item.setForeground(QColor(color))
-                table.setItem(row, 1, score_item)
-                
-                # Número de transacciones
-                trans_item = QTableWidgetItem(str(client_data['transactions']))
-                trans_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                trans_item.setFont(QFont("Segoe UI", 8))
-                table.setItem(row, 2, trans_item)
-                
-                # Promedio de días
-                avg_days = client_data['avg_payment_days']
-                avg_item = QTableWidgetItem(f"{avg_days}d")
-                avg_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                avg_item.setFont(QFont("Segoe UI", 8))
-                table.setItem(row, 3, avg_item)
-                
-                # Color de fondo sutil
-                bg_color = QColor(color)
-                bg_color.setAlpha(20)
-                
-                for col_idx in range(4):
-                    item = table.item(row, col_idx)
-                    if item:
-                        item.setBackground(bg_color)
-                        
-            except Exception as e:
-                logging.error(f"Error poblando fila {row}: {e}")
-                continue
+    def credit_level_columns(self, color, name_limit=20, styled=True):
+        """Columnas de las tablas de niveles de crédito"""
+        # Las tablas simples usan la fuente de la tabla (font_size=None)
+        sizes = (9, 9, 8, 8) if styled else (None, None, None, None)
+        name_of = lambda cid, r: r['client_data'].get('nombre', 'Sin nombre')
+        return [
+            TableColumn('Cliente', name_of, lambda v, r: truncate(v, name_limit),
+                        align=ALIGN_LEFT, font_size=sizes[0], weight=QFont.Weight.Medium,
+                        tooltip=name_of),
+            TableColumn('Puntaje', lambda cid, r: r['credit_score'],
+                        font_size=sizes[1], weight=QFont.Weight.Bold, color=color),
+            TableColumn('Transacciones', lambda cid, r: r['transactions'], font_size=sizes[2]),
+            TableColumn('Promedio Días', lambda cid, r: r['avg_payment_days'],
+                        lambda v, r: f"{v}d", font_size=sizes[3])
+        ]
+
+    def create_credit_level_view(self, clients_in_level, color, name_limit=20, styled=True):
+        """Tabla de clientes de un nivel de crédito, ordenada por puntaje"""
+        background = None
+        if styled:
+            # Color de fondo sutil
+            background = QColor(color)
+            background.setAlpha(20)
         
-        # Conectar evento de doble clic
-        table.cellDoubleClicked.connect(lambda row, col: self.on_credit_client_double_click(table, row))
+        return self.create_client_table_view(
+            self.credit_level_columns(color, name_limit, styled),
+            clients_in_level.items(), self.on_credit_client_double_click,
+            name_of=lambda record: record['client_data'].get('nombre', ''),
+            background=background, sort_column=1)
 
-    def on_credit_client_double_click(self, table, row):
+    def on_credit_client_double_click(self, client_id):
         """Maneja el doble clic en un cliente de la vista de créditos"""
         try:
-            name_item = table.item(row, 0)
-            if name_item:
-                client_id = name_item.data(Qt.ItemDataRole.UserRole)
-                if client_id and client_id in self.clients_credit_scores:
-                    client_credit_data = self.clients_credit_scores[client_id]
-                    self.credit_detail_window = CreditDetailWindow(self, client_credit_data, client_id)
-                    self.credit_detail_window.show()
+            if client_id and client_id in self.clients_credit_scores:
+                # El detalle de transacciones se calcula sólo para el cliente abierto
+                if self.credit_snapshot is not None:
+                    client_credit_data = self.credit_snapshot.credit_data(client_id)
                 else:
-                    QMessageBox.warning(self, "⚠️ Error", "No se pudo obtener la información crediticia del cliente")
+                    client_credit_data = self.clients_credit_scores[client_id]
+                self.credit_detail_window = CreditDetailWindow(self, client_credit_data, client_id)
+                self.credit_detail_window.show()
+            else:
+                QMessageBox.warning(self, "⚠️ Error", "No se pudo obtener la información crediticia del cliente")
         except Exception as e:
             logging.error(f"Error al abrir detalles crediticios del cliente: {e}")
             QMessageBox.critical(self, "❌ Error", f"Error al abrir detalles crediticios: {str(e)}")
@@ -1864,7 +1866,7 @@ class CobranzaApp(QWidget):
         
         # Campo de búsqueda optimizado
         self.credit_search_input = QLineEdit()
-        self.credit_search_input.setPlaceholderText("Buscar cliente por nombre...")
+        self.credit_search_input.setPlaceholderText("Buscar cliente por nombre, ID o teléfono...")
         self.credit_search_input.setFixedWidth(300)  # Un poco más compacto
         self.credit_search_input.setFixedHeight(35)
         self.credit_search_input.setStyleSheet(f"""
@@ -1931,18 +1933,19 @@ class CobranzaApp(QWidget):
 
     def on_credit_search_changed(self, text):
         """Manejar cambios en el campo de búsqueda de créditos"""
-        # Buscar en tiempo real mientras el usuario escribe
+        # Buscar mientras el usuario escribe, al hacer una pausa
         self.current_search_text = text.strip().lower()
         
         # Solo buscar si hay al menos 2 caracteres o está vacío (mostrar todo)
         if len(self.current_search_text) >= 2 or self.current_search_text == "":
-            self.recreate_only_credit_content()
+            self.credit_search_timer.start()
 
     def clear_credit_search(self):
         """Limpiar el campo de búsqueda"""
         self.credit_search_input.clear()
         self.current_search_text = ""
-        self.recreate_only_credit_content()
+        self.credit_search_timer.stop()
+        self.apply_credit_search()
     
     def switch_credit_view(self, view):
         """Cambiar vista de créditos - SIMPLIFICADO sin estadísticas"""
@@ -1957,6 +1960,7 @@ class CobranzaApp(QWidget):
             if hasattr(self, 'credit_search_input'):
                 self.credit_search_input.clear()
                 self.current_search_text = ""
+                self.credit_search_timer.stop()
             
             # Solo recrear el contenido (no la navegación)
             self.recreate_only_credit_content()
@@ -1978,6 +1982,8 @@ class CobranzaApp(QWidget):
     
     def create_credit_content(self):
         """Crear contenido filtrado según vista actual"""
+        self.credit_level_tables = {}
+        
         # Contenedor principal para las tablas
         content_widget = QWidget()
         content_layout = QGridLayout()
@@ -2037,21 +2043,13 @@ class CobranzaApp(QWidget):
         icon_label = QLabel(icon)
         icon_label.setFont(QFont("Segoe UI", 18))  # Ícono más grande
         
-        # Título con contador y indicador de búsqueda
-        search_text = getattr(self, 'current_search_text', '')
-        if search_text:
-            title_text = f"{level_name} ({len(clients_data)})"
-            search_indicator = " 🔍"
-            tooltip_text = f"Filtrando por: '{search_text}'"
-        else:
-            title_text = f"{level_name} ({len(clients_data)})"
-            search_indicator = ""
-            tooltip_text = f"Mostrando todos los {level_name.lower()}"
+        # Tabla primero: el contador del título sale de las filas que pasan el filtro
+        table, proxy = self.create_credit_level_view(clients_data, color, name_limit=25, styled=False)
+        proxy.set_filter_ids(self.credit_search_ids())
         
-        title_label = QLabel(title_text + search_indicator)
+        title_label = QLabel()
         title_label.setFont(QFont("Segoe UI", 13, QFont.Weight.Bold))
         title_label.setStyleSheet(f"color: {color}; padding: 2px;")
-        title_label.setToolTip(tooltip_text)
         
         type_indicator = QLabel("👤" if self.current_credit_view == "clientes" else "🏢")
         type_indicator.setFont(QFont("Segoe UI", 14))
@@ -2073,13 +2071,6 @@ class CobranzaApp(QWidget):
         
         layout.addWidget(header_container)
         
-        # Tabla con mejor espaciado
-        table = QTableWidget()
-        table.setColumnCount(4)
-        table.setHorizontalHeaderLabels(['Cliente', 'Puntaje', 'Transacciones', 'Promedio Días'])
-        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        
         # Configurar columnas
         header = table.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
@@ -2094,31 +2085,42 @@ class CobranzaApp(QWidget):
         table.setMaximumHeight(280)  # Más altura para la tabla
         table.setMinimumHeight(220)
         
-        # Estilo con indicador de búsqueda mejorado
-        border_color = color
-        if search_text:
-            border_color = colors['BRIGHT_CYAN']  # Cambiar borde cuando hay búsqueda activa
+        self.credit_level_tables[level_name] = {
+            'proxy': proxy, 'table': table, 'title': title_label, 'color': color
+        }
+        self.update_credit_level_header(level_name)
         
-        table.setStyleSheet(f"""
-            QTableWidget {{
+        layout.addWidget(table)
+        card.setLayout(layout)
+        
+        return card
+
+    
+    def simple_credit_table_style(self, color, searching):
+        """Estilo de las tablas de nivel; el borde cambia si hay búsqueda activa"""
+        colors = self.get_current_colors()
+        border_color = colors['BRIGHT_CYAN'] if searching else color
+        
+        return f"""
+            QTableView {{
                 background: rgba({self.hex_to_rgb(color)}, 0.06);
                 border: 2px solid rgba({self.hex_to_rgb(border_color)}, 0.5);
                 border-radius: 8px;
                 font-size: 11px;
                 gridline-color: rgba({self.hex_to_rgb(border_color)}, 0.2);
             }}
-            QTableWidget::item {{
+            QTableView::item {{
                 padding: 8px 6px;
                 border-bottom: 1px solid rgba({self.hex_to_rgb(border_color)}, 0.1);
             }}
-            QTableWidget::item:selected {{
+            QTableView::item:selected {{
                 background: rgba({self.hex_to_rgb(color)}, 0.4);
                 color: white;
             }}
-            QTableWidget::item:hover {{
+            QTableView::item:hover {{
                 background: rgba({self.hex_to_rgb(color)}, 0.2);
             }}
-            QTableWidget QHeaderView::section {{
+            QTableView QHeaderView::section {{
                 background: rgba({self.hex_to_rgb(color)}, 0.1);
                 border: none;
                 border-right: 1px solid rgba({self.hex_to_rgb(border_color)}, 0.3);
@@ -2141,93 +2143,48 @@ class CobranzaApp(QWidget):
             QScrollBar::handle:vertical:hover {{
                 background: rgba({self.hex_to_rgb(color)}, 0.7);
             }}
-        """)
-        
-        # Poblar tabla
-        self.populate_simple_credit_table(table, clients_data, color)
+        """
+
+    def update_credit_level_header(self, level_name):
+        """Contador, indicador de búsqueda y borde de la tabla de un nivel"""
+        entry = self.credit_level_tables[level_name]
+        search_text = getattr(self, 'current_search_text', '')
+        count = entry['proxy'].rowCount()
         
-        layout.addWidget(table)
-        card.setLayout(layout)
+        if search_text:
+            entry['title'].setText(f"{level_name} ({count}) 🔍")
+            entry['title'].setToolTip(f"Filtrando por: '{search_text}'")
+        else:
+            entry['title'].setText(f"{level_name} ({count})")
+            entry['title'].setToolTip(f"Mostrando todos los {level_name.lower()}")
         
-        return card
+        entry['table'].setStyleSheet(self.simple_credit_table_style(entry['color'], bool(search_text)))
+
+    def credit_search_ids(self):
+        """Clientes que coinciden con la búsqueda actual (None: sin búsqueda)"""
+        search_text = getattr(self, 'current_search_text', '')
+        if not search_text:
+            return None
+        if self.credit_search_index is None:
+            self.credit_search_index = ClientSearchIndex({
+                client_id: data['client_data'] for client_id, data in self.clients_credit_scores.items()})
+        return self.credit_search_index.search(search_text)
+
+    def apply_credit_search(self):
+        """Filtrar en el lugar las tablas de créditos ya mostradas"""
+        try:
+            client_ids = self.credit_search_ids()
+            for level_name, entry in self.credit_level_tables.items():
+                entry['proxy'].set_filter_ids(client_ids)
+                self.update_credit_level_header(level_name)
+        except RuntimeError:
+            # Las tablas ya no existen: reconstruir el contenido
+            self.credit_level_tables = {}
+            self.recreate_only_credit_content()
 
-    
-    def populate_simple_credit_table(self, table, clients_data, color):
-        """Poblar tabla con datos simples"""
-        # Ordenar por puntaje
-        sorted_clients = sorted(
-            clients_data.items(), 
-            key=lambda x: x[1]['credit_score'], 
-            reverse=True
-        )
-        
-        table.setRowCount(len(sorted_clients))
-        
-        for row, (client_id, client_data) in enumerate(sorted_clients):
-            try:
-                # Nombre
-                nombre = client_data['client_data'].get('nombre', 'Sin nombre')
-                if len(nombre) > 25:
-                    nombre = nombre[:22] + "..."
-                
-                name_item = QTableWidgetItem(nombre)
-                name_item.setData(Qt.ItemDataRole.UserRole, client_id)
-                name_item.setToolTip(client_data['client_data'].get('nombre', 'Sin nombre'))
-                table.setItem(row, 0, name_item)
-                
-                # Puntaje
-                score_item = QTableWidgetItem(str(client_data['credit_score']))
-                score_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                score_item.setForeground(QColor(color))
-                table.setItem(row, 1, score_item)
-                
-                # Transacciones
-                trans_item = QTableWidgetItem(str(client_data['transactions']))
-                trans_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                table.setItem(row, 2, trans_item)
-                
-                # Promedio días
-                avg_item = QTableWidgetItem(f"{client_data['avg_payment_days']}d")
-                avg_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                table.setItem(row, 3, avg_item)
-                
-            except Exception as e:
-                logging.error(f"Error poblando fila {row}: {e}")
-                continue
-        
-        # Conectar doble clic
-        table.cellDoubleClicked.connect(lambda row, col: self.on_credit_client_double_click(table, row))
-    
     def filter_clients_for_level(self, level_name):
-        """Filtrar clientes por nivel Y tipo actual Y búsqueda"""
-        filtered = {}
-        
-        # Obtener texto de búsqueda actual
-        search_text = getattr(self, 'current_search_text', '').lower()
-        
-        for client_id, credit_data in self.clients_credit_scores.items():
-            # Verificar si es del nivel correcto
-            if credit_data['credit_level']['name'] != level_name:
-                continue
-            
-            # Verificar si es del tipo correcto (cliente/empresa)
-            client_state = self.client_states.get(client_id, {})
-            is_company = client_state.get('company', False)
-            
-            if self.current_credit_view == "clientes" and is_company:
-                continue
-            elif self.current_credit_view == "empresas" and not is_company:
-                continue
-            
-            # FILTRAR POR BÚSQUEDA DE NOMBRE
-            if search_text:
-                client_name = credit_data['client_data'].get('nombre', '').lower()
-                if search_text not in client_name:
-                    continue
-            
-            filtered[client_id] = credit_data
-        
-        return filtered
+        """Clientes del nivel y del tipo actual (la búsqueda la aplica el proxy)"""
+        return self.credit_level_index.clients_in(level_name, self.current_credit_view == "empresas")
     
     def clear_layout_from_index(self, start_index):
         """Limpiar layout desde un índice específico"""
@@ -2238,24 +2195,7 @@ class CobranzaApp(QWidget):
     
     def get_current_credit_stats(self):
         """Obtener estadísticas para la vista actual (clientes o empresas)"""
-        current_stats = {}
-        
-        for client_id, credit_data in self.clients_credit_scores.items():
-            # Determinar si es cliente o empresa
-            client_state = self.client_states.get(client_id, {})
-            is_company = client_state.get('company', False)
-            
-            # Filtrar según vista actual
-            if self.current_credit_view == "clientes" and is_company:
-                continue
-            elif self.current_credit_view == "empresas" and not is_company:
-                continue
-            
-            # Contar por nivel
-            level_name = credit_data['credit_level']['name']
-            current_stats[level_name] = current_stats.get(level_name, 0) + 1
-        
-        return current_stats
+        return self.credit_level_index.counts(self.current_credit_view == "empresas")
 
     def create_client_credit_content(self):
         """Crear contenido de créditos para clientes"""
@@ -2348,23 +2288,8 @@ class CobranzaApp(QWidget):
         colors = self.get_current_colors()
         theme = self.theme_manager.get_current_theme()
         
-        # Filtrar clientes por nivel Y tipo (cliente/empresa)
-        clients_in_level = {}
-        
-        for client_id, data in self.clients_credit_scores.items():
-            if data['credit_level']['name'] != level_name:
-                continue
-            
-            # Aplicar filtro de tipo
-            client_state = self.client_states.get(client_id, {})
-            is_company = client_state.get('company', False)
-            
-            if filter_type == "clientes" and is_company:
-                continue
-            elif filter_type == "empresas" and not is_company:
-                continue
-            
-            clients_in_level[client_id] = data
+        # Clientes del nivel Y tipo (cliente/empresa)
+        clients_in_level = self.credit_level_index.clients_in(level_name, filter_type == "empresas")
         
         # Crear card
         level_card = ModernCard(self.theme_manager)
@@ -2415,12 +2340,7 @@ class CobranzaApp(QWidget):
         card_layout.addLayout(header_layout)
         
         # Tabla de clientes
-        table = QTableWidget()
-        table.setColumnCount(4)
-        table.setHorizontalHeaderLabels(['Cliente', 'Puntaje', 'Transacciones', 'Promedio Días'])
-        
-        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        table, proxy = self.create_credit_level_view(clients_in_level, color)
         
         # Configurar columnas
         header = table.horizontalHeader()
@@ -2438,114 +2358,134 @@ class CobranzaApp(QWidget):
         
         # Estilo específico
         table.setStyleSheet(f"""
-            QTableWidget {{
+            QTableView {{
                 background: rgba({self.hex_to_rgb(color)}, 0.05);
                 border: 1px solid rgba({self.hex_to_rgb(color)}, 0.2);
                 font-size: 10px;
             }}
-            QTableWidget::item {{
+            QTableView::item {{
                 padding: 6px 4px;
             }}
-            QTableWidget::item:selected {{
+            QTableView::item:selected {{
                 background: rgba({self.hex_to_rgb(color)}, 0.3);
             }}
-            QTableWidget QHeaderView::section {{
+            QTableView QHeaderView::section {{
                 border-bottom: 2px solid {color};
                 padding: 6px 4px;
                 font-size: 9px;
             }}
         """)
         
-        # Poblar tabla
-        self.populate_credit_level_table(table, clients_in_level, color)
-        
         card_layout.addWidget(table)
         level_card.setLayout(card_layout)
         
         layout.addWidget(level_card, row, col)
     
-    def populate_category_table(self, table, category_title, color):
-        """Poblar tabla con datos según la categoría - optimizado"""
-        category_type = self.get_category_from_title(category_title)
-        clients_in_category = []
-        
-        # Filtrar clientes por categoría
-        for client_id, client_data in self.clientes_data.items():
-            if client_id in self.clients_buro:
-                continue
-            
-            if not self.should_show_client(client_id):
-                continue
-            
-            if self.categorize_client(client_id) == category_type:
-                oldest_date = self.get_oldest_sale_date(client_id)
-                
-                if oldest_date:
-                    days_diff = (datetime.now().date() - oldest_date).days
-                    fecha_str = oldest_date.strftime("%d/%m")
-                else:
-                    days_diff = "N/A"
-                    fecha_str = "N/A"
-                
-                clients_in_category.append({
-                    'id': client_id,
-                    'nombre': client_data.get('nombre', 'Sin nombre'),
-                    'saldo': client_data.get('saldo', 0.0),
-                    'fecha': fecha_str,
-                    'dias': days_diff
-                })
+    def build_category_rows(self, category_type):
+        """Filas (client_id, registro) de los clientes de una categoría"""
+        is_company = self.current_view == "empresas"
         
-        # Ordenar por saldo descendente
-        clients_in_category.sort(key=lambda x: x['saldo'], reverse=True)
+        # Los clientes ya vienen agrupados por cubeta (sin buró)
+        return [(entry.client_id, self.category_record(entry))
+                for entry in self.aging_index.clients_in(is_company, category_type)]
+
+    def category_record(self, entry):
+        """Registro de una fila de las tablas de antigüedad"""
+        client_data = self.clientes_data[entry.client_id]
+        return {
+            'nombre': client_data.get('nombre', 'Sin nombre'),
+            'saldo': client_data.get('saldo', 0.0),
+            'fecha': entry.oldest_pending
+        }
+
+    def category_columns(self, color):
+        """Columnas de las tablas de antigüedad"""
+        return [
+            TableColumn('Cliente', lambda cid, r: r['nombre'], lambda v, r: truncate(v, 25),
+                        align=ALIGN_LEFT, weight=QFont.Weight.Medium,
+                        tooltip=lambda cid, r: r['nombre']),
+            TableColumn('Monto', lambda cid, r: r['saldo'], lambda v, r: f"${v:,.0f}",
+                        weight=QFont.Weight.Bold, color=color),
+            TableColumn('Fecha', lambda cid, r: r['fecha'],
+                        lambda v, r: v.strftime("%d/%m") if v else "N/A", font_size=8),
+            # Los días se calculan al pintar para seguir correctos al cambiar de día
+            TableColumn('Días', lambda cid, r: self.aging_index.days_outstanding(r['fecha']),
+                        lambda v, r: f"{v}d" if v is not None else "N/A",
+                        font_size=8, weight=QFont.Weight.Medium)
+        ]
+
+    def refresh_category_tables(self):
+        """
+        Actualizar en el lugar las tablas de antigüedad ya mostradas.
+        Regresa False si la vista ya no existe y hay que construirla.
+        """
+        if not self.category_tables or self.category_tables_view != self.current_view:
+            return False
         
-        # Poblar tabla
-        table.setRowCount(len(clients_in_category))
-        
-        for row, client in enumerate(clients_in_category):
-            # Nombre - truncar si es muy largo
-            nombre = client['nombre']
-            if len(nombre) > 25:
-                nombre = nombre[:22] + "..."
-            
-            name_item = QTableWidgetItem(nombre)
-            name_item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
-            name_item.setData(Qt.ItemDataRole.UserRole, client['id'])
-            name_item.setFont(QFont("Segoe UI", 9, QFont.Weight.Medium))
-            name_item.setToolTip(client['nombre'])
-            table.setItem(row, 0, name_item)
-            
-            # Monto - formato más compacto
-            monto_item = QTableWidgetItem(f"${client['saldo']:,.0f}")
-            monto_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            monto_item.setFont(QFont("Segoe UI", 9, QFont.Weight.Bold))
-            monto_item.setForeground(QColor(color))
-            table.setItem(row, 1, monto_item)
-            
-            # Fecha
-            fecha_item = QTableWidgetItem(client['fecha'])
-            fecha_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            fecha_item.setFont(QFont("Segoe UI", 8))
-            table.setItem(row, 2, fecha_item)
-            
-            # Días - formato más corto
-            if client['dias'] != "N/A":
-                dias_str = f"{client['dias']}d"
-            else:
-                dias_str = "N/A"
-            dias_item = QTableWidgetItem(dias_str)
-            dias_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            dias_item.setFont(QFont("Segoe UI", 8, QFont.Weight.Medium))
-            table.setItem(row, 3, dias_item)
-            
-            # Color de fondo sutil
-            bg_color = self.get_category_background_color(color)
-            for col in range(4):
-                item = table.item(row, col)
-                if item:
-                    item.setBackground(QColor(bg_color))
+        try:
+            for category_type, (model, total_label) in self.category_tables.items():
+                rows = self.build_category_rows(category_type)
+                model.set_rows(rows)
+                total_label.setText(f"${sum(record['saldo'] for _, record in rows):,.0f}")
+            return True
+        except RuntimeError:
+            # Los widgets ya se destruyeron (se cambió de vista)
+            self.category_tables = {}
+            return False
+
+    def on_aging_clients_moved(self, moves):
+        """Mover en las tablas mostradas sólo a los clientes que cambiaron de cubeta"""
+        if not self.category_tables or self.category_tables_view != self.current_view:
+            return
         
-        # Conectar evento de doble clic
-        table.cellDoubleClicked.connect(lambda row, col: self.on_client_double_click(table, row))
+        is_company_view = self.current_view == "empresas"
+        touched = set()
+        try:
+            for client_id, is_company, old_bucket, new_bucket in moves:
+                if is_company != is_company_view:
+                    continue
+                self.category_tables[old_bucket][0].remove_row(client_id)
+                entry = self.aging_index.get(client_id)
+                self.category_tables[new_bucket][0].update_row(client_id, self.category_record(entry))
+                touched.update((old_bucket, new_bucket))
+            
+            for bucket in touched:
+                _, total_label = self.category_tables[bucket]
+                total_label.setText(f"${self.aging_index.total(is_company_view, bucket):,.0f}")
+        except RuntimeError:
+            # La vista ya no existe; se construirá con las cubetas nuevas
+            self.category_tables = {}
+
+    def on_aging_day_changed(self, today):
+        """Repintar la columna de días de las tablas mostradas"""
+        try:
+            for model, _ in self.category_tables.values():
+                model.refresh_all()
+        except RuntimeError:
+            self.category_tables = {}
+
+    def create_client_table_view(self, columns, rows, on_double_click, name_of=None,
+                                 background=None, sort_column=None,
+                                 sort_order=Qt.SortOrder.DescendingOrder):
+        """
+        Crear una tabla modelo/vista sobre registros de clientes.
+        Regresa (QTableView, proxy); el modelo fuente es proxy.sourceModel().
+        """
+        table = QTableView()
+        model = ClientTableModel(columns, table)
+        model.set_rows(rows)
+        proxy = ClientFilterProxyModel(model, name_of or (lambda record: record.get('nombre')), table)
+        
+        table.setModel(proxy)
+        table.setItemDelegate(ClientTableDelegate(columns, background, table))
+        table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        table.setSortingEnabled(True)
+        if sort_column is not None:
+            table.sortByColumn(sort_column, sort_order)
+        
+        table.doubleClicked.connect(lambda index: on_double_click(proxy.client_id_at(index)))
+        return table, proxy
 
     def get_category_background_color(self, color):
         """Obtener color de fondo para las celdas"""
@@ -2640,18 +2580,16 @@ class CobranzaApp(QWidget):
         """Crear vista de top clientes con carga bajo demanda"""
         # Verificar si necesitamos cargar datos
         if not self.top_clients_data_loaded:
+            # Mostrar indicador de carga; la vista se crea cuando lleguen los datos
             self.show_top_loading_indicator()
-            QApplication.processEvents()
-            
-            if not self.load_top_clients_data():
-                self.switch_view("clientes")
-                return
+            self.load_top_clients_data()
+            return
         
         self.clear_layout(self.main_layout)
         colors = self.get_current_colors()
         
         # Verificar si los datos están disponibles
-        if not self.all_clients_spending:
+        if not self.spending_index:
             error_container = ModernCard(self.theme_manager)
             error_container.setFixedHeight(200)
             error_layout = QVBoxLayout()
@@ -2706,114 +2644,64 @@ class CobranzaApp(QWidget):
         loading_layout.addWidget(icon_label)
         loading_layout.addWidget(loading_label)
         loading_layout.addWidget(sub_label)
+        self.view_loading_label = sub_label  # Aquí se muestra el avance de la carga
         
         loading_container.setLayout(loading_layout)
         self.main_layout.addWidget(loading_container)
 
     def load_top_clients_data(self):
-        """Cargar datos para top clientes"""
+        """Cargar datos para top clientes (en segundo plano)"""
         if self.top_clients_data_loaded or self.top_clients_data_loading:
-            return True
+            return
         
-        try:
-            self.top_clients_data_loading = True
-            logging.info("Cargando datos de top clientes bajo demanda...")
-            
-            # Verificar si los datos básicos están cargados
-            if not self.data_loaded:
-                logging.warning("Datos básicos no cargados, cargando primero...")
-                self.load_data()
-            
-            # Reutilizar datos si ya están cargados del sistema de créditos
-            if not hasattr(self, 'all_clients_data') or not self.all_clients_data:
-                from database import get_all_clients_data  # Asegúrate de importar
-                self.all_clients_data = get_all_clients_data()
-                
-            if not hasattr(self, 'all_ventas_data') or not self.all_ventas_data:
-                from database import get_all_ventas_data  # Asegúrate de importar
-                self.all_ventas_data = get_all_ventas_data()
-            
-            # Calcular gastos totales por cliente
-            self.all_clients_spending = self.calculate_all_clients_spending()
-            
-            logging.info(f"Datos de top clientes cargados: {len(self.all_clients_spending)} clientes analizados")
-            
-            self.top_clients_data_loaded = True
-            self.top_clients_data_loading = False
-            return True
-            
-        except Exception as e:
-            logging.error(f"Error al cargar datos de top clientes: {e}")
-            self.top_clients_data_loading = False
-            self.top_clients_data_loaded = False
-            
-            # Mostrar error en lugar de cerrar la app
-            QMessageBox.critical(self, "❌ Error", 
-                            f"Error al cargar datos de top clientes:\n{str(e)}")
-            return False
-
-    def calculate_all_clients_spending(self):
-        """Calcular el gasto total de todos los clientes"""
-        clients_spending = {}
+        self.top_clients_data_loading = True
+        logging.info("Cargando datos de top clientes bajo demanda...")
         
-        try:
-            for client_id, client_data in self.all_clients_data.items():
-                total_spent = 0.0
-                
-                # Buscar todas las ventas del cliente
-                for venta_id, venta_data in self.all_ventas_data.items():
-                    if venta_data.get('cveCte') == client_id:
-                        # Intentar extraer el monto del ticket
-                        ticket_data = venta_data.get('datos', '')
-                        
-                        if ticket_data:
-                            # Usar el mismo método que en CreditDetailWindow
-                            monto = self.extract_amount_from_ticket_data(ticket_data)
-                        else:
-                            # Fallback a campos tradicionales
-                            monto = venta_data.get('importe', 0) or venta_data.get('total', 0) or 0
-                            if isinstance(monto, str):
-                                try:
-                                    monto = float(monto.replace(',', '').replace('$', ''))
-                                except (ValueError, AttributeError):
-                                    monto = 0
-                        
-                        total_spent += monto
-                
-                if total_spent > 0:
-                    clients_spending[client_id] = {
-                        'client_data': client_data,
-                        'total_spent': total_spent
-                    }
-            
-            return clients_spending
-            
-        except Exception as e:
-            logging.error(f"Error calculando gastos de clientes: {e}")
-            return {}
-
-    def extract_amount_from_ticket_data(self, ticket_data):
-        """Extraer el monto de los datos del ticket (reutilizado de CreditDetailWindow)"""
-        if not ticket_data:
-            return 0.0
+        # Verificar si los datos básicos están cargados
+        if not self.data_loaded:
+            logging.warning("Datos básicos no cargados, cargando primero...")
+            self.load_data()
         
-        try:
-            lines = ticket_data.split('\r\n')
-            
-            for line in lines:
-                line = line.strip()
-                
-                if "IMPORTE:" in line:
-                    try:
-                        importe_part = line.split("IMPORTE:")[-1].strip()
-                        importe_clean = importe_part.replace('$', '').replace(',', '').strip()
-                        return float(importe_clean)
-                    except (ValueError, IndexError):
-                        continue
-        except Exception:
-            pass
+        self.workers.submit('top_clients', self._build_top_clients_data, self.credit_snapshot,
+                            on_result=self._on_top_clients_loaded,
+                            on_error=self._on_top_clients_error,
+                            on_progress=self.update_view_loading_progress,
+                            result_type=dict)
+    
+    def _build_top_clients_data(self, task, snapshot):
+        """Reutilizar (o construir) el snapshot y calcular gastos (corre en el pool)"""
+        if snapshot is None:
+            task.report_progress(10, "Consultando clientes y ventas...")
+            snapshot = CreditSnapshot.load()
+        task.check_cancelled()
+        
+        # Gasto por cliente precalculado (después de un refresh ya viene actualizado)
+        task.report_progress(80, "Calculando gastos por cliente...")
+        return {'snapshot': snapshot, 'spending': snapshot.spending_index}
+    
+    def _on_top_clients_loaded(self, result):
+        if self.credit_snapshot is not result['snapshot']:
+            self.set_credit_snapshot(result['snapshot'])
+        self.spending_index = result['spending']
+        
+        logging.info(f"Datos de top clientes cargados: {len(self.spending_index)} clientes analizados")
         
-        return 0.0
+        self.top_clients_data_loaded = True
+        self.top_clients_data_loading = False
+        
+        if self.current_view == "top":
+            self.create_top_clientes_view()
+    
+    def _on_top_clients_error(self, message):
+        logging.error(f"Error al cargar datos de top clientes: {message}")
+        self.top_clients_data_loading = False
+        self.top_clients_data_loaded = False
+        
+        # Mostrar error en lugar de cerrar la app
+        QMessageBox.critical(self, "❌ Error", 
+                        f"Error al cargar datos de top clientes:\n{message}")
+        if self.current_view == "top":
+            self.switch_view("clientes")
 
     def create_top_sub_navigation(self):
         """Crear sub-navegación para top clientes"""
@@ -2844,6 +2732,26 @@ class CobranzaApp(QWidget):
         
         nav_layout.addWidget(self.top_clientes_btn)
         nav_layout.addWidget(self.top_empresas_btn)
+        
+        # Cuántos clientes y de qué periodo
+        window_names = {"all": "Todo el historial", "year": "Este año", "month": "Este mes"}
+        self.top_window_combo = QComboBox()
+        for window in SPENDING_WINDOWS:
+            self.top_window_combo.addItem(window_names[window], window)
+        self.top_window_combo.setCurrentIndex(SPENDING_WINDOWS.index(self.top_window))
+        self.top_window_combo.currentIndexChanged.connect(
+            lambda: self.change_top_options(window=self.top_window_combo.currentData()))
+        
+        self.top_size_combo = QComboBox()
+        for size in TOP_SIZES:
+            self.top_size_combo.addItem(f"Top {size}", size)
+        if self.top_size in TOP_SIZES:
+            self.top_size_combo.setCurrentIndex(TOP_SIZES.index(self.top_size))
+        self.top_size_combo.currentIndexChanged.connect(
+            lambda: self.change_top_options(size=self.top_size_combo.currentData()))
+        
+        nav_layout.addWidget(self.top_window_combo)
+        nav_layout.addWidget(self.top_size_combo)
         nav_layout.addStretch()
         
         # Estadísticas
@@ -2852,6 +2760,7 @@ class CobranzaApp(QWidget):
         stats_label.setFont(QFont("Segoe UI", 10))
         stats_label.setStyleSheet(f"color: {colors['TEXT_SECONDARY']};")
         nav_layout.addWidget(stats_label)
+        self.top_stats_label = stats_label
         
         nav_frame.setLayout(nav_layout)
         self.main_layout.addWidget(nav_frame)
@@ -2865,58 +2774,49 @@ class CobranzaApp(QWidget):
             self.top_clientes_btn.setChecked(view == "clientes")
             self.top_empresas_btn.setChecked(view == "empresas")
             
-            # Actualizar estadísticas
-            stats_widgets = self.findChildren(QLabel)
-            for widget in stats_widgets:
-                if "Total gastado" in widget.text():
-                    widget.setText(self.get_top_stats_text())
-                    break
-            
-            # Recrear contenido
+            # Actualizar estadísticas y recrear contenido
+            self.top_stats_label.setText(self.get_top_stats_text())
             self.recreate_only_top_content()
 
+    def change_top_options(self, size=None, window=None):
+        """Cambiar cuántos clientes muestra el top o de qué periodo"""
+        if size is not None:
+            self.top_size = size
+        if window is not None:
+            self.top_window = window
+        self.top_stats_label.setText(self.get_top_stats_text())
+        self.recreate_only_top_content()
+
+    def top_client_filter(self, client_type):
+        """Predicado del top: cliente con datos y del tipo pedido (cliente/empresa)"""
+        clients = self.credit_snapshot.clients if self.credit_snapshot else {}
+        want_company = client_type == "empresas"
+        
+        def accept(client_id):
+            if client_id not in clients:
+                return False
+            return bool(self.client_states.get(client_id, {}).get('company', False)) == want_company
+        
+        return accept
+
     def get_top_stats_text(self):
         """Obtener texto de estadísticas para vista actual"""
-        filtered_data = self.filter_top_clients_by_type(self.current_top_view)
-        
-        if filtered_data:
-            total_spending = sum(data['total_spent'] for data in filtered_data.values())
-            count = len(filtered_data)
-            type_name = "Clientes" if self.current_top_view == "clientes" else "Empresas"
-            return f"{count} {type_name} • Total gastado: ${total_spending:,.0f}"
-        else:
-            type_name = "Clientes" if self.current_top_view == "clientes" else "Empresas"
+        type_name = "Clientes" if self.current_top_view == "clientes" else "Empresas"
+        if not self.spending_index:
             return f"0 {type_name} • Total gastado: $0"
-
-    def filter_top_clients_by_type(self, client_type):
-        """Filtrar clientes por tipo para top"""
-        filtered = {}
-        
-        for client_id, spending_data in self.all_clients_spending.items():
-            # Verificar tipo (cliente/empresa)
-            client_state = self.client_states.get(client_id, {})
-            is_company = client_state.get('company', False)
-            
-            if client_type == "clientes" and is_company:
-                continue
-            elif client_type == "empresas" and not is_company:
-                continue
-            
-            filtered[client_id] = spending_data
         
-        return filtered
+        count, total_spending = self.spending_index.summary(
+            self.top_window, where=self.top_client_filter(self.current_top_view))
+        return f"{count} {type_name} • Total gastado: ${total_spending:,.0f}"
 
     def create_top_content(self):
         """Crear contenido de top clientes"""
-        # Filtrar datos por tipo actual
-        filtered_data = self.filter_top_clients_by_type(self.current_top_view)
-        
-        # Ordenar por gasto total (top 10)
-        sorted_clients = sorted(
-            filtered_data.items(),
-            key=lambda x: x[1]['total_spent'],
-            reverse=True
-        )[:10]  # Solo top 10
+        # Los N que más gastaron en el periodo, del tipo actual (heap acotado, sin ordenar a todos)
+        clients = self.credit_snapshot.clients if self.credit_snapshot else {}
+        top = self.spending_index.top(self.top_size, self.top_window,
+                                      where=self.top_client_filter(self.current_top_view))
+        sorted_clients = [(client_id, {'client_data': clients[client_id], 'total_spent': total_spent})
+                          for client_id, total_spent in top]
         
         # Crear tabla
         self.create_top_table(sorted_clients)
@@ -2957,7 +2857,8 @@ class CobranzaApp(QWidget):
         icon_label.setFont(QFont("Segoe UI", 24))
         
         type_name = "CLIENTES" if self.current_top_view == "clientes" else "EMPRESAS"
-        title_label = QLabel(f"TOP 10 {type_name} QUE MÁS HAN GASTADO")
+        period = {"all": "", "year": " ESTE AÑO", "month": " ESTE MES"}[self.top_window]
+        title_label = QLabel(f"TOP {self.top_size} {type_name} QUE MÁS HAN GASTADO{period}")
         title_label.setFont(QFont("Segoe UI", 16, QFont.Weight.Bold))
         title_label.setStyleSheet(f"color: {colors['BRIGHT_CYAN']};")
         
@@ -2967,10 +2868,10 @@ class CobranzaApp(QWidget):
         header_layout.addLayout(title_section)
         header_layout.addStretch()
         
-        # Total general del top 10
+        # Total general del top
         if sorted_clients:
             total_top = sum(client[1]['total_spent'] for client in sorted_clients)
-            total_label = QLabel(f"Total Top 10: ${total_top:,.0f}")
+            total_label = QLabel(f"Total Top {self.top_size}: ${total_top:,.0f}")
             total_label.setFont(QFont("Segoe UI", 14, QFont.Weight.Bold))
             total_label.setStyleSheet(f"color: {colors['SUCCESS_GREEN']};")
             header_layout.addWidget(total_label)
@@ -2978,12 +2879,11 @@ class CobranzaApp(QWidget):
         table_layout.addLayout(header_layout)
         
         # Tabla
-        table = QTableWidget()
-        table.setColumnCount(5)
-        table.setHorizontalHeaderLabels(['Posición', 'Cliente', 'Total Gastado', 'Última Compra', 'Promedio por Compra'])
-        
-        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        table, proxy = self.create_client_table_view(
+            self.top_columns(), self.build_top_rows(sorted_clients), self.on_top_client_double_click,
+            name_of=lambda record: record['client_data'].get('nombre', ''),
+            sort_column=0, sort_order=Qt.SortOrder.AscendingOrder)
+        self.top_table_model = proxy.sourceModel()
         
         # Configurar columnas
         header = table.horizontalHeader()
@@ -3000,19 +2900,19 @@ class CobranzaApp(QWidget):
         
         # Estilo de tabla premium
         table.setStyleSheet(f"""
-            QTableWidget {{
+            QTableView {{
                 background: {theme['card_bg_alpha']};
                 border: 1px solid rgba({self.hex_to_rgb(colors['BRIGHT_CYAN'])}, 0.3);
                 font-size: 12px;
                 border-radius: 8px;
             }}
-            QTableWidget::item {{
+            QTableView::item {{
                 padding: 10px 8px;
             }}
-            QTableWidget::item:selected {{
+            QTableView::item:selected {{
                 background: rgba({self.hex_to_rgb(colors['BRIGHT_CYAN'])}, 0.3);
             }}
-            QTableWidget QHeaderView::section {{
+            QTableView QHeaderView::section {{
                 border-bottom: 2px solid {colors['BRIGHT_CYAN']};
                 padding: 10px 8px;
                 font-size: 11px;
@@ -3020,150 +2920,91 @@ class CobranzaApp(QWidget):
             }}
         """)
         
-        # Poblar tabla
-        self.populate_top_table(table, sorted_clients)
-        
         table_layout.addWidget(table)
         table_card.setLayout(table_layout)
         self.main_layout.addWidget(table_card)
 
-    def populate_top_table(self, table, sorted_clients):
-        """Poblar tabla de top clientes"""
-        from datetime import datetime
-        from PyQt6.QtCore import Qt
-        from PyQt6.QtGui import QFont, QColor
-        from PyQt6.QtWidgets import QTableWidgetItem
-        
-        table.setRowCount(len(sorted_clients))
-        
+    def build_top_rows(self, sorted_clients):
+        """Filas del top con posición, última compra y número de compras"""
+        rows = []
+        for position, (client_id, spending_data) in enumerate(sorted_clients, 1):
+            rows.append((client_id, {
+                'client_data': spending_data['client_data'],
+                'total_spent': spending_data['total_spent'],
+                'position': position,
+                'last_purchase': self.get_last_purchase_date(client_id),
+                'purchase_count': self.count_client_purchases(client_id)
+            }))
+        return rows
+
+    def top_columns(self):
+        """Columnas de la tabla de top clientes"""
         # Colores para posiciones
         position_colors = {
-            1: '#FFD700',  # Oro
-            2: '#C0C0C0',  # Plata
-            3: '#CD7F32',  # Bronce
+            1: QColor('#FFD700'),  # Oro
+            2: QColor('#C0C0C0'),  # Plata
+            3: QColor('#CD7F32'),  # Bronce
         }
-        
-        for row, (client_id, spending_data) in enumerate(sorted_clients):
-            try:
-                position = row + 1
-                client_data = spending_data['client_data']
-                total_spent = spending_data['total_spent']
-                
-                # Posición con medalla
-                position_text = f"#{position}"
-                if position <= 3:
-                    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
-                    position_text = f"{medals[position]} {position}"
-                
-                position_item = QTableWidgetItem(position_text)
-                position_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                position_item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-                if position in position_colors:
-                    position_item.setForeground(QColor(position_colors[position]))
-                table.setItem(row, 0, position_item)
-                
-                # Nombre del cliente
-                nombre = client_data.get('nombre', 'Sin nombre')
-                name_item = QTableWidgetItem(nombre)
-                name_item.setTextAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
-                name_item.setData(Qt.ItemDataRole.UserRole, client_id)
-                name_item.setFont(QFont("Segoe UI", 10, QFont.Weight.Medium))
-                name_item.setToolTip(f"ID: {client_id}\nNombre completo: {nombre}")
-                table.setItem(row, 1, name_item)
-                
-                # Total gastado
-                spent_item = QTableWidgetItem(f"${total_spent:,.0f}")
-                spent_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                spent_item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-                spent_item.setForeground(QColor('#22C55E'))
-                table.setItem(row, 2, spent_item)
-                
-                # Última compra (buscar la fecha más reciente)
-                last_purchase = self.get_last_purchase_date(client_id)
-                if last_purchase:
-                    last_purchase_str = last_purchase.strftime("%d/%m/%Y")
-                else:
-                    last_purchase_str = "N/A"
-                
-                last_item = QTableWidgetItem(last_purchase_str)
-                last_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                last_item.setFont(QFont("Segoe UI", 9))
-                table.setItem(row, 3, last_item)
-                
-                # Promedio por compra
-                purchase_count = self.count_client_purchases(client_id)
-                if purchase_count > 0:
-                    avg_per_purchase = total_spent / purchase_count
-                    avg_text = f"${avg_per_purchase:,.0f}"
-                    tooltip = f"{purchase_count} compras total"
-                else:
-                    avg_text = "N/A"
-                    tooltip = "Sin compras registradas"
-                
-                avg_item = QTableWidgetItem(avg_text)
-                avg_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                avg_item.setFont(QFont("Segoe UI", 10, QFont.Weight.Medium))
-                avg_item.setForeground(QColor('#6366F1'))
-                avg_item.setToolTip(tooltip)
-                table.setItem(row, 4, avg_item)
-                
-            except Exception as e:
-                logging.error(f"Error poblando fila {row}: {e}")
-                continue
-        
-        # Conectar doble clic
-        table.cellDoubleClicked.connect(lambda row, col: self.on_top_client_double_click(table, row))
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        name_of = lambda cid, r: r['client_data'].get('nombre', 'Sin nombre')
+        
+        def average(cid, r):
+            if r['purchase_count'] > 0:
+                return r['total_spent'] / r['purchase_count']
+            return None
+        
+        return [
+            TableColumn('Posición', lambda cid, r: r['position'],
+                        lambda v, r: f"{medals[v]} {v}" if v in medals else f"#{v}",
+                        font_size=11, weight=QFont.Weight.Bold,
+                        color=lambda r: position_colors.get(r['position'])),
+            TableColumn('Cliente', name_of, align=ALIGN_LEFT, font_size=10, weight=QFont.Weight.Medium,
+                        tooltip=lambda cid, r: f"ID: {cid}\nNombre completo: {name_of(cid, r)}"),
+            TableColumn('Total Gastado', lambda cid, r: r['total_spent'], lambda v, r: f"${v:,.0f}",
+                        font_size=11, weight=QFont.Weight.Bold, color='#22C55E'),
+            TableColumn('Última Compra', lambda cid, r: r['last_purchase'],
+                        lambda v, r: v.strftime("%d/%m/%Y") if v else "N/A"),
+            TableColumn('Promedio por Compra', average,
+                        lambda v, r: f"${v:,.0f}" if v is not None else "N/A",
+                        font_size=10, weight=QFont.Weight.Medium, color='#6366F1',
+                        tooltip=lambda cid, r: (f"{r['purchase_count']} compras total"
+                                                if r['purchase_count'] > 0 else "Sin compras registradas"))
+        ]
 
     def get_last_purchase_date(self, client_id):
         """Obtener la fecha de la última compra del cliente"""
-        last_date = None
-        
-        for venta_id, venta_data in self.all_ventas_data.items():
-            if venta_data.get('cveCte') == client_id:
-                fecha_str = venta_data.get('fecha')
-                if fecha_str:
-                    try:
-                        fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-                        if last_date is None or fecha > last_date:
-                            last_date = fecha
-                    except:
-                        continue
-        
-        return last_date
+        if self.credit_snapshot is None:
+            return None
+        return self.credit_snapshot.ventas_index.last_purchase(client_id)
 
     def count_client_purchases(self, client_id):
         """Contar el número de compras del cliente"""
-        count = 0
-        for venta_id, venta_data in self.all_ventas_data.items():
-            if venta_data.get('cveCte') == client_id:
-                count += 1
-        return count
+        if self.credit_snapshot is None:
+            return 0
+        return self.credit_snapshot.ventas_index.purchase_count(client_id)
 
-    def on_top_client_double_click(self, table, row):
+    def on_top_client_double_click(self, client_id):
         """Maneja el doble clic en un cliente del top"""
         try:
-            name_item = table.item(row, 1)
-            if name_item:
-                client_id = name_item.data(Qt.ItemDataRole.UserRole)
-                if client_id:
-                    # Usar los datos apropiados según disponibilidad
-                    if client_id in self.clientes_data:
-                        client_data = self.clientes_data[client_id]
-                    elif client_id in self.all_clients_data:
-                        client_data = self.all_clients_data[client_id]
-                    else:
-                        QMessageBox.warning(self, "⚠️ Error", "No se pudo obtener la información del cliente")
-                        return
-                    
-                    self.detail_window = ClienteDetalleWindow(self, client_data, client_id)
-                    self.detail_window.show()
+            if client_id:
+                # Usar los datos apropiados según disponibilidad
+                if client_id in self.clientes_data:
+                    client_data = self.clientes_data[client_id]
+                elif client_id in self.all_clients_data:
+                    client_data = self.all_clients_data[client_id]
+                else:
+                    QMessageBox.warning(self, "⚠️ Error", "No se pudo obtener la información del cliente")
+                    return
+                
+                self.detail_window = ClienteDetalleWindow(self, client_data, client_id)
+                self.detail_window.show()
         except Exception as e:
             logging.error(f"Error al abrir detalles del top cliente: {e}")
             QMessageBox.critical(self, "❌ Error", f"Error al abrir detalles del cliente: {str(e)}")
 
     def retry_top_data_load(self):
         """Reintentar carga de datos de top clientes"""
-        self.top_clients_data_loaded = False
+        self.invalidate_credit_snapshot()
         self.top_clients_data_loading = False
         self.create_top_clientes_view()
     
@@ -3183,57 +3024,81 @@ class CobranzaApp(QWidget):
 
     def categorize_client(self, client_id):
         """Categorizar un cliente basado en su historial y estado"""
-        try:
-            # Verificar promesa de pago vigente
-            client_state = self.client_states.get(client_id, {})
-            promise_date = client_state.get('promiseDate')
-            
-            if promise_date:
-                if isinstance(promise_date, str):
-                    try:
-                        promise_date = datetime.strptime(promise_date, "%Y-%m-%d").date()
-                    except:
-                        promise_date = None
-                elif isinstance(promise_date, datetime):
-                    promise_date = promise_date.date()
-                
-                if promise_date and promise_date >= datetime.now().date():
-                    return "promesa"
-            
-            # Calcular días desde la venta más antigua
-            oldest_sale_date = self.get_oldest_sale_date(client_id)
-            if not oldest_sale_date:
-                return "rojo"
-            
-            days_diff = (datetime.now().date() - oldest_sale_date).days
-            
-            if days_diff < 30:
-                return "verde"
-            elif days_diff < 60:
-                return "amarillo"
-            else:
-                return "rojo"
-                
-        except Exception as e:
-            logging.error(f"Error al categorizar cliente {client_id}: {e}")
-            return "rojo"
+        # La cubeta se calcula una vez por carga en el índice de antigüedad
+        return self.aging_index.bucket_of(client_id) or "rojo"
+
+    def apply_client_state_change(self, client_id, changes):
+        """
+        Aplicar en memoria un cambio ya guardado en ClientsStates
+        (empresa o promesa) y mover al cliente de cubeta sin recargar.
+        """
+        state = self.client_states.setdefault(client_id, {
+            "day1": False, "day2": False, "day3": False, "dueday": False,
+            "promisePage": False, "company": False, "promiseDate": None
+        })
+        state.update(changes)
+        
+        aging_changes = {}
+        if 'company' in changes:
+            aging_changes['is_company'] = bool(changes['company'])
+        if 'promiseDate' in changes:
+            aging_changes['promise_date'] = parse_iso_date(changes['promiseDate'])
+        
+        move = self.aging_index.update_client(client_id, **aging_changes) if aging_changes else None
+        if 'company' in changes:
+            if (self.credit_level_index.update_client(client_id, bool(changes['company']))
+                    and self.current_view == "creditos" and self.credit_level_tables):
+                self.recreate_only_credit_content()
+            # Pasa de la vista de clientes a la de empresas (o al revés)
+            self.refresh_category_tables()
+            self.update_debt_info()
+        elif move is not None:
+            self.on_aging_clients_moved([move])
+
+    def set_buro_membership(self, client_id, credit):
+        """Agregar o quitar al cliente del conjunto de clientes en buró"""
+        if not credit:
+            self.clients_buro.pop(client_id, None)
+        elif client_id not in self.clients_buro:
+            client_data = self.clientes_data.get(client_id, {})
+            self.clients_buro[client_id] = {
+                'nombre': client_data.get('nombre', ''),
+                'saldo': client_data.get('saldo', 0.0)
+            }
+
+    def apply_client_buro_change(self, client_id, credit):
+        """Aplicar en memoria el alta/baja de un cliente en buró"""
+        self.set_buro_membership(client_id, credit)
+        # Entrar o salir de buró cambia quién está en las cubetas
+        self.rebuild_aging_index()
+        self.refresh_category_tables()
+        self.update_debt_info()
+
+    def apply_pending_writes(self):
+        """Superponer a los datos leídos los cambios que siguen en la cola local"""
+        for client_id, fields in self.write_queue.pending_states().items():
+            self.client_states.setdefault(client_id, {
+                "day1": False, "day2": False, "day3": False, "dueday": False,
+                "promisePage": False, "company": False, "promiseDate": None
+            }).update(fields)
+        for client_id, credit in self.write_queue.pending_buro().items():
+            self.set_buro_membership(client_id, credit)
+
+    def rebuild_aging_index(self):
+        """Reconstruir las cubetas de antigüedad con los datos actuales"""
+        self.apply_pending_writes()
+        self.aging_index = AgingIndex(self.clientes_data, self.client_states,
+                                      self.clients_buro, self.ventas_index)
+        self.aging_scheduler.set_index(self.aging_index)
+
+    def rebuild_credit_level_index(self):
+        """Reagrupar los puntajes por (nivel, empresa) con los puntajes y estados actuales"""
+        self.credit_level_index = CreditLevelIndex(self.clients_credit_scores, self.client_states)
+        self.credit_search_index = None  # Se vuelve a armar en la próxima búsqueda
 
     def get_oldest_sale_date(self, client_id):
         """Obtener la fecha de venta más antigua para un cliente"""
-        oldest_date = None
-        
-        for venta_id, venta_data in self.ventas_data.items():
-            if venta_data.get('cveCte') == client_id:
-                fecha_str = venta_data.get('fecha')
-                if fecha_str:
-                    try:
-                        fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date()
-                        if oldest_date is None or fecha < oldest_date:
-                            oldest_date = fecha
-                    except:
-                        continue
-        
-        return oldest_date
+        return self.ventas_index.oldest_pending(client_id)
 
     def calculate_totals(self):
         """Calcular totales de deuda"""
@@ -3253,28 +3118,9 @@ class CobranzaApp(QWidget):
                     except (ValueError, TypeError):
                         continue
             
-            # Totales de clientes y empresas
-            for client_id, client_data in self.clientes_data.items():
-                if client_id in self.clients_buro:
-                    continue
-                
-                saldo = client_data.get('saldo', 0.0)
-                
-                if isinstance(saldo, str):
-                    try:
-                        saldo = float(saldo)
-                    except (ValueError, TypeError):
-                        continue
-                elif not isinstance(saldo, (int, float)):
-                    continue
-                
-                client_state = self.client_states.get(client_id, {})
-                is_company = client_state.get('company', False)
-                
-                if is_company:
-                    total_empresas += saldo
-                else:
-                    total_clientes += saldo
+            # Totales de clientes y empresas (el índice ya excluye buró)
+            total_clientes = self.aging_index.total(False)
+            total_empresas = self.aging_index.total(True)
             
         except Exception as e:
             logging.error(f"Error al calcular totales: {e}")
@@ -3284,20 +3130,8 @@ class CobranzaApp(QWidget):
 
     def calculate_category_total(self, category):
         """Calcular total para una categoría específica"""
-        total = 0.0
-        
-        for client_id, client_data in self.clientes_data.items():
-            if client_id in self.clients_buro:
-                continue
-            
-            if not self.should_show_client(client_id):
-                continue
-            
-            client_category = self.categorize_client(client_id)
-            if self.get_category_from_title(category) == client_category:
-                total += client_data.get('saldo', 0.0)
-        
-        return total
+        is_company = self.current_view == "empresas"
+        return self.aging_index.total(is_company, self.get_category_from_title(category))
 
     def get_category_from_title(self, title):
         """Convertir título de categoría a identificador"""
@@ -3311,101 +3145,307 @@ class CobranzaApp(QWidget):
             return "rojo"
         return "verde"
 
-    def load_data(self):
-        """Cargar SOLO datos principales desde la base de datos"""
-        try:
-            logging.info("Cargando datos principales desde la base de datos...")
-            colors = self.get_current_colors()
-            
-            # Mostrar estado de carga
+    def load_data(self, notify=False):
+        """Cargar SOLO datos principales desde la base de datos (en segundo plano)"""
+        self.notify_on_load = self.notify_on_load or notify
+        
+        # Mostrar estado de carga (sólo si no hay datos que mostrar mientras tanto)
+        if not self.data_loaded:
             self.amount_label.setText("⏳ Cargando...")
             self.clientes_label.setText("--")
             self.empresas_label.setText("--")
             self.buro_label.setText("--")
-            
-            # Cargar SOLO datos principales (más rápido)
-            self.clientes_data = get_clients_data()
-            self.ventas_data = get_ventas_data()
-            self.client_states = get_client_states()
-            self.clients_buro = get_clients_without_credit()
-            
-            logging.info(f"Datos principales cargados: {len(self.clientes_data)} clientes con deuda, "
-                        f"{len(self.ventas_data)} ventas pendientes")
-            
+        
+        # Si ya hay una carga en curso, su resultado sirve para esta petición
+        # El índice actual sólo sirve de base para el delta si salió del mapa de este loader
+        base_index = self.ventas_index if self.ventas_index_sync is self.ventas_sync else None
+        self.workers.submit('main_data', self._fetch_main_data, self.ventas_sync, base_index,
+                            on_result=self._apply_main_data,
+                            on_error=self._on_main_data_error,
+                            on_progress=self._on_main_data_progress,
+                            replace=False, result_type=dict)
+
+    def _fetch_main_data(self, task, ventas_sync, base_index):
+        """Consultar los datos principales (corre en el pool, no toca widgets)"""
+        logging.info("Cargando datos principales desde la base de datos...")
+        
+        task.report_progress(0, "Conectando...")
+        if not check_db_connection():
+            return {'online': False}
+        
+        task.report_progress(10, "Clientes...")
+        clientes_data = get_clients_data()
+        task.check_cancelled()
+        
+        # Sólo ventas nuevas o modificadas (recarga completa periódica)
+        task.report_progress(35, "Ventas...")
+        delta = ventas_sync.refresh()
+        if delta is None:
+            ventas_data = ventas_index = None
+        elif delta['full'] or base_index is None:
+            # Sin índice armado desde este loader (p. ej. tras perder la conexión) se reconstruye
+            ventas_data = ventas_sync.ventas
+            ventas_index = VentasIndex(ventas_data)
+        elif delta['changed'] or delta['removed']:
+            # Sólo se recalculan los clientes de las ventas que cambiaron; el
+            # mapa del loader es inmutable (LayeredMap) y se publica sin copiarlo
+            ventas_data = ventas_sync.ventas
+            ventas_index = base_index.updated(ventas_data, delta['changed'], delta['removed'])
+        else:
+            ventas_data, ventas_index = base_index.ventas_data, base_index
+        task.check_cancelled()
+        
+        task.report_progress(70, "Estados...")
+        client_states = get_client_states()
+        
+        task.report_progress(85, "Buró...")
+        clients_buro = get_clients_without_credit()
+        task.check_cancelled()
+        
+        result = {
+            'online': True,
+            'clientes_data': clientes_data,
+            'ventas_data': ventas_data,
+            'ventas_index': ventas_index,
+            'ventas_sync': ventas_sync,
+            'client_states': client_states,
+            'clients_buro': clients_buro,
+            'saved_at': None
+        }
+        
+        if ventas_data is not None:
+            task.report_progress(95, "Guardando copia local...")
+            if self.snapshot_cache.save({
+                'clientes_data': clientes_data,
+                'ventas_data': ventas_data,
+                'client_states': client_states,
+                'clients_buro': clients_buro
+            }):
+                result['saved_at'] = time.time()
+        
+        return result
+
+    def _apply_main_data(self, result):
+        """Publicar en la interfaz los datos principales recién consultados"""
+        if not result['online']:
+            self.handle_server_unavailable()
+            self._notify_load_finished(False)
+            return
+        
+        self.clientes_data = result['clientes_data']
+        if result['ventas_data'] is not None:
+            self.ventas_data = result['ventas_data']
+            self.ventas_index = result['ventas_index']
+            self.ventas_index_sync = result['ventas_sync']
+        self.client_states = result['client_states']
+        self.clients_buro = result['clients_buro']
+        self.rebuild_aging_index()
+        self.rebuild_credit_level_index()
+        if result['saved_at'] is not None:
+            self.snapshot_saved_at = result['saved_at']
+        
+        logging.info(f"Datos principales cargados: {len(self.clientes_data)} clientes con deuda, "
+                    f"{len(self.ventas_data)} ventas pendientes")
+        
+        self.data_loaded = True
+        self.set_offline_mode(False)
+        self.update_debt_info()
+        self.last_update_time = time.time()
+        self.refresh_current_view()
+        self._notify_load_finished(True)
+
+    def _on_main_data_error(self, message):
+        logging.error(f"Error al cargar datos principales: {message}")
+        self.ventas_sync = VentasDeltaLoader(pending_only=True)
+        self.handle_server_unavailable()
+        self._notify_load_finished(False, message)
+
+    def _on_main_data_progress(self, percent, message):
+        if not self.data_loaded:
+            self.amount_label.setText(f"⏳ {percent}%")
+        self.update_data_status(f"🔄 Sincronizando: {message}" if self.snapshot_saved_at else "")
+
+    def _notify_load_finished(self, ok, message=""):
+        """Mostrar el resultado de una recarga pedida por el usuario"""
+        if not self.notify_on_load:
+            return
+        self.notify_on_load = False
+        if ok:
+            QMessageBox.information(self, "✅ Éxito", "Datos recargados correctamente")
+        else:
+            QMessageBox.critical(self, "❌ Error", f"Error al recargar datos: {message or 'servidor no disponible'}")
+
+    def handle_server_unavailable(self):
+        """Seguir con la copia local en modo sólo lectura, o mostrar error si no hay"""
+        if self.snapshot_saved_at is not None:
+            logging.warning("Servidor no disponible, se siguen mostrando los datos locales")
+            self.set_offline_mode(True)
+            return
+        
+        self.clientes_data = {}
+        self.ventas_data = {}
+        self.ventas_index = VentasIndex({})
+        # El loader conserva el mapa anterior: al volver el servidor se recarga completo
+        self.ventas_sync = VentasDeltaLoader(pending_only=True)
+        self.ventas_index_sync = None
+        self.client_states = {}
+        self.clients_buro = {}
+        self.rebuild_aging_index()
+        self.rebuild_credit_level_index()
+        self.data_loaded = False
+        
+        self.amount_label.setText("❌ Error")
+        self.clientes_label.setText("Error")
+        self.empresas_label.setText("Error")
+        self.buro_label.setText("Error")
+
+    def load_cached_snapshot(self):
+        """Mostrar de inmediato el último snapshot guardado localmente"""
+        datasets, saved_at = self.snapshot_cache.load()
+        if not datasets:
+            return False
+        
+        try:
+            # El snapshot guarda dicts; se vuelven a convertir en registros compactos
+            self.clientes_data = clients_from_dicts(datasets.get('clientes_data', {}))
+            self.ventas_data = ventas_from_dicts(datasets.get('ventas_data', {}), 'dashboard')
+            self.client_states = datasets.get('client_states', {})
+            self.clients_buro = datasets.get('clients_buro', {})
+            self.ventas_index = VentasIndex(self.ventas_data)
+            self.rebuild_aging_index()
+            self.rebuild_credit_level_index()
+            # La reconciliación con el servidor parte de esta copia (delta); el
+            # loader no modifica el mapa, sólo publica versiones nuevas (LayeredMap)
+            self.ventas_sync = VentasDeltaLoader(pending_only=True, ventas=self.ventas_data)
+            self.ventas_index_sync = self.ventas_sync
+            
+            self.snapshot_saved_at = saved_at
             self.data_loaded = True
+            self.update_data_status(f"🕘 Datos locales ({describe_age(saved_at)}), sincronizando...")
             self.update_debt_info()
-            self.last_update_time = time.time()
             self.refresh_current_view()
-                            
-        except Exception as e:
-            logging.error(f"Error al cargar datos principales: {e}")
-            self.clientes_data = {}
-            self.ventas_data = {}
-            self.client_states = {}
-            self.clients_buro = {}
-            self.data_loaded = False
+            return True
             
-            self.amount_label.setText("❌ Error")
-            self.clientes_label.setText("Error")
-            self.empresas_label.setText("Error")
-            self.buro_label.setText("Error")
+        except Exception as e:
+            logging.error(f"Error al mostrar snapshot local: {e}")
+            return False
+
+    def set_offline_mode(self, offline):
+        """Activar/desactivar el modo sin conexión (sólo lectura)"""
+        self.offline_mode = offline
+        if offline:
+            self.update_data_status(f"📴 Sin conexión · sólo lectura · datos {describe_age(self.snapshot_saved_at)}")
+        else:
+            self.update_data_status("")
+
+    def update_data_status(self, text):
+        """Mostrar u ocultar el aviso de origen de los datos"""
+        self.data_status_label.setText(text)
+        self.data_status_label.setVisible(bool(text))
 
     def load_credit_data(self):
-        """Cargar datos del sistema de créditos SOLO cuando se necesite"""
+        """Cargar datos del sistema de créditos SOLO cuando se necesite (en segundo plano)"""
         if self.credit_data_loaded or self.credit_data_loading:
-            return True  # Ya están cargados o se están cargando
+            return  # Ya están cargados o se están cargando
+        
+        self.credit_data_loading = True
+        logging.info("Cargando datos del sistema de créditos bajo demanda...")
+        self.workers.submit('credit_snapshot', self._build_credit_snapshot,
+                            on_result=self._on_credit_snapshot_loaded,
+                            on_error=self._on_credit_load_error,
+                            on_progress=self.update_view_loading_progress,
+                            result_type=CreditSnapshot)
+    
+    @staticmethod
+    def _build_credit_snapshot(task):
+        task.report_progress(10, "Consultando clientes y ventas...")
+        snapshot = CreditSnapshot.load()
+        task.report_progress(100, "Listo")
+        return snapshot
+    
+    def _on_credit_snapshot_loaded(self, snapshot):
+        self.credit_data_loading = False
+        self.set_credit_snapshot(snapshot)
         
+        logging.info(f"Datos de créditos cargados: {len(self.all_clients_data)} clientes totales, "
+                    f"{len(self.clients_credit_scores)} puntajes crediticios calculados")
+        
+        if self.current_view == "creditos":
+            self.create_creditos_view()
+    
+    def _on_credit_load_error(self, message):
+        logging.error(f"Error al cargar datos de créditos: {message}")
+        self.credit_data_loading = False
+        QMessageBox.critical(self, "❌ Error", 
+                        f"Error al cargar datos del sistema de créditos:\n{message}")
+        if self.current_view == "creditos":
+            self.switch_view("clientes")
+    
+    def update_view_loading_progress(self, percent, message):
+        """Mostrar el avance en el indicador de carga de la vista actual"""
         try:
-            self.credit_data_loading = True
-            logging.info("Cargando datos del sistema de créditos bajo demanda...")
-            
-            # Mostrar indicador de carga específico para créditos
-            self.show_credit_loading_indicator()
-            
-            # Procesar eventos para mostrar el indicador
-            QApplication.processEvents()
-            
-            # CARGAR DATOS PARA SISTEMA DE CRÉDITOS
-            self.all_clients_data = get_all_clients_data()
-            self.all_ventas_data = get_all_ventas_data()
-            self.clients_credit_scores = get_all_clients_credit_scores()
-            self.credit_statistics = get_credit_statistics()
-            
-            logging.info(f"Datos de créditos cargados: {len(self.all_clients_data)} clientes totales, "
-                        f"{len(self.all_ventas_data)} ventas totales, "
-                        f"{len(self.clients_credit_scores)} puntajes crediticios calculados")
-            
-            self.credit_data_loaded = True
-            self.credit_data_loading = False
-            return True
-            
-        except Exception as e:
-            logging.error(f"Error al cargar datos de créditos: {e}")
-            self.credit_data_loading = False
-            QMessageBox.critical(self, "❌ Error", 
-                            f"Error al cargar datos del sistema de créditos:\n{str(e)}")
+            if self.view_loading_label is not None:
+                self.view_loading_label.setText(f"{message} ({percent}%)")
+        except RuntimeError:
+            # El indicador ya fue destruido (se cambió de vista)
+            self.view_loading_label = None
+    
+    def set_credit_snapshot(self, snapshot):
+        """Publicar un snapshot crediticio para todas las vistas"""
+        self.credit_snapshot = snapshot
+        self.all_clients_data = snapshot.clients
+        self.clients_credit_scores = snapshot.scores
+        self.rebuild_credit_level_index()
+        self.credit_statistics = snapshot.statistics
+        self.credit_data_loaded = True
+    
+    def refresh_credit_snapshot(self):
+        """Actualizar el snapshot crediticio sólo con las ventas que cambiaron (en segundo plano)"""
+        if self.credit_snapshot is None:
             return False
+        
+        self.workers.submit('credit_snapshot', self._refresh_credit_snapshot_task, self.credit_snapshot,
+                            on_result=self._on_credit_snapshot_refreshed,
+                            on_error=lambda message: self._on_credit_snapshot_refreshed(None),
+                            replace=False, result_type=object)
+        return True
+    
+    @staticmethod
+    def _refresh_credit_snapshot_task(task, snapshot):
+        return snapshot.refresh()
+    
+    def _on_credit_snapshot_refreshed(self, snapshot):
+        if snapshot is None:
+            # No se pudo aplicar el delta: se recargará completo cuando se necesite
+            logging.warning("No se pudo actualizar el snapshot crediticio, se recargará completo")
+            self.invalidate_credit_snapshot()
+        else:
+            self.set_credit_snapshot(snapshot)
+            self.top_clients_data_loaded = False  # recalcular gastos con las ventas nuevas
+        
+        if self.current_view == "creditos":
+            self.create_creditos_view()
+        elif self.current_view == "top":
+            self.create_top_clientes_view()
+    
+    def invalidate_credit_snapshot(self):
+        """Descartar el snapshot para forzar una nueva consulta"""
+        self.credit_snapshot = None
+        self.credit_data_loaded = False
+        self.top_clients_data_loaded = False
     
     def reload_data(self):
         """Recargar datos - con opción para créditos y top clientes"""
         try:
             logging.info("Recargando datos...")
             
-            # Siempre recargar datos principales
-            self.load_data()
-            
-            # Si estamos en vista de créditos, recargar también esos datos
-            if self.current_view == "creditos" and self.credit_data_loaded:
-                self.credit_data_loaded = False
-                self.create_creditos_view()
-            # Si estamos en vista de top clientes, recargar también esos datos
-            elif self.current_view == "top" and self.top_clients_data_loaded:
-                self.top_clients_data_loaded = False
-                self.create_top_clientes_view()
-            else:
-                self.refresh_current_view()
+            # Siempre recargar datos principales (avisa al terminar)
+            self.load_data(notify=True)
             
-            QMessageBox.information(self, "✅ Éxito", "Datos recargados correctamente")
+            # En créditos o top clientes, actualizar también el snapshot
+            # (sólo se aplican las ventas que cambiaron; si falla se recarga todo)
+            if self.current_view in ("creditos", "top") and self.credit_snapshot is not None:
+                self.refresh_credit_snapshot()
             
         except Exception as e:
             logging.error(f"Error al recargar datos: {e}")
@@ -3416,9 +3456,11 @@ class CobranzaApp(QWidget):
         if self.current_view != "creditos" and self.credit_data_loaded:
             logging.info("Liberando memoria de datos crediticios (no se están usando)")
             self.all_clients_data = {}
-            self.all_ventas_data = {}
             self.clients_credit_scores = {}
+            self.credit_level_index = CreditLevelIndex({}, {})
+            self.credit_search_index = None
             self.credit_statistics = {}
+            self.credit_snapshot = None
             self.credit_data_loaded = False
     
     def refresh_current_view(self):
@@ -3429,7 +3471,7 @@ class CobranzaApp(QWidget):
             self.create_creditos_view()
         elif self.current_view == "top":  # AGREGAR ESTA LÍNEA
             self.create_top_clientes_view()
-        else:
+        elif not self.refresh_category_tables():
             self.create_clientes_view()
 
     def show_credit_loading_indicator(self):
@@ -3473,6 +3515,7 @@ class CobranzaApp(QWidget):
         loading_layout.addWidget(icon_label)
         loading_layout.addWidget(loading_label)
         loading_layout.addWidget(sub_label)
+        self.view_loading_label = sub_label  # Aquí se muestra el avance de la carga
         loading_layout.addWidget(progress_container)
         
         loading_container.setLayout(loading_layout)
@@ -3510,26 +3553,64 @@ class CobranzaApp(QWidget):
         self.update_timer.setInterval(300000)  # 5 minutos
         self.update_timer.timeout.connect(self.auto_update)
         self.update_timer.start()
+        
+        # Alta de clientes nuevos en ClientsBuro: al arrancar y luego periódicamente
+        self.buro_sync_timer = QTimer()
+        self.buro_sync_timer.setInterval(int(BURO_SYNC_INTERVAL_SECONDS * 1000))
+        self.buro_sync_timer.timeout.connect(self.sync_buro)
+        self.buro_sync_timer.start()
+        QTimer.singleShot(0, self.sync_buro)
+        QTimer.singleShot(0, self.update_sales_items)
+
+    def sync_buro(self):
+        """Agregar a ClientsBuro los clientes que aún no están (en segundo plano)"""
+        if self.offline_mode:
+            return
+        self.workers.submit('buro_sync', lambda task: sync_clients_to_buro(),
+                            on_result=self._on_buro_synced, replace=False)
+
+    def _on_buro_synced(self, added):
+        if added is None:
+            logging.warning("No se pudo sincronizar ClientsBuro, se reintentará en el próximo ciclo")
+        else:
+            logging.info(f"Sincronización de ClientsBuro: {added} clientes agregados")
+
+    def update_sales_items(self):
+        """Agregar a la tabla local de artículos las ventas nuevas (en segundo plano)"""
+        if self.offline_mode:
+            return
+        self.workers.submit('sales_items', self.sales_items.build,
+                            on_result=self._on_sales_items_updated, replace=False)
+
+    def _on_sales_items_updated(self, processed):
+        if processed is None:
+            logging.warning("No se pudo actualizar la tabla de artículos, se reintentará en el próximo ciclo")
 
     def auto_update(self):
         """Actualización automática periódica"""
         current_time = time.time()
         if current_time - self.last_update_time >= 300:
+            # Mantener los puntajes al día sin recalcular todo el historial
+            self.refresh_credit_snapshot()
             self.load_data()
+            self.update_sales_items()
             self.last_update_time = current_time
 
-    def on_client_double_click(self, table, row):
-        """Maneja el doble clic en una celda de cliente"""
+    def closeEvent(self, event):
+        """Cancelar las cargas en curso para que no lleguen resultados tarde"""
+        self.workers.cancel_all()
+        self.write_queue.stop()
+        super().closeEvent(event)
+
+    def on_client_double_click(self, client_id):
+        """Maneja el doble clic en una fila de cliente"""
         try:
-            name_item = table.item(row, 0)
-            if name_item:
-                client_id = name_item.data(Qt.ItemDataRole.UserRole)
-                if client_id and client_id in self.clientes_data:
-                    client_data = self.clientes_data[client_id]
-                    self.detail_window = ClienteDetalleWindow(self, client_data, client_id)
-                    self.detail_window.show()
-                else:
-                    QMessageBox.warning(self, "⚠️ Error", "No se pudo obtener la información del cliente")
+            if client_id and client_id in self.clientes_data:
+                client_data = self.clientes_data[client_id]
+                self.detail_window = ClienteDetalleWindow(self, client_data, client_id)
+                self.detail_window.show()
+            else:
+                QMessageBox.warning(self, "⚠️ Error", "No se pudo obtener la información del cliente")
         except Exception as e:
             logging.error(f"Error al abrir detalles del cliente: {e}")
             QMessageBox.critical(self, "❌ Error", f"Error al abrir detalles del cliente: {str(e)}")
@@ -3676,4 +3757,6 @@ def main():
             f.write(f"Error al iniciar la aplicación:\n{str(e)}")
 
 if __name__ == "__main__":
+    # Necesario para el pool de procesos de sales_items en el ejecutable congelado
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
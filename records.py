@@ -0,0 +1,197 @@
+# records.py
+import sys
+
+# Tipos de registro creados con record_type, por nombre (para pickle)
+_RECORD_TYPES = {}
+
+
+def _restore(type_name, values):
+    return _RECORD_TYPES[type_name](*values)
+
+
+class Record:
+    """
+    Registro compacto con __slots__ que se usa como un dict de sólo
+    columnas conocidas: record.get('cveCte'), record['saldo'],
+    'nombre' in record, record.items()... así el código escrito para los
+    dicts de antes sigue funcionando sin cambios.
+
+    No guarda un dict por fila (sólo un puntero por columna) y los textos
+    de las columnas categóricas (estado, vendedor, condiciones...) se
+    internan: todas las filas con el mismo valor comparten el mismo objeto
+    str. Las fechas llegan ya compartidas desde database._to_date.
+    """
+    __slots__ = ()
+    _fields = ()
+    _field_set = frozenset()
+    _categories = frozenset()
+
+    def __init__(self, *values):
+        if len(values) != len(self._fields):
+            raise TypeError(f"{type(self).__name__} espera {len(self._fields)} valores, recibió {len(values)}")
+        categories = self._categories
+        for name, value in zip(self._fields, values):
+            if name in categories and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_dict(cls, data, **overrides):
+        """Construir desde un dict (las columnas que falten quedan en None)"""
+        return cls(*(overrides[name] if name in overrides else data.get(name)
+                     for name in cls._fields))
+
+    # --- Acceso tipo dict ---
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._field_set:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._field_set
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return [getattr(self, name) for name in self._fields]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self._fields]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self._fields == other._fields and self.values() == other.values()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return _restore, (type(self).__name__, tuple(self.values()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def record_type(name, fields, categories=()):
+    """
+    Crear una clase Record con las columnas indicadas.
+
+    Args:
+        name: nombre de la clase (único en la aplicación)
+        fields: columnas en orden; el constructor recibe los valores en ese orden
+        categories: columnas de texto repetitivo que se internan
+    """
+    fields = tuple(fields)
+    cls = type(name, (Record,), {
+        '__slots__': fields,
+        '_fields': fields,
+        '_field_set': frozenset(fields),
+        '_categories': frozenset(categories) & frozenset(fields),
+    })
+    _RECORD_TYPES[name] = cls
+    return cls
+
+
+def benchmark_memory(rows=100_000):
+    """
+    Comparar la memoria de ventas y clientes como dicts (como venían de la
+    base) contra Record con textos internados. Usa filas sintéticas con la
+    misma forma y repetición de valores que las tablas reales.
+
+    Returns:
+        dict {nombre: (bytes con dicts, bytes con Record)}
+    """
+    import gc
+    import random
+    import tracemalloc
+    from datetime import date
+
+    from database import VENTAS_PROFILES, _CLIENT_FIELDS, ventas_from_dicts, clients_from_dicts
+
+    rnd = random.Random(0)
+    estados = ["PENDIENTE", "PAGADA", "CANCELADA", "CREDITO"]
+    vendedores = [f"VENDEDOR {i}" for i in range(25)]
+    fechas = [date(2024, m, d) for m in range(1, 13) for d in range(1, 29)]
+    clientes = [str(1000 + i) for i in range(rows // 20 or 1)]
+
+    def fresh(value):
+        # Cada fila de pyodbc trae su propia copia del texto o la fecha
+        if isinstance(value, date):
+            return date.fromordinal(value.toordinal())
+        return (value + " ")[:-1]
+
+    def venta_values(i):
+        values = {
+            "folio": str(i), "estado": estados[i % 4], "cveCte": rnd.choice(clientes),
+            "cliente": "CLIENTE " + rnd.choice(clientes), "fecha": rnd.choice(fechas),
+            "hora": f"{i % 24:02d}:{i % 60:02d}:00", "total": float(i % 5000),
+            "restante": float(i % 700), "fechaPago": rnd.choice(fechas), "fechaProg": None,
+            "condiciones": "CREDITO", "diasCorte": 30, "vendedor": rnd.choice(vendedores),
+            "comoPago": "EFECTIVO", "anticipo": 0.0, "saldoCliente": 0.0,
+        }
+        return {key: fresh(value) if isinstance(value, (str, date)) else value
+                for key, value in values.items()}
+
+    def client_values(i):
+        values = {key: "" for key, _, _ in _CLIENT_FIELDS}
+        values.update(estado="ACTIVO", fecha=rnd.choice(fechas), nombre=f"CLIENTE {i}",
+                      telefono1=f"55{i:08d}", credito=True, montoCredito=5000.0,
+                      diasCredito=30, saldo=float(i % 9000), nivel=1,
+                      modificado=rnd.choice(fechas), membresia=rnd.choice(fechas))
+        return {key: fresh(value) if isinstance(value, (str, date)) else value
+                for key, value in values.items()}
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        data = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del data
+        return size
+
+    results = {}
+    for profile in ('scoring', 'dashboard'):
+        fields = ("folio",) + VENTAS_PROFILES[profile]
+        as_dicts = measure(lambda: [{k: v[k] for k in fields}
+                                    for v in map(venta_values, range(rows))])
+        as_records = measure(lambda: ventas_from_dicts(
+            {v["folio"]: v for v in map(venta_values, range(rows))}, profile))
+        results[f"ventas ({profile})"] = (as_dicts, as_records)
+
+    n_clients = max(rows // 10, 1)
+    as_dicts = measure(lambda: [client_values(i) for i in range(n_clients)])
+    as_records = measure(lambda: clients_from_dicts({i: client_values(i) for i in range(n_clients)}))
+    results["clientes"] = (as_dicts, as_records)
+    return results
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"Memoria con {rows:,} ventas ({max(rows // 10, 1):,} clientes):")
+    for name, (as_dicts, as_records) in benchmark_memory(rows).items():
+        print(f"  {name:<22} dict: {as_dicts / 2**20:8.1f} MB   "
+              f"Record: {as_records / 2**20:8.1f} MB   ({as_dicts / as_records:.1f}x)")
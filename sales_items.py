@@ -0,0 +1,262 @@
+# sales_items.py
+import logging
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pyodbc
+
+from config import SALES_ITEMS_PATH, SALES_ITEMS_BATCH_SIZE, SALES_ITEMS_PROCESSES
+from database import iter_sale_texts, iter_cancelled_folios
+from ticket_parser import extract_sale_items
+
+# Versión del esquema local; al subirla la tabla se reconstruye una vez
+_SCHEMA_VERSION = 2
+
+
+class SalesItemsStore:
+    """
+    Tabla local (SQLite) de artículos vendidos: un renglón por artículo de
+    cada venta con (folio, cliente, producto, cantidad, importe), sacado
+    de los renglones del ticket o de Ventas.Articulos (ticket_parser).
+
+    Se construye en segundo plano y de forma incremental por Folio: cada
+    lote se guarda junto con el último Folio procesado en una sola
+    transacción, así una construcción interrumpida continúa donde se quedó
+    y las siguientes sólo leen las ventas nuevas. El recorrido de los
+    textos corre en un pool de procesos.
+
+    Además, en cada construcción se quitan los artículos de las ventas que
+    se cancelaron después de procesarse y se vuelven a leer las ventas que
+    quedaron sin artículos (empty_sales), por si su texto llegó después.
+
+    Las consultas (product_mix, top_products) no vuelven a leer ningún texto.
+    """
+
+    def __init__(self, path=SALES_ITEMS_PATH):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sale_items (
+                folio TEXT NOT NULL,
+                line INTEGER NOT NULL,
+                client_id TEXT NOT NULL,
+                product TEXT NOT NULL,
+                quantity REAL NOT NULL,
+                amount REAL,
+                PRIMARY KEY (folio, line)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_client ON sale_items (client_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sale_items_product ON sale_items (product)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS build_state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS empty_sales (folio TEXT PRIMARY KEY)")
+        return conn
+
+    def _upgrade(self, conn):
+        """Las tablas sin empty_sales no saben qué ventas quedaron vacías: se reconstruyen"""
+        row = conn.execute("SELECT value FROM build_state WHERE key = 'version'").fetchone()
+        if row and row[0] >= _SCHEMA_VERSION:
+            return
+        with conn:
+            conn.execute("DELETE FROM sale_items")
+            conn.execute("DELETE FROM empty_sales")
+            conn.execute("DELETE FROM build_state WHERE key = 'last_folio'")
+            conn.execute("INSERT OR REPLACE INTO build_state (key, value) VALUES ('version', ?)",
+                         (_SCHEMA_VERSION,))
+
+    def last_folio(self):
+        """Último Folio ya procesado (0 si la tabla está vacía)"""
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT value FROM build_state WHERE key = 'last_folio'").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Error al leer el avance de la tabla de artículos: {e}")
+            return 0
+        return row[0] if row else 0
+
+    def _commit(self, conn, items, folios, last_folio=None, gone=()):
+        """
+        Guardar los artículos de un lote de ventas (folios) en una transacción.
+        Las ventas del lote sin artículos quedan en empty_sales; las de gone
+        (canceladas o borradas) dejan de reintentarse.
+        """
+        with_items = {item[0] for item in items}
+        with conn:
+            conn.executemany("""
+                INSERT OR REPLACE INTO sale_items (folio, line, client_id, product, quantity, amount)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, items)
+            conn.executemany("INSERT OR IGNORE INTO empty_sales (folio) VALUES (?)",
+                             [(folio,) for folio in folios if folio not in with_items])
+            conn.executemany("DELETE FROM empty_sales WHERE folio = ?",
+                             [(folio,) for folio in with_items.union(gone)])
+            if last_folio is not None:
+                conn.execute("INSERT OR REPLACE INTO build_state (key, value) VALUES ('last_folio', ?)",
+                             (last_folio,))
+
+    def build(self, task=None, batch_size=SALES_ITEMS_BATCH_SIZE, processes=SALES_ITEMS_PROCESSES):
+        """
+        Procesar las ventas con Folio mayor al último guardado, volver a
+        leer las que quedaron sin artículos y quitar las canceladas.
+
+        Los lotes se leen de SQL Server en orden de Folio, se reparten al
+        pool de procesos y se guardan en el mismo orden, con a lo más
+        2 * processes lotes en vuelo.
+
+        Args:
+            task: Worker de workers.py (para cancelar entre lotes), opcional
+
+        Returns:
+            Número de ventas procesadas, o None si falló
+        """
+        processed = 0
+        try:
+            conn = self._connect()
+            try:
+                self._upgrade(conn)
+                since = self.last_folio()
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    pending = deque()
+                    sales_batches = iter_sale_texts(since, batch_size)
+                    try:
+                        for sales in sales_batches:
+                            if task is not None:
+                                task.check_cancelled()
+                            pending.append((pool.submit(extract_sale_items, sales),
+                                            [sale[0] for sale in sales], int(sales[-1][0])))
+                            if len(pending) >= 2 * processes:
+                                processed += self._commit_next(conn, pending)
+                        while pending:
+                            if task is not None:
+                                task.check_cancelled()
+                            processed += self._commit_next(conn, pending)
+                    finally:
+                        sales_batches.close()
+                        for future, _, _ in pending:
+                            future.cancel()
+
+                    recovered = self._retry_empty(conn, pool, task, batch_size)
+                removed = self._drop_cancelled(conn, task, batch_size)
+            finally:
+                conn.close()
+        except (sqlite3.Error, pyodbc.Error, ConnectionError) as e:
+            logging.error(f"Error al construir la tabla de artículos: {e}")
+            return None
+
+        if processed:
+            logging.info(f"Tabla de artículos: {processed} ventas nuevas procesadas (desde Folio {since})")
+        if recovered or removed:
+            logging.info(f"Tabla de artículos: {recovered} ventas sin artículos completadas, "
+                         f"{removed} artículos de ventas canceladas quitados")
+        return processed
+
+    def _commit_next(self, conn, pending):
+        future, folios, last_folio = pending.popleft()
+        self._commit(conn, future.result(), folios, last_folio)
+        return len(folios)
+
+    def _retry_empty(self, conn, pool, task, batch_size):
+        """
+        Volver a leer las ventas ya procesadas que quedaron sin artículos.
+
+        Returns:
+            Número de ventas que ahora sí tienen artículos
+        """
+        empty = [row[0] for row in conn.execute("SELECT folio FROM empty_sales")]
+        recovered = 0
+        for start in range(0, len(empty), batch_size):
+            if task is not None:
+                task.check_cancelled()
+            folios = empty[start:start + batch_size]
+            sales = [sale for batch in iter_sale_texts(folios=folios, batch_size=batch_size)
+                     for sale in batch]
+            items = pool.submit(extract_sale_items, sales).result() if sales else []
+            found = {sale[0] for sale in sales}
+            self._commit(conn, items, found, gone=[folio for folio in folios if folio not in found])
+            recovered += len({item[0] for item in items})
+        return recovered
+
+    def _drop_cancelled(self, conn, task, batch_size):
+        """
+        Quitar los artículos de las ventas ya procesadas que se cancelaron.
+
+        Returns:
+            Número de artículos quitados
+        """
+        last_folio = self.last_folio()
+        if not last_folio:
+            return 0
+        removed = 0
+        cancelled_batches = iter_cancelled_folios(last_folio, batch_size)
+        try:
+            for folios in cancelled_batches:
+                if task is not None:
+                    task.check_cancelled()
+                rows = [(folio,) for folio in folios]
+                with conn:
+                    removed += conn.executemany("DELETE FROM sale_items WHERE folio = ?", rows).rowcount
+                    conn.executemany("DELETE FROM empty_sales WHERE folio = ?", rows)
+        finally:
+            cancelled_batches.close()
+        return removed
+
+    # --- Consultas ---
+
+    def _query(self, sql, params=()):
+        try:
+            conn = self._connect()
+            try:
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Error al consultar la tabla de artículos: {e}")
+            return []
+
+    def product_mix(self, client_id, limit=10):
+        """
+        Productos que más compra un cliente.
+
+        Returns:
+            [(producto, cantidad, importe, ventas), ...] por cantidad descendente
+        """
+        return self._query("""
+            SELECT product, SUM(quantity), SUM(COALESCE(amount, 0)), COUNT(DISTINCT folio)
+            FROM sale_items
+            WHERE client_id = ?
+            GROUP BY product
+            ORDER BY SUM(quantity) DESC
+            LIMIT ?
+        """, (str(client_id), limit))
+
+    def top_products(self, limit=10, client_ids=None):
+        """
+        Productos más vendidos, de todos los clientes o sólo de client_ids.
+
+        Returns:
+            [(producto, cantidad, importe, clientes), ...] por cantidad descendente
+        """
+        where, params = "", ()
+        if client_ids is not None:
+            client_ids = [str(client_id) for client_id in client_ids]
+            where = f"WHERE client_id IN ({','.join('?' * len(client_ids))})" if client_ids else "WHERE 0"
+            params = tuple(client_ids)
+        return self._query(f"""
+            SELECT product, SUM(quantity), SUM(COALESCE(amount, 0)), COUNT(DISTINCT client_id)
+            FROM sale_items
+            {where}
+            GROUP BY product
+            ORDER BY SUM(quantity) DESC
+            LIMIT ?
+        """, params + (limit,))
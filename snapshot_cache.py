@@ -0,0 +1,123 @@
+# snapshot_cache.py
+import json
+import logging
+import sqlite3
+import time
+from collections.abc import Mapping
+from datetime import datetime, date
+from decimal import Decimal
+
+from config import SNAPSHOT_CACHE_PATH
+from records import Record
+
+
+def _encode(value):
+    """Conservar los tipos que json no maneja (fechas, Decimal y registros)"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    if isinstance(value, Mapping):
+        return dict(value.items())  # LayeredMap de las ventas
+    raise TypeError(f"Tipo no soportado en el caché: {type(value).__name__}")
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        if '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+        if '__decimal__' in obj:
+            return Decimal(obj['__decimal__'])
+    return obj
+
+
+def describe_age(saved_at):
+    """Texto corto con la antigüedad de un snapshot ('hace 5 min')"""
+    if saved_at is None:
+        return "sin datos"
+
+    seconds = max(0, time.time() - saved_at)
+    if seconds < 60:
+        return "hace un momento"
+    if seconds < 3600:
+        return f"hace {int(seconds // 60)} min"
+    if seconds < 86400:
+        return f"hace {int(seconds // 3600)} h"
+    days = int(seconds // 86400)
+    return f"hace {days} día{'s' if days != 1 else ''}"
+
+
+class SnapshotCache:
+    """
+    Copia local (SQLite) del último conjunto de datos cargado con éxito.
+    Permite pintar la interfaz al arrancar sin esperar a SQL Server y
+    seguir consultando en modo sólo lectura si el servidor no responde.
+    """
+
+    def __init__(self, path=SNAPSHOT_CACHE_PATH):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS datasets (
+                name TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                saved_at REAL NOT NULL
+            )
+        """)
+        return conn
+
+    def save(self, datasets):
+        """Guardar todos los conjuntos en una sola transacción"""
+        saved_at = time.time()
+        try:
+            rows = [(name, json.dumps(data, default=_encode), saved_at)
+                    for name, data in datasets.items()]
+
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM datasets")
+                    conn.executemany("INSERT INTO datasets (name, payload, saved_at) VALUES (?, ?, ?)", rows)
+            finally:
+                conn.close()
+
+            logging.info(f"Snapshot local guardado en {self.path} ({len(rows)} conjuntos)")
+            return True
+
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.error(f"Error al guardar snapshot local: {e}")
+            return False
+
+    def load(self):
+        """
+        Leer el último snapshot guardado.
+
+        Returns:
+            (dict de conjuntos, fecha de guardado en segundos) o (None, None)
+        """
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute("SELECT name, payload, saved_at FROM datasets").fetchall()
+            finally:
+                conn.close()
+
+            if not rows:
+                return None, None
+
+            datasets = {name: json.loads(payload, object_hook=_decode) for name, payload, _ in rows}
+            saved_at = min(saved for _, _, saved in rows)
+            logging.info(f"Snapshot local leído ({describe_age(saved_at)})")
+            return datasets, saved_at
+
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Error al leer snapshot local: {e}")
+            return None, None
@@ -0,0 +1,231 @@
+# table_models.py
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt6.QtGui import QColor, QFont, QPalette
+from PyQt6.QtWidgets import QStyledItemDelegate
+
+# Roles propios: id del cliente, valor crudo para ordenar y el registro completo
+CLIENT_ID_ROLE = Qt.ItemDataRole.UserRole
+SORT_ROLE = Qt.ItemDataRole.UserRole + 1
+RECORD_ROLE = Qt.ItemDataRole.UserRole + 2
+
+ALIGN_LEFT = Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter
+ALIGN_CENTER = Qt.AlignmentFlag.AlignCenter
+
+
+def truncate(text, limit):
+    """Recortar un texto largo con '...' (el completo va en el tooltip)"""
+    text = str(text)
+    return text[:limit - 3] + "..." if len(text) > limit else text
+
+
+class TableColumn:
+    """
+    Definición de una columna: de dónde sale el valor, cómo se muestra y
+    con qué fuente/color se pinta. Las fuentes y colores se crean una sola
+    vez aquí, no por celda.
+
+    value(client_id, record) -> valor crudo (se usa para ordenar)
+    text(value, record)      -> texto mostrado
+    color                    -> color fijo, o función (record) -> color/None
+    tooltip(client_id, record) -> texto del tooltip o None
+
+    Con font_size=None la celda usa la fuente de la tabla.
+    """
+    __slots__ = ('header', 'value', 'text', 'align', 'font', 'color', 'tooltip')
+
+    def __init__(self, header, value, text=None, align=ALIGN_CENTER,
+                 font_size=9, weight=QFont.Weight.Normal, color=None, tooltip=None):
+        self.header = header
+        self.value = value
+        self.text = text or (lambda value, record: str(value))
+        self.align = align
+        self.font = QFont("Segoe UI", font_size, weight) if font_size else None
+        self.color = QColor(color) if isinstance(color, str) else color
+        self.tooltip = tooltip
+
+    def color_for(self, record):
+        if callable(self.color):
+            return self.color(record)
+        return self.color
+
+
+class ClientTableModel(QAbstractTableModel):
+    """
+    Modelo de tabla sobre registros de clientes en memoria: filas
+    (client_id, registro) y columnas TableColumn.
+
+    La vista sólo pide los datos de las filas visibles. Los cambios se
+    aplican en el lugar (set_rows / update_row / remove_row) sin volver a
+    construir la tabla.
+    """
+
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self._rows = []
+        self._row_of = {}
+
+    # --- API de Qt ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.columns[section].header
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        client_id, record = self._rows[index.row()]
+        column = self.columns[index.column()]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return column.text(column.value(client_id, record), record)
+        if role == SORT_ROLE:
+            return column.value(client_id, record)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return column.align
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return column.tooltip(client_id, record) if column.tooltip else None
+        if role == CLIENT_ID_ROLE:
+            return client_id
+        if role == RECORD_ROLE:
+            return record
+        return None
+
+    # --- Actualización en el lugar ---
+
+    def set_rows(self, rows):
+        """Reemplazar todas las filas [(client_id, registro), ...]"""
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._row_of = {client_id: row for row, (client_id, _) in enumerate(self._rows)}
+        self.endResetModel()
+
+    def update_row(self, client_id, record):
+        """Actualizar (o agregar) la fila de un cliente"""
+        row = self._row_of.get(client_id)
+        if row is None:
+            row = len(self._rows)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._rows.append((client_id, record))
+            self._row_of[client_id] = row
+            self.endInsertRows()
+        else:
+            self._rows[row] = (client_id, record)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+
+    def remove_row(self, client_id):
+        """Quitar la fila de un cliente, si existe"""
+        row = self._row_of.pop(client_id, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._rows[row]
+        self.endRemoveRows()
+        for later in range(row, len(self._rows)):
+            self._row_of[self._rows[later][0]] = later
+
+    def refresh_all(self):
+        """Repintar todas las celdas (valores que dependen del día actual)"""
+        if self._rows:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(self._rows) - 1, len(self.columns) - 1))
+
+    def client_id_at(self, row):
+        return self._rows[row][0]
+
+    def records(self):
+        return self._rows
+
+    def __contains__(self, client_id):
+        return client_id in self._row_of
+
+
+class ClientFilterProxyModel(QSortFilterProxyModel):
+    """
+    Ordena por el valor crudo de cada columna (no por el texto formateado)
+    y filtra por el nombre del cliente, o por un conjunto de client_id ya
+    resuelto con un índice de búsqueda (set_filter_ids).
+    """
+
+    def __init__(self, source, name_of, parent=None):
+        super().__init__(parent)
+        self._name_of = name_of
+        self._filter_text = ""
+        self._filter_ids = None
+        self.setSortRole(SORT_ROLE)
+        self.setDynamicSortFilter(True)
+        self.setSourceModel(source)
+
+    def set_filter_text(self, text):
+        text = (text or "").strip().lower()
+        if text != self._filter_text:
+            self._filter_text = text
+            self.invalidateFilter()
+
+    def set_filter_ids(self, client_ids):
+        """Mostrar sólo estos client_id (None: sin filtro)"""
+        if client_ids is not self._filter_ids:
+            self._filter_ids = client_ids
+            self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._filter_ids is not None:
+            return self.sourceModel().client_id_at(source_row) in self._filter_ids
+        if not self._filter_text:
+            return True
+        client_id, record = self.sourceModel().records()[source_row]
+        return self._filter_text in (self._name_of(record) or "").lower()
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        # Numerar las filas en el orden mostrado, no en el del modelo fuente
+        if orientation == Qt.Orientation.Vertical and role == Qt.ItemDataRole.DisplayRole:
+            return section + 1
+        return super().headerData(section, orientation, role)
+
+    def lessThan(self, left, right):
+        a = left.data(SORT_ROLE)
+        b = right.data(SORT_ROLE)
+        # Los valores vacíos ('N/A') cuentan como los menores
+        if a is None or b is None:
+            return a is None and b is not None
+        try:
+            return a < b
+        except TypeError:
+            return str(a) < str(b)
+
+    def client_id_at(self, proxy_index):
+        """client_id de una celda de la vista"""
+        return self.mapToSource(proxy_index).data(CLIENT_ID_ROLE)
+
+
+class ClientTableDelegate(QStyledItemDelegate):
+    """
+    Aplica fuente, color de texto y fondo de cada columna al pintar. Los
+    objetos QFont/QColor vienen ya creados en las columnas, así que pintar
+    una celda no construye nada.
+    """
+
+    def __init__(self, columns, background=None, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.background = QColor(background) if isinstance(background, str) else background
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        column = self.columns[index.column()]
+        if column.font is not None:
+            option.font = column.font
+
+        color = column.color_for(index.data(RECORD_ROLE))
+        if color is not None:
+            option.palette.setColor(QPalette.ColorRole.Text, color)
+        if self.background is not None:
+            option.backgroundBrush = self.background
@@ -0,0 +1,136 @@
+# ticket_parser.py
+import re
+from collections import namedtuple
+
+# Resultado de leer el texto de un ticket:
+# number: número de ticket ('N/A' si no trae), amount: IMPORTE (None si no trae),
+# items: renglones de artículos [(cantidad, descripción, importe), ...]
+ParsedTicket = namedtuple('ParsedTicket', ('number', 'amount', 'items'))
+
+_NUMBER_RE = re.compile(r'TICKET:(\d+)')
+# "2   TORNILLO 1/4    $1,234.50": cantidad al inicio e importe (opcional) al final
+_ITEM_RE = re.compile(r'^(\d+(?:\.\d+)?)\s+(.*?)(?:\s+\$?\s*(-?[\d,]+\.\d+))?$')
+_SEPARATOR_RE = re.compile(r'^[-=_*.\s]+$')
+
+# Líneas que cierran la lista de artículos
+_ITEMS_END = ('ARTICULOS', 'IMPORTE:', 'ADEUDA:')
+
+
+def _parse_amount(text):
+    """'$1,234.56' -> 1234.56; None si no es un número"""
+    try:
+        return float(text.replace('$', '').replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+def _parse_item(line):
+    match = _ITEM_RE.match(line)
+    if match is None:
+        return (None, line, None)
+    quantity, description, amount = match.groups()
+    return (float(quantity), description, _parse_amount(amount) if amount else None)
+
+
+def parse_ticket_text(text):
+    """
+    Leer en una sola pasada el número de ticket, el importe (la primera
+    línea "IMPORTE:" con un monto válido, como se hacía antes en cada
+    ventana) y los renglones de artículos entre el encabezado
+    "CANT ... DESCRIPCION" y el pie (ARTICULOS / IMPORTE: / ADEUDA:).
+
+    Returns:
+        ParsedTicket
+    """
+    if not text:
+        return ParsedTicket("N/A", None, [])
+
+    text = str(text)
+    number = None
+    amount = None
+    items = []
+    in_items = False
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        if number is None:
+            match = _NUMBER_RE.search(line)
+            if match:
+                number = match.group(1)
+
+        if in_items and line.startswith(_ITEMS_END):
+            in_items = False
+
+        if amount is None and "IMPORTE:" in line:
+            amount = _parse_amount(line.split("IMPORTE:")[-1])
+        elif in_items:
+            if not _SEPARATOR_RE.match(line):
+                items.append(_parse_item(line))
+        elif not items and "CANT" in line and "DESCRIPCION" in line:
+            in_items = True
+
+    if number is None:
+        # Un texto que es sólo el número también se acepta (extract_ticket_number)
+        number = text if text.isdigit() else "N/A"
+    return ParsedTicket(number, amount, items)
+
+
+def extract_ticket_number(ticket_text):
+    """Extract ticket number from ticket text using regex"""
+    return parse_ticket_text(ticket_text).number
+
+
+def extract_ticket_amount(ticket_text):
+    """Monto del IMPORTE del ticket (0.0 si no tiene)"""
+    return parse_ticket_text(ticket_text).amount or 0.0
+
+
+_SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_product(description):
+    """Nombre de producto comparable entre tickets: mayúsculas y espacios simples"""
+    return _SPACES_RE.sub(' ', description).strip().upper()
+
+
+def parse_articulos(text):
+    """
+    Renglones de la columna Ventas.Articulos (uno por línea, mismo formato
+    que los del ticket). Si sólo trae el número de artículos no hay renglones.
+    """
+    if not text:
+        return []
+    items = []
+    for line in str(text).splitlines():
+        line = line.strip()
+        if line and not _SEPARATOR_RE.match(line):
+            items.append(_parse_item(line))
+    if len(items) == 1 and items[0][0] is None and _parse_amount(items[0][1]) is not None:
+        return []
+    return items
+
+
+def extract_sale_items(sales):
+    """
+    Artículos normalizados de un lote de ventas [(folio, cliente, articulos,
+    texto del ticket), ...]. Se usan los renglones del ticket y, si no tiene,
+    los de Articulos. Función de nivel de módulo y sin dependencias para
+    poder correr en un proceso aparte (sales_items.SalesItemsStore).
+
+    Returns:
+        [(folio, renglón, cliente, producto, cantidad, importe), ...]
+    """
+    rows = []
+    for folio, client_id, articulos, ticket in sales:
+        items = parse_ticket_text(ticket).items if ticket else []
+        if not items:
+            items = parse_articulos(articulos)
+        for line, (quantity, description, amount) in enumerate(items):
+            product = normalize_product(description)
+            if product:
+                rows.append((folio, line, client_id, product,
+                             quantity if quantity is not None else 1.0, amount))
+    return rows
@@ -0,0 +1,184 @@
+# tickets.py
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from config import TICKET_CACHE_SIZE, TICKET_PARSE_CACHE_PATH
+from database import fetch_ticket_texts
+from ticket_parser import ParsedTicket, parse_ticket_text
+
+
+class TicketTextCache:
+    """
+    Textos de ticket por Folio, consultados sólo cuando alguien los pide
+    (detalle de un ticket, montos del historial crediticio) y guardados
+    con política LRU: al pasar de maxsize se descarta el menos usado.
+
+    Las consultas de ventas masivas no traen la columna Ticket; este caché
+    la sirve bajo demanda. Es seguro usarlo desde los workers.
+    """
+
+    def __init__(self, maxsize=TICKET_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, folio):
+        """Texto del ticket de una venta ('' si no existe, None si falló la consulta)"""
+        texts = self.get_many([folio])
+        return None if texts is None else texts.get(str(folio), "")
+
+    def get_many(self, folios):
+        """
+        Textos de varios tickets; los que no están en memoria se piden en
+        una sola consulta.
+
+        Returns:
+            dict {Folio: texto}, o None si la consulta falló
+        """
+        folios = [str(folio) for folio in folios]
+        found = {}
+        with self._lock:
+            for folio in folios:
+                text = self._texts.get(folio)
+                if text is not None:
+                    self._texts.move_to_end(folio)
+                    found[folio] = text
+
+        missing = [folio for folio in dict.fromkeys(folios) if folio not in found]
+        if missing:
+            fetched = fetch_ticket_texts(missing)
+            if fetched is None:
+                return None
+            # Los folios sin fila también se recuerdan para no volver a pedirlos
+            fetched = {folio: fetched.get(folio, "") for folio in missing}
+            found.update(fetched)
+            with self._lock:
+                for folio, text in fetched.items():
+                    self._texts[folio] = text
+                    self._texts.move_to_end(folio)
+                while len(self._texts) > self.maxsize:
+                    self._texts.popitem(last=False)
+            logging.info(f"Textos de ticket consultados: {len(missing)} (en caché: {len(self._texts)})")
+
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._texts.clear()
+
+
+class ParsedTicketStore:
+    """
+    Tickets ya leídos con ticket_parser (número, importe y artículos) por
+    Folio, guardados en SQLite local. El texto de un ticket se pide y se
+    recorre una sola vez en su vida: después, incluso en otras sesiones,
+    el resultado sale de aquí sin consultar la columna Ticket.
+
+    Los folios sin texto no se guardan (el ticket puede no existir aún).
+    Es seguro usarlo desde los workers: cada operación abre su conexión.
+    """
+
+    def __init__(self, path=TICKET_PARSE_CACHE_PATH, text_cache=None):
+        self.path = path
+        self.text_cache = text_cache
+        self._parsed = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS parsed_tickets (
+                folio TEXT PRIMARY KEY,
+                number TEXT NOT NULL,
+                amount REAL,
+                items TEXT NOT NULL
+            )
+        """)
+        return conn
+
+    def _load(self, folios):
+        found = {}
+        try:
+            conn = self._connect()
+            try:
+                for start in range(0, len(folios), 500):
+                    chunk = folios[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT folio, number, amount, items FROM parsed_tickets "
+                        f"WHERE folio IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                    for folio, number, amount, items in rows:
+                        found[folio] = ParsedTicket(number, amount, [tuple(item) for item in json.loads(items)])
+            finally:
+                conn.close()
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Error al leer tickets procesados: {e}")
+        return found
+
+    def _save(self, parsed):
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO parsed_tickets (folio, number, amount, items) VALUES (?, ?, ?, ?)",
+                        [(folio, ticket.number, ticket.amount, json.dumps(ticket.items))
+                         for folio, ticket in parsed.items()])
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # Se vuelven a leer la próxima sesión; no afecta el resultado de ésta
+            logging.error(f"Error al guardar tickets procesados: {e}")
+
+    def get_many(self, folios):
+        """
+        Tickets procesados de varios folios. Primero memoria, después el
+        archivo local y sólo los que falten se piden y se recorren.
+
+        Returns:
+            dict {Folio: ParsedTicket, o None si el ticket no tiene texto},
+            o None si la consulta de textos falló
+        """
+        folios = [str(folio) for folio in folios]
+        with self._lock:
+            found = {folio: self._parsed[folio] for folio in folios if folio in self._parsed}
+
+        missing = [folio for folio in dict.fromkeys(folios) if folio not in found]
+        if missing:
+            stored = self._load(missing)
+            found.update(stored)
+            missing = [folio for folio in missing if folio not in stored]
+
+        if missing:
+            texts = (self.text_cache or _ticket_cache).get_many(missing)
+            if texts is None:
+                return None
+            parsed = {folio: parse_ticket_text(texts[folio]) for folio in missing if texts.get(folio)}
+            if parsed:
+                self._save(parsed)
+                logging.info(f"Tickets procesados por primera vez: {len(parsed)}")
+            found.update(parsed)
+            found.update((folio, None) for folio in missing if folio not in parsed)
+
+        with self._lock:
+            self._parsed.update(found)
+        return found
+
+
+# Cachés compartidos por toda la aplicación
+_ticket_cache = TicketTextCache()
+_ticket_store = ParsedTicketStore(text_cache=_ticket_cache)
+
+
+def get_ticket_text(folio):
+    return _ticket_cache.get(folio)
+
+
+def get_ticket_texts(folios):
+    return _ticket_cache.get_many(folios)
+
+
+def get_parsed_tickets(folios):
+    return _ticket_store.get_many(folios)
@@ -0,0 +1,124 @@
+# ventas_dataset.py
+from operator import attrgetter
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from records import Record
+
+# Estados que ya no cuentan como adeudo
+CLOSED_STATES = ('PAGADA', 'CANCELADA')
+
+# Columnas del conjunto analítico de ventas y su tipo
+FRAME_COLUMNS = ('folio', 'estado', 'cveCte', 'fecha', 'fechaPago', 'total', 'restante')
+_CATEGORY_COLUMNS = ('estado', 'cveCte')
+
+AGGREGATE_COLUMNS = ('purchase_count', 'total_spent', 'last_purchase', 'oldest_pending')
+
+
+def _to_datetime(values):
+    """Fechas (date/datetime de pyodbc o 'YYYY-MM-DD') a datetime64; vacías o inválidas quedan NaT"""
+    series = pd.Series(values, dtype=object)
+    series = series.where(series.astype(bool), None)
+    return pd.to_datetime(series, errors='coerce', format='mixed').to_numpy(dtype='datetime64[ns]')
+
+
+def _to_amount(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').fillna(0.0).to_numpy(np.float64)
+
+
+def _category(values):
+    """Texto repetitivo a categórico; el strip se hace una vez por valor distinto"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(''))
+    stripped = np.array([str(value).strip() for value in uniques] or [''], dtype=object)
+    return pd.Categorical(stripped[codes])
+
+
+def batch_to_columns(rows):
+    """
+    Convertir un lote de filas (Folio, Estado, CveCte, Fecha, FechaPago,
+    Total, Restante) a arreglos tipados. Se usa con cursor.fetchmany para
+    que la memoria pico sea la de un lote de filas, no la de la consulta.
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(FRAME_COLUMNS)
+    folio, estado, cve_cte, fecha, fecha_pago, total, restante = columns
+    return {
+        'folio': np.array([str(value) for value in folio], dtype=object),
+        'estado': _category(estado),
+        'cveCte': _category(cve_cte),
+        'fecha': _to_datetime(fecha),
+        'fechaPago': _to_datetime(fecha_pago),
+        'total': _to_amount(total),
+        'restante': _to_amount(restante),
+    }
+
+
+def frame_from_batches(batches):
+    """Unir lotes de batch_to_columns en un DataFrame con tipos definitivos"""
+    batches = list(batches)
+    if not batches:
+        batches = [batch_to_columns([])]
+    data = {}
+    for column in FRAME_COLUMNS:
+        parts = [batch[column] for batch in batches]
+        if column in _CATEGORY_COLUMNS:
+            data[column] = union_categoricals(parts) if len(parts) > 1 else parts[0]
+        else:
+            data[column] = np.concatenate(parts)
+    return pd.DataFrame(data, columns=FRAME_COLUMNS)
+
+
+def frame_from_ventas(ventas):
+    """
+    DataFrame a partir de un mapa {Folio: venta} ya cargado (registros o
+    dicts), para las ventas que llegan por el delta o del snapshot local.
+    """
+    columns = ('estado', 'cveCte', 'fecha', 'fechaPago', 'total', 'restante')
+    values = list(ventas.values())
+    if values and all(isinstance(venta, Record) and 'total' in venta for venta in values):
+        # Registros con __slots__: un attrgetter en C en vez de .get por columna
+        fields = map(attrgetter(*columns), values)
+    else:
+        fields = ((venta.get('estado'), venta.get('cveCte'), venta.get('fecha'),
+                   venta.get('fechaPago'), venta.get('importe') or venta.get('total'),
+                   venta.get('restante'))
+                  for venta in values)
+    rows = [(folio,) + row for folio, row in zip(ventas.keys(), fields)]
+    return frame_from_batches([batch_to_columns(rows)])
+
+
+def pending_mask(frame):
+    """Misma regla que get_ventas_data: no pagada/cancelada y con saldo restante"""
+    estado = frame['estado'].cat
+    closed = np.append(estado.categories.str.upper().isin(CLOSED_STATES), False)
+    return ~closed[estado.codes] & (frame['restante'].to_numpy() > 0)
+
+
+def client_aggregates(frame):
+    """
+    Agregados por cliente en un solo groupby: número de compras, gasto
+    total, última compra y venta pendiente más antigua.
+
+    Returns:
+        DataFrame indexado por cveCte con AGGREGATE_COLUMNS
+    """
+    frame = frame[frame['cveCte'].astype(object) != '']
+    frame = frame.assign(pendiente=frame['fecha'].where(pending_mask(frame)))
+
+    aggregates = frame.groupby('cveCte', observed=True, sort=False).agg(
+        purchase_count=('folio', 'size'),
+        total_spent=('total', 'sum'),
+        last_purchase=('fecha', 'max'),
+        oldest_pending=('pendiente', 'min'),
+    )
+    aggregates.index = aggregates.index.astype(object)
+    return aggregates
+
+
+def client_folios(frame):
+    """Folios de cada cliente en el orden del conjunto: {cveCte: [folio, ...]}"""
+    folios = frame['folio'].to_numpy()
+    groups = frame.groupby('cveCte', observed=True, sort=False).indices
+    return {client_id: folios[positions].tolist()
+            for client_id, positions in groups.items() if client_id != ''}
@@ -0,0 +1,180 @@
+# ventas_sync.py
+import logging
+import time
+
+import pyodbc
+
+from config import VENTAS_FULL_RECONCILE_SECONDS
+from database import (iter_ventas, get_ventas_delta, get_ventas_status, VENTAS_STATUS_FIELDS,
+                      get_ventas_rowversion_column, get_ventas_version_mark)
+from data_indexes import LayeredMap
+from ventas_dataset import CLOSED_STATES
+
+
+def _folio_number(folio):
+    try:
+        return int(folio)
+    except (TypeError, ValueError):
+        return None
+
+
+class VentasDeltaLoader:
+    """
+    Mantiene un mapa de ventas {Folio: venta} en memoria y lo actualiza
+    leyendo sólo las filas nuevas o modificadas.
+
+    - Si Ventas tiene columna rowversion se piden las filas con versión
+      mayor a la última leída.
+    - Si no, se consulta primero Estado/Restante/FechaPago de los folios
+      abiertos (los únicos que pueden cambiar de estado) y se piden las
+      filas completas de los folios mayores al último conocido más los
+      abiertos cuyo estado cambió.
+    - Sólo se reportan como cambiadas las ventas distintas a las guardadas.
+    - Cada VENTAS_FULL_RECONCILE_SECONDS se recarga todo para detectar
+      ventas borradas o cambios que el delta no alcanza a ver.
+
+    El mapa (ventas) es un LayeredMap: cada refresh() lo reemplaza por uno
+    nuevo con los cambios, sin copiar el historial ni modificar el que ya
+    tengan otros hilos, así las fotos pueden compartirlo directamente.
+
+    pending_only=True replica get_ventas_data (sólo ventas con adeudo);
+    pending_only=False replica get_all_ventas_data (todo el historial).
+    profile es el perfil de columnas (VENTAS_PROFILES); por omisión el
+    del tablero para las pendientes y el del puntaje para el historial.
+    """
+
+    def __init__(self, pending_only=True, ventas=None, reconcile_seconds=None, profile=None):
+        self.pending_only = pending_only
+        self.profile = profile or ('dashboard' if pending_only else 'scoring')
+        self.reconcile_seconds = (VENTAS_FULL_RECONCILE_SECONDS
+                                  if reconcile_seconds is None else reconcile_seconds)
+
+        self.ventas = LayeredMap()
+        self.high_water = 0
+        self.version = None
+        self.last_full_load = None
+        self._open = set()
+        self._version_column = None
+        self._version_checked = False
+
+        if ventas is not None:
+            # Mapa ya cargado por otro camino (p. ej. el snapshot crediticio)
+            self._reset(ventas)
+
+    def _reset(self, ventas):
+        self.ventas = LayeredMap(ventas)
+        self.high_water = 0
+        self._open = set()
+        for folio, venta in ventas.items():
+            self._track(folio, venta)
+        self.last_full_load = time.monotonic()
+
+    def _track(self, folio, venta):
+        number = _folio_number(folio)
+        if number is not None and number > self.high_water:
+            self.high_water = number
+
+        if self.pending_only or (venta.get('estado') or '').upper() not in CLOSED_STATES:
+            self._open.add(folio)
+        else:
+            self._open.discard(folio)
+
+    def _status_of(self, folio):
+        venta = self.ventas.get(folio)
+        return tuple(venta.get(key) for key in VENTAS_STATUS_FIELDS) if venta is not None else None
+
+    def _detect_version_column(self):
+        if not self._version_checked:
+            self._version_column = get_ventas_rowversion_column()
+            self._version_checked = True
+            if self._version_column:
+                logging.info(f"Ventas tiene columna rowversion '{self._version_column}', se usará para el delta")
+            else:
+                logging.info("Ventas no tiene rowversion, el delta usará Folio y folios abiertos")
+        return self._version_column
+
+    def needs_full_load(self):
+        return (self.last_full_load is None
+                or time.monotonic() - self.last_full_load >= self.reconcile_seconds)
+
+    def load_full(self):
+        """
+        Recargar todas las ventas (carga inicial y reconciliación periódica).
+
+        Si la lectura falla se conserva el mapa actual y se regresa None,
+        igual que refresh(): una consulta fallida no es un mapa vacío.
+        """
+        # La marca se toma ANTES de leer para no perder cambios concurrentes
+        version = get_ventas_version_mark() if self._detect_version_column() else None
+
+        ventas = {}
+        try:
+            for batch in iter_ventas(self.profile, pending_only=self.pending_only):
+                ventas.update(batch)
+        except (pyodbc.Error, ConnectionError) as e:
+            logging.error(f"Error en la recarga completa de ventas, se conservan las actuales: {e}")
+            return None
+
+        self.version = version
+        self._reset(ventas)
+        logging.info(f"Recarga completa de ventas: {len(ventas)} registros")
+        return {'full': True, 'changed': ventas, 'removed': []}
+
+    def refresh(self, force_full=False):
+        """
+        Actualizar el mapa de ventas.
+
+        Returns:
+            dict con 'full' (si fue recarga completa), 'changed' {Folio: venta}
+            y 'removed' [Folio], o None si no se pudo consultar
+        """
+        if force_full or self.needs_full_load():
+            return self.load_full()
+
+        version_column = self._detect_version_column()
+        if version_column and self.version is None:
+            return self.load_full()
+
+        open_folios, deleted = self._open, []
+        if not version_column:
+            status = get_ventas_status(self._open)
+            if status is None:
+                return None
+            open_folios = [folio for folio in self._open
+                           if folio in status and status[folio] != self._status_of(folio)]
+            deleted = [folio for folio in self._open if folio not in status]
+
+        delta = get_ventas_delta(self.high_water, open_folios, version_column, self.version,
+                                 profile=self.profile)
+        if delta is None:
+            return None
+
+        changed = {}
+        removed = []
+        for folio in deleted:
+            # Venta abierta que ya no existe en el servidor
+            self._open.discard(folio)
+            if folio in self.ventas:
+                removed.append(folio)
+        for folio, venta in delta['ventas'].items():
+            if self.pending_only:
+                keep = folio in delta['pending']
+            else:
+                keep = bool(venta.get('cveCte'))
+
+            if keep:
+                if self.ventas.get(folio) != venta:
+                    changed[folio] = venta
+                self._track(folio, venta)
+            else:
+                number = _folio_number(folio)
+                if number is not None and number > self.high_water:
+                    self.high_water = number
+                self._open.discard(folio)
+                if folio in self.ventas:
+                    removed.append(folio)
+
+        self.ventas = self.ventas.updated(changed, removed)
+        self.version = delta['version']
+        logging.info(f"Ventas sincronizadas por delta: {len(changed)} actualizadas, {len(removed)} retiradas")
+        return {'full': False, 'changed': changed, 'removed': removed}
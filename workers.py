@@ -0,0 +1,156 @@
+# workers.py
+import logging
+import threading
+import traceback
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class WorkerCancelled(Exception):
+    """La tarea fue cancelada antes de terminar"""
+
+
+class WorkerSignals(QObject):
+    """
+    Señales de un Worker. Se emiten desde el hilo del pool y Qt las entrega
+    en el hilo de la interfaz (conexión en cola), así que los slots pueden
+    tocar widgets sin problema.
+    """
+    started = pyqtSignal()
+    progress = pyqtSignal(int, str)   # porcentaje (0-100), mensaje
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+
+# Clases de señales con el tipo de resultado declarado (se crean una vez por tipo)
+_typed_signals = {}
+
+
+def _signals_class(result_type):
+    if result_type is object:
+        return WorkerSignals
+
+    cls = _typed_signals.get(result_type)
+    if cls is None:
+        cls = type(f"WorkerSignals_{result_type.__name__}", (WorkerSignals,),
+                   {'result': pyqtSignal(result_type)})
+        _typed_signals[result_type] = cls
+    return cls
+
+
+class Worker(QRunnable):
+    """
+    Ejecuta fn(worker, *args, **kwargs) en el QThreadPool.
+
+    La función recibe el propio worker para reportar avance
+    (worker.report_progress) y revisar si la tarea se canceló
+    (worker.is_cancelled / worker.check_cancelled). Una tarea cancelada
+    nunca emite 'result'.
+
+    Las funciones que corren aquí NO deben tocar widgets: sólo consultan
+    y calculan; la interfaz se actualiza en el slot conectado a 'result'.
+    """
+
+    def __init__(self, fn, *args, result_type=object, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = _signals_class(result_type)()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        """Lanzar WorkerCancelled si la tarea se canceló"""
+        if self._cancelled.is_set():
+            raise WorkerCancelled()
+
+    def report_progress(self, percent, message=""):
+        if not self._cancelled.is_set():
+            self.signals.progress.emit(int(percent), message)
+
+    def run(self):
+        self.signals.started.emit()
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+        except WorkerCancelled:
+            logging.info(f"Tarea cancelada: {getattr(self.fn, '__name__', self.fn)}")
+        except Exception as e:
+            logging.error(f"Error en tarea de fondo {getattr(self.fn, '__name__', self.fn)}: {e}")
+            logging.error(traceback.format_exc())
+            if not self._cancelled.is_set():
+                self.signals.error.emit(str(e))
+        else:
+            if not self._cancelled.is_set():
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class WorkerManager(QObject):
+    """
+    Lanza y sigue las tareas de fondo de una ventana, identificadas por clave.
+
+    - submit(..., replace=True) cancela la tarea anterior con la misma clave
+      (la última gana); con replace=False no se lanza si ya hay una en curso.
+    - cancel_all() al cerrar la ventana evita que lleguen resultados tarde.
+    """
+
+    def __init__(self, parent=None, pool=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self._workers = {}
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None, on_progress=None,
+               on_finished=None, replace=True, result_type=object, **kwargs):
+        """
+        Ejecutar fn en segundo plano.
+
+        Returns:
+            El Worker lanzado, o None si ya había una tarea con esa clave
+            y replace=False.
+        """
+        current = self._workers.get(key)
+        if current is not None:
+            if not replace:
+                return None
+            current.cancel()
+
+        worker = Worker(fn, *args, result_type=result_type, **kwargs)
+        if on_result:
+            worker.signals.result.connect(on_result)
+        if on_error:
+            worker.signals.error.connect(on_error)
+        if on_progress:
+            worker.signals.progress.connect(on_progress)
+        if on_finished:
+            worker.signals.finished.connect(on_finished)
+        worker.signals.finished.connect(lambda: self._forget(key, worker))
+
+        self._workers[key] = worker
+        self.pool.start(worker)
+        return worker
+
+    def _forget(self, key, worker):
+        if self._workers.get(key) is worker:
+            del self._workers[key]
+
+    def is_running(self, key):
+        return key in self._workers
+
+    def cancel(self, key):
+        worker = self._workers.pop(key, None)
+        if worker is not None:
+            worker.cancel()
+
+    def cancel_all(self):
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
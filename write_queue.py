@@ -0,0 +1,264 @@
+# write_queue.py
+import json
+import logging
+import sqlite3
+import uuid
+from datetime import datetime
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from config import WRITE_QUEUE_PATH, WRITE_QUEUE_FLUSH_DELAY_MS, WRITE_QUEUE_MAX_RETRY_SECONDS
+from database import (upsert_client_states, set_clients_buro_credit,
+                      ensure_notes_table, insert_client_notes)
+from snapshot_cache import _encode, _decode
+from workers import WorkerManager
+
+
+class WriteBehindQueue(QObject):
+    """
+    Cola local de escrituras de la ventana de detalle.
+
+    La interfaz aplica el cambio en memoria y lo encola; un worker lo envía
+    a SQL Server poco después. Cada operación se guarda primero en SQLite,
+    así que lo pendiente sobrevive a un cierre o a una caída del servidor.
+
+    Tipos de operación:
+    - 'state': una columna de ClientsStates. Clave (cliente, columna): si
+      se cambia dos veces antes de enviarse, sólo viaja el último valor.
+    - 'buro':  ClientsBuro.credit del cliente (mismo criterio).
+    - 'note':  una nota nueva; nunca se combinan.
+
+    Si el envío falla se reintenta con espera creciente (hasta
+    WRITE_QUEUE_MAX_RETRY_SECONDS). Una operación sólo se borra de la cola
+    cuando el servidor confirmó, y sólo si no cambió mientras viajaba.
+    """
+    pending_changed = pyqtSignal(int)   # operaciones pendientes
+    flushed = pyqtSignal(list)          # clientes con cambios ya confirmados
+
+    def __init__(self, path=WRITE_QUEUE_PATH, parent=None,
+                 flush_delay_ms=WRITE_QUEUE_FLUSH_DELAY_MS,
+                 max_retry_seconds=WRITE_QUEUE_MAX_RETRY_SECONDS):
+        super().__init__(parent)
+        self.path = path
+        self.flush_delay_ms = flush_delay_ms
+        self.max_retry_seconds = max_retry_seconds
+
+        self._ops = {}
+        self._seq = 0
+        self._retry_seconds = 0
+        self._notes_table_ready = False
+
+        self.workers = WorkerManager(self)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+        self._load()
+        if self._ops:
+            logging.info(f"{len(self._ops)} cambio(s) pendiente(s) de la sesión anterior")
+            self._schedule(0)
+
+    # --- Persistencia local ---
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_ops (
+                key TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                client_id TEXT NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+        return conn
+
+    def _load(self):
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT key, seq, kind, client_id, payload FROM pending_ops ORDER BY seq").fetchall()
+            finally:
+                conn.close()
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Error al leer cambios pendientes: {e}")
+            return
+
+        for key, seq, kind, client_id, payload in rows:
+            self._ops[key] = {'key': key, 'seq': seq, 'kind': kind, 'client_id': client_id,
+                              'payload': json.loads(payload, object_hook=_decode)}
+            self._seq = max(self._seq, seq)
+
+    def _persist(self, op):
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("""
+                        INSERT OR REPLACE INTO pending_ops (key, seq, kind, client_id, payload)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (op['key'], op['seq'], op['kind'], op['client_id'],
+                          json.dumps(op['payload'], default=_encode)))
+            finally:
+                conn.close()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            # El cambio sigue en memoria y se enviará igual; sólo se pierde si se cierra antes
+            logging.error(f"Error al guardar cambio pendiente {op['key']}: {e}")
+
+    def _forget(self, sent):
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany("DELETE FROM pending_ops WHERE key = ? AND seq = ?",
+                                     [(op['key'], op['seq']) for op in sent])
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Error al limpiar cambios enviados: {e}")
+
+    # --- Encolar ---
+
+    def _put(self, key, kind, client_id, payload):
+        self._seq += 1
+        op = {'key': key, 'seq': self._seq, 'kind': kind,
+              'client_id': str(client_id), 'payload': payload}
+        self._ops[key] = op
+        self._persist(op)
+        self.pending_changed.emit(len(self._ops))
+        # En espera de reintento no se adelanta el envío
+        if not self._retry_seconds:
+            self._schedule(self.flush_delay_ms)
+
+    def enqueue_state(self, client_id, field, value):
+        """Cambiar una columna de ClientsStates"""
+        self._put(f"state:{client_id}:{field}", 'state', client_id, {'field': field, 'value': value})
+
+    def enqueue_buro(self, client_id, credit):
+        """Marcar o desmarcar al cliente en ClientsBuro"""
+        self._put(f"buro:{client_id}", 'buro', client_id, {'credit': bool(credit)})
+
+    def enqueue_note(self, client_id, text, user_name=None, created_at=None):
+        """Agregar una nota (la fecha es la del momento en que se escribió)"""
+        self._put(f"note:{uuid.uuid4().hex}", 'note', client_id,
+                  {'text': text, 'user_name': user_name or "Sistema",
+                   'created_at': created_at or datetime.now()})
+
+    # --- Consultas sobre lo pendiente ---
+
+    def __len__(self):
+        return len(self._ops)
+
+    def pending_value(self, kind, client_id, field=None, default=None):
+        """Valor aún no enviado de un estado/buró, o default si no hay"""
+        if kind == 'state':
+            op = self._ops.get(f"state:{client_id}:{field}")
+            return op['payload']['value'] if op else default
+        op = self._ops.get(f"buro:{client_id}")
+        return op['payload']['credit'] if op else default
+
+    def pending_states(self):
+        """Cambios de ClientsStates sin enviar: {client_id: {columna: valor}}"""
+        states = {}
+        for op in self._ops.values():
+            if op['kind'] == 'state':
+                states.setdefault(op['client_id'], {})[op['payload']['field']] = op['payload']['value']
+        return states
+
+    def pending_buro(self):
+        """Cambios de buró sin enviar: {client_id: credit}"""
+        return {op['client_id']: op['payload']['credit']
+                for op in self._ops.values() if op['kind'] == 'buro'}
+
+    def pending_notes(self, client_id):
+        """Notas aún no enviadas: [(texto, fecha, usuario), ...] de la más reciente a la más antigua"""
+        client_id = str(client_id)
+        notes = [(op['payload']['text'], op['payload']['created_at'], op['payload']['user_name'])
+                 for op in self._ops.values()
+                 if op['kind'] == 'note' and op['client_id'] == client_id]
+        notes.sort(key=lambda note: note[1], reverse=True)
+        return notes
+
+    # --- Envío ---
+
+    def _schedule(self, delay_ms):
+        self._timer.start(int(delay_ms))
+
+    def flush(self):
+        """Enviar lo pendiente en segundo plano (no hace nada si ya hay un envío en curso)"""
+        if not self._ops or self.workers.is_running('flush'):
+            return
+        self.workers.submit('flush', self._send, list(self._ops.values()),
+                            on_result=self._on_sent, on_error=lambda message: self._on_sent(None),
+                            replace=False)
+
+    def _send(self, task, ops):
+        """
+        Enviar un lote de operaciones (corre en el pool).
+
+        Returns:
+            (operaciones confirmadas, True si algún grupo falló)
+        """
+        states, buro, notes = {}, {}, []
+        for op in ops:
+            if op['kind'] == 'state':
+                states.setdefault(op['client_id'], {})[op['payload']['field']] = op['payload']['value']
+            elif op['kind'] == 'buro':
+                buro[op['client_id']] = op['payload']['credit']
+            elif op['kind'] == 'note':
+                notes.append(op)
+
+        sent = []
+        failed = False
+        if states:
+            if upsert_client_states(states):
+                sent.extend(op for op in ops if op['kind'] == 'state')
+            else:
+                failed = True
+        if buro:
+            if set_clients_buro_credit(buro):
+                sent.extend(op for op in ops if op['kind'] == 'buro')
+            else:
+                failed = True
+        if notes:
+            if not self._notes_table_ready:
+                self._notes_table_ready = ensure_notes_table()
+            if self._notes_table_ready and insert_client_notes(
+                    (op['client_id'], op['payload']['text'], op['payload']['user_name'],
+                     op['payload']['created_at']) for op in notes):
+                sent.extend(notes)
+            else:
+                failed = True
+        return sent, failed
+
+    def _on_sent(self, result):
+        sent, failed = result if result is not None else ([], True)
+        if sent:
+            self._forget(sent)
+            for op in sent:
+                # Si se volvió a cambiar mientras viajaba, el valor nuevo sigue pendiente
+                current = self._ops.get(op['key'])
+                if current is not None and current['seq'] == op['seq']:
+                    del self._ops[op['key']]
+            logging.info(f"{len(sent)} cambio(s) confirmado(s) en el servidor, {len(self._ops)} pendiente(s)")
+            self.pending_changed.emit(len(self._ops))
+            self.flushed.emit(sorted({op['client_id'] for op in sent}))
+
+        if failed:
+            self._retry_later()
+        else:
+            self._retry_seconds = 0
+            if self._ops:
+                # Llegaron cambios mientras se enviaba el lote anterior
+                self._schedule(self.flush_delay_ms)
+
+    def _retry_later(self):
+        self._retry_seconds = min(self.max_retry_seconds, max(2, self._retry_seconds * 2))
+        logging.warning(f"No se pudieron enviar {len(self._ops)} cambio(s); reintento en {self._retry_seconds:.0f} s")
+        self._schedule(self._retry_seconds * 1000)
+
+    def stop(self):
+        """Detener los envíos (lo pendiente queda guardado para la próxima sesión)"""
+        self._timer.stop()
+        self.workers.cancel_all()